@@ -3,7 +3,30 @@ from dash import html, dcc
 import dash_bootstrap_components as dbc
 import webbrowser
 
+import booking
+import changefeed
+import health
+import images
+import insights
+import instrumentation
+import jobs
+import static_assets
+
 app = dash.Dash(__name__, title='Sineflix Movie Theater', use_pages=True, external_stylesheets=[dbc.themes.SLATE])
+server = app.server  # WSGI callable, see wsgi.py
+
+# Content-hashed, precompressed assets and compressed callback responses
+static_assets.register(app)
+
+# Extra Flask routes (background job status and downloads, resized posters, health checks,
+# live change events)
+jobs.register_routes(app.server)
+images.register_routes(app.server)
+health.register_routes(app.server)
+changefeed.register_routes(app.server)
+
+# Callback and query timings, served on /metrics
+instrumentation.register(app.server)
 
 # Sidebar setup
 sidebar = dbc.Nav(
@@ -17,6 +40,7 @@ sidebar = dbc.Nav(
             className="text-light py-4"
         )
         for page in dash.page_registry.values()
+        if page.get("nav", True)  # Pages like Booking are only linked to, not listed
     ],
     pills=True,
     vertical=True,
@@ -25,8 +49,11 @@ sidebar = dbc.Nav(
 
 # Layout setup
 app.layout = dbc.Container([
+    # Latest change-feed event ({tables, at}), written by assets/changefeed.js; pages refresh from it
+    dcc.Store(id='change-feed'),
+
     dbc.Row([ 
-        dbc.Col([html.Img(src='assets/logo.png', height="80px")], 
+        dbc.Col([html.Img(src=app.get_asset_url('logo.png'), height="80px")], 
         ),
     ], className='bg-primary mb-4 mx-1 p-1 rounded-3', style={'height': '90px '}),
 
@@ -39,5 +66,10 @@ app.layout = dbc.Container([
 ], fluid=True)
 
 if __name__ == '__main__':
+    # Development server (production runs wsgi.py under gunicorn); keep chart rollups fresh, release expired
+    # seat holds and listen for table changes
+    insights.start_refresh_schedule()
+    booking.start_expiry_schedule()
+    changefeed.start_listener()
     webbrowser.open('http://127.0.0.1:8050', autoraise=True)
-    app.run_server()
+    app.run()
@@ -0,0 +1,14 @@
+// Live updates: the server pushes a "change" event over server-sent events (/changes)
+// whenever a watched table is written to. Each event lands in the change-feed store,
+// which the Movies, Customers and Reports callbacks take as an input.
+(function () {
+    if (!window.EventSource) {
+        return;
+    }
+    var source = new EventSource("/changes");
+    source.addEventListener("change", function (message) {
+        if (window.dash_clientside && window.dash_clientside.set_props) {
+            window.dash_clientside.set_props("change-feed", {data: JSON.parse(message.data)});
+        }
+    });
+})();
@@ -0,0 +1,58 @@
+/* assets/lazy_images.js
+   Lazy loading for poster images (html.Img has no "loading" prop): images with the
+   lazy-poster class start with a placeholder src, and their data-src/data-srcset
+   (see images.poster_props) are only copied into src/srcset once they come within
+   a few hundred pixels of the viewport. */
+
+(function () {
+    function load(img) {
+        var src = img.getAttribute("data-src");
+        if (!src || img.getAttribute("data-loaded") === src) {
+            return;
+        }
+        img.setAttribute("data-loaded", src);
+        if (img.getAttribute("data-srcset")) {
+            img.srcset = img.getAttribute("data-srcset");
+        }
+        img.src = src;
+    }
+
+    var observer = "IntersectionObserver" in window ? new IntersectionObserver(function (entries) {
+        entries.forEach(function (entry) {
+            if (entry.isIntersecting) {
+                observer.unobserve(entry.target);
+                load(entry.target);
+            }
+        });
+    }, {rootMargin: "300px 0px"}) : null;
+
+    function watch(root) {
+        var images = root.querySelectorAll ? root.querySelectorAll("img.lazy-poster") : [];
+        Array.prototype.forEach.call(images, function (img) {
+            if (img.getAttribute("data-loaded") === img.getAttribute("data-src")) {
+                return;
+            }
+            if (observer) {
+                observer.observe(img);
+            } else {
+                load(img);
+            }
+        });
+    }
+
+    // Dash renders pages after this script runs, so watch for cards being added or re-rendered
+    new MutationObserver(function (mutations) {
+        mutations.forEach(function (mutation) {
+            if (mutation.type === "attributes") {
+                watch(mutation.target.parentNode || mutation.target);
+            }
+            mutation.addedNodes.forEach(function (node) {
+                if (node.nodeType === 1) {
+                    watch(node.parentNode || node);
+                }
+            });
+        });
+    }).observe(document.documentElement, {childList: true, subtree: true, attributes: true, attributeFilter: ["data-src"]});
+
+    watch(document);
+})();
@@ -0,0 +1,159 @@
+/* assets/movies.js
+   Client-side movie search for pages/1_movies.py: filters the catalog shipped in
+   movie-catalog-store so typing in search-movie-input never calls the server. */
+
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    movies: {
+        filterCatalog: function (searchValue, catalog) {
+            var query = (searchValue || "").trim().toLowerCase();
+            if (!query) {
+                // Empty search: show the schedule cards rendered by the server
+                return [[], "", {"display": "block"}];
+            }
+            if (!catalog || !catalog.rows) {
+                return [[], "Loading movies...", {"display": "none"}];
+            }
+
+            var matches = searchCatalog(catalog, query);
+            if (!matches.length) {
+                return [[], "No movies match your search.", {"display": "none"}];
+            }
+            var cards = matches.map(function (number) {
+                return movieCard(catalog.rows[number]);
+            });
+            return [cards, "", {"display": "none"}];
+        }
+    }
+});
+
+// Row numbers whose title token starts with word, found by binary search in the sorted index
+function prefixMatches(index, word) {
+    var low = 0, high = index.length;
+    while (low < high) {
+        var middle = (low + high) >> 1;
+        if (index[middle][0] < word) { low = middle + 1; } else { high = middle; }
+    }
+    var found = {};
+    for (var i = low; i < index.length && index[i][0].lastIndexOf(word, 0) === 0; i++) {
+        index[i][1].forEach(function (number) { found[number] = true; });
+    }
+    return found;
+}
+
+// Titles matching every word of the query; words that start a title token rank first,
+// other titles that merely contain the query (like the old ILIKE '%x%') follow
+function searchCatalog(catalog, query) {
+    var words = query.split(/\W+/).filter(Boolean);
+    var ranked = [];
+    var seen = {};
+
+    if (words.length) {
+        var candidates = prefixMatches(catalog.index, words[0]);
+        words.slice(1).forEach(function (word) {
+            var next = prefixMatches(catalog.index, word);
+            Object.keys(candidates).forEach(function (number) {
+                if (!next[number]) { delete candidates[number]; }
+            });
+        });
+        Object.keys(candidates).forEach(function (number) {
+            ranked.push(Number(number));
+            seen[number] = true;
+        });
+        ranked.sort(function (a, b) { return a - b; });
+    }
+
+    catalog.rows.forEach(function (row, number) {
+        if (!seen[number] && String(row[0] || "").toLowerCase().indexOf(query) !== -1) {
+            ranked.push(number);
+        }
+    });
+    return ranked;
+}
+
+// Mirrors images.poster_url / poster_props: resized posters, loaded by lazy_images.js
+var PLACEHOLDER = "data:image/gif;base64,R0lGODlhAQABAIAAAAAAAP///yH5BAEAAAAALAAAAAABAAEAAAIBRAA7";
+
+function posterUrl(src, height) {
+    return "/posters/" + height + "?src=" + encodeURIComponent(src);
+}
+
+function component(type, props) {
+    return {type: type, namespace: "dash_html_components", props: props};
+}
+
+// Same card markup as the server-rendered movie cards
+function movieCard(row) {
+    var title = row[0], ratings = row[1], picture = row[2], description = row[3];
+    return component("Div", {
+        className: "card",
+        style: {"width": "18rem", "border": "1px solid #444", "boxShadow": "0px 4px 8px rgba(0,0,0,0.3)"},
+        children: [
+            component("Img", {
+                src: PLACEHOLDER, alt: title, className: "card-img-top lazy-poster",
+                "data-src": posterUrl(picture, 300),
+                "data-srcset": posterUrl(picture, 300) + " 1x, " + posterUrl(picture, 600) + " 2x",
+                style: {"height": "300px", "objectFit": "cover"}
+            }),
+            component("Div", {
+                className: "card-body",
+                style: {"backgroundColor": "#333"},
+                children: [
+                    component("H5", {
+                        children: title, className: "card-title",
+                        style: {"color": "white", "textAlign": "center"}
+                    }),
+                    component("P", {
+                        children: "Ratings: " + ratings, className: "card-text",
+                        style: {"color": "yellow", "fontSize": "16px", "textAlign": "center"}
+                    }),
+                    component("P", {
+                        children: description, className: "card-text",
+                        style: {"color": "white", "fontSize": "12px", "textAlign": "center"}
+                    })
+                ]
+            })
+        ]
+    });
+}
+
+// Infinite scroll for the schedule cards: click Load more (schedule-load-more) when it
+// comes within a screen of the viewport. Only one window is requested at a time; the
+// next click waits until the cards of the previous one have arrived.
+(function () {
+    var pending = false;
+    var watched = null;
+
+    var observer = "IntersectionObserver" in window ? new IntersectionObserver(function (entries) {
+        entries.forEach(function (entry) {
+            var button = entry.target;
+            if (entry.isIntersecting && !pending && button.style.display !== "none") {
+                pending = true;
+                button.click();
+            }
+        });
+    }, {rootMargin: "100% 0px"}) : null;
+
+    new MutationObserver(function (mutations) {
+        var button = document.getElementById("schedule-load-more");
+        if (button !== watched && observer) {
+            if (watched) {
+                observer.unobserve(watched);
+            }
+            if (button) {
+                observer.observe(button);
+            }
+            watched = button;
+        }
+        // New cards (or a hidden button on the last window) end the pending request;
+        // re-observing fires again if the button is still on screen
+        if (pending && mutations.some(function (mutation) {
+            return mutation.target.id === "movies-card-container" || mutation.target === button;
+        })) {
+            pending = false;
+            if (button && observer) {
+                observer.unobserve(button);
+                observer.observe(button);
+            }
+        }
+    }).observe(document.documentElement, {childList: true, subtree: true, attributes: true, attributeFilter: ["style"]});
+})();
@@ -0,0 +1,157 @@
+import asyncio
+import datetime
+import decimal
+import threading
+import time
+
+import asyncpg
+
+from database import Query, db_config, notify_query_listeners, pool_config, result_cache, to_server_placeholders
+
+_loop = None
+_loop_lock = threading.Lock()
+_pool = None
+_pool_lock = None
+
+
+def get_loop():
+    """Event loop running on a daemon thread, shared by every synchronous caller in this process."""
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="async-database", daemon=True).start()
+    return _loop
+
+
+async def _init_connection(conn):
+    # Send dates and numerics as text, like psycopg2 does, so values that went
+    # through JSON (e.g. '2024-01-31' keys from a dcc.Store) can still be bound
+    await conn.set_type_codec(
+        'date', schema='pg_catalog', format='text',
+        encoder=str, decoder=datetime.date.fromisoformat
+    )
+    await conn.set_type_codec(
+        'numeric', schema='pg_catalog', format='text',
+        encoder=str, decoder=decimal.Decimal
+    )
+
+
+async def get_pool():
+    """asyncpg pool configured from pool_config; asyncpg caches prepared statements per connection."""
+    global _pool, _pool_lock
+    if _pool_lock is None:
+        _pool_lock = asyncio.Lock()
+    async with _pool_lock:
+        if _pool is None:
+            _pool = await asyncpg.create_pool(
+                database=db_config['dbname'],
+                user=db_config['user'],
+                password=db_config['password'],
+                host=db_config['host'],
+                port=int(db_config['port']),
+                min_size=pool_config['min_size'],
+                max_size=pool_config['async_max_size'],
+                max_inactive_connection_lifetime=pool_config['max_idle'],
+                timeout=pool_config['wait_timeout'],
+                init=_init_connection
+            )
+    return _pool
+
+
+async def fetch_query(query, cache_table=None, raise_errors=False):
+    """
+    Async version of database.fetch_query; shares its result cache.
+    Errors are printed and give [] unless raise_errors is set.
+    """
+    sql, params = query.build() if isinstance(query, Query) else query
+    key = (sql, tuple(tuple(param) if isinstance(param, list) else param for param in params))
+    if cache_table:
+        cached = result_cache.get(key)
+        if cached is not None:
+            return cached
+
+    try:
+        started = time.perf_counter()
+        pool = await get_pool()
+        async with pool.acquire(timeout=pool_config['wait_timeout']) as conn:
+            records = await conn.fetch(to_server_placeholders(sql), *params)
+        results = [dict(record) for record in records]
+        notify_query_listeners(sql, params, time.perf_counter() - started, results)
+    except Exception as e:
+        print(f"Database error: {e}")
+        if raise_errors:
+            raise
+        return []
+
+    if cache_table:
+        result_cache.put(cache_table, key, results)
+    return results
+
+
+async def fetch_data(table_name, columns="*", conditions=None, order_column=None, order_direction='ASC', limit=None, params=None, use_cache=True):
+    """Async version of database.fetch_data, same arguments and result."""
+    try:
+        query = Query(table_name, columns)
+        if conditions:
+            query.where(conditions, *(params or []))
+        if order_column:
+            query.order_by(order_column, order_direction)
+        if limit:
+            query.limit(limit)
+    except ValueError as e:
+        print(f"Database error: {e}")
+        return []
+
+    return await fetch_query(query, cache_table=table_name if use_cache else None)
+
+
+async def fetch_many_async(queries, cache_table=None, raise_errors=False):
+    """
+    Run several queries concurrently and return their results in the same order.
+    - queries: Query objects (cached under their own table) or (sql, params) pairs
+    - cache_table: cache every result under this table instead
+    - raise_errors: raise the first query error instead of returning [] for that query
+    """
+    return await asyncio.gather(*(
+        fetch_query(query, cache_table or (query.table_name if isinstance(query, Query) else None), raise_errors)
+        for query in queries
+    ))
+
+
+def run(coroutine):
+    """Run a coroutine on the shared event loop and wait for its result; usable from Dash callbacks."""
+    return asyncio.run_coroutine_threadsafe(coroutine, get_loop()).result()
+
+
+def fetch_many(queries, cache_table=None, raise_errors=False):
+    """
+    Blocking wrapper around fetch_many_async for synchronous callbacks, e.g.
+        reports, top_movies = fetch_many([Query("reports"), Query("movies").limit(4)])
+    The call takes as long as the slowest query rather than the sum of all of them.
+    """
+    return run(fetch_many_async(queries, cache_table, raise_errors))
+
+
+def close_pool():
+    """Close the asyncpg pool, e.g. in the gunicorn master before workers are forked."""
+    global _pool
+    if _pool is not None and _loop is not None:
+        try:
+            run(_pool.close())
+        except Exception as e:
+            print(f"Database error: {e}")
+    _pool = None
+
+
+def reset_after_fork():
+    """
+    Forget the event loop and pool inherited from the parent process: the loop's
+    thread did not survive the fork and the pool's sockets belong to the parent.
+    Both are recreated on next use.
+    """
+    global _loop, _loop_lock, _pool, _pool_lock
+    _loop = None
+    _loop_lock = threading.Lock()
+    _pool = None
+    _pool_lock = None
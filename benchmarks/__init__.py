@@ -0,0 +1,31 @@
+"""
+Synthetic data and latency/memory/payload benchmarks for the page callbacks,
+plus a concurrent ticket booking benchmark.
+
+    python -m benchmarks.seed --scale 1k
+    python -m benchmarks.run --scale 1k --compare benchmarks/baseline.json
+    python -m benchmarks.booking --seats 2000 --threads 32
+
+All commands work against a separate benchmark database (BENCH_DBNAME,
+default IE172BENCH) so the real data is never touched.
+"""
+import os
+
+import database
+
+SCALES = {
+    '1k': 1_000,
+    '100k': 100_000,
+    '10m': 10_000_000
+}
+
+BENCH_DBNAME = os.environ.get('BENCH_DBNAME', 'IE172BENCH')
+
+
+def use_benchmark_database():
+    """Point database.db_config (and so every pool) at the benchmark database; call before any query."""
+    database.db_config['dbname'] = BENCH_DBNAME
+    for name in ('host', 'port', 'user', 'password'):
+        value = os.environ.get(f'BENCH_DB{name.upper()}')
+        if value:
+            database.db_config[name] = value
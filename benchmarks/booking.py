@@ -0,0 +1,126 @@
+"""
+Hammer one showing with concurrent reserve/confirm/release calls until it sells
+out, then check that no seat was sold twice and report booking throughput.
+"""
+import argparse
+import random
+import sys
+import threading
+import time
+
+import booking
+import database
+from benchmarks import use_benchmark_database
+from benchmarks.run import percentile
+from benchmarks.seed import create_database
+
+MOVIE_TITLE = "Benchmark Premiere"
+SHOWTIME = "00:00"
+
+
+def prepare_showing(seats):
+    """A fresh scheduling row for the benchmark showing, with no inventory or holds yet."""
+    booking.create_booking_tables()
+    for table in ('scheduling', 'seat_inventory', 'seat_holds'):
+        database.execute(f"DELETE FROM {table} WHERE movie_title = %s", [MOVIE_TITLE])
+    database.execute(
+        "INSERT INTO scheduling (link_to_pictures, movie_title, showtimes, duration, capacity) "
+        "VALUES ('', %s, %s, 120, %s)",
+        [MOVIE_TITLE, SHOWTIME, seats]
+    )
+
+
+def buyer(results, max_group, abandon_rate, seed):
+    """Reserve 1..max_group seats at a time, abandoning some holds, until the showing sells out."""
+    rng = random.Random(seed)
+    timings = results['timings']
+    while True:
+        count = rng.randint(1, max_group)
+        started = time.perf_counter()
+        try:
+            hold = booking.reserve(MOVIE_TITLE, SHOWTIME, count=count)
+        except booking.SeatsUnavailable:
+            seats = booking.seat_map(MOVIE_TITLE, SHOWTIME)
+            if seats['available'] == 0 and not seats['held']:
+                return
+            if seats['available'] == 0:
+                time.sleep(0.001)  # Someone else's hold may still be released
+            max_group = max(1, min(max_group, seats['available']))
+            continue
+        timings['reserve'].append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        if rng.random() < abandon_rate:
+            booking.release(hold['hold_token'])
+            timings['release'].append(time.perf_counter() - started)
+        else:
+            booking.confirm(hold['hold_token'])
+            timings['confirm'].append(time.perf_counter() - started)
+            with results['lock']:
+                results['sold'].extend(hold['seats'])
+
+
+def verify(seats):
+    """Return a list of problems: oversold, double-sold or leftover seats."""
+    problems = []
+    inventory = booking.seat_map(MOVIE_TITLE, SHOWTIME)
+    rows = database.run_query(
+        "SELECT seats FROM seat_holds WHERE movie_title = %s AND status = 'confirmed'", [MOVIE_TITLE]
+    )
+    confirmed = [seat for row in rows for seat in row['seats']]
+    if len(confirmed) != len(set(confirmed)):
+        problems.append(f"{len(confirmed) - len(set(confirmed))} seats confirmed more than once")
+    if len(confirmed) > seats:
+        problems.append(f"oversold: {len(confirmed)} confirmed seats for a capacity of {seats}")
+    if sorted(confirmed) != inventory['sold']:
+        problems.append("confirmed holds and the sold bitmap disagree")
+    if inventory['held'] or inventory['available']:
+        problems.append(f"{len(inventory['held'])} seats still held, {inventory['available']} unsold")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--seats', type=int, default=2000, help="capacity of the benchmark showing")
+    parser.add_argument('--threads', type=int, default=32, help="concurrent buyers")
+    parser.add_argument('--group', type=int, default=4, help="most seats one buyer takes at a time")
+    parser.add_argument('--abandon', type=float, default=0.2, help="share of holds released instead of bought")
+    args = parser.parse_args()
+
+    use_benchmark_database()
+    create_database()
+    # One connection per buyer, so the row lock (not the pool) is what they queue on
+    database.pool.max_size = args.threads + 2
+    prepare_showing(args.seats)
+
+    results = {'timings': {'reserve': [], 'confirm': [], 'release': []}, 'sold': [], 'lock': threading.Lock()}
+    threads = [
+        threading.Thread(target=buyer, args=(results, args.group, args.abandon, number))
+        for number in range(args.threads)
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    operations = sum(len(samples) for samples in results['timings'].values())
+    print(f"{args.threads} buyers sold {len(results['sold'])} of {args.seats} seats in {elapsed:.2f}s "
+          f"({operations / elapsed:.0f} operations/s)")
+    print(f"{'operation':<10} {'count':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for name, samples in results['timings'].items():
+        if samples:
+            print(f"{name:<10} {len(samples):>7} {percentile(samples, 0.50) * 1000:>9.2f} "
+                  f"{percentile(samples, 0.95) * 1000:>9.2f} {percentile(samples, 0.99) * 1000:>9.2f}")
+
+    problems = verify(args.seats)
+    if problems:
+        for problem in problems:
+            print("FAIL: " + problem)
+        sys.exit(1)
+    print("OK: every seat sold exactly once")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,187 @@
+"""
+Call each page callback directly against the benchmark database and report
+p50/p95/p99 latency, peak Python memory and response payload size.
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from plotly.utils import PlotlyJSONEncoder
+
+from benchmarks import SCALES, use_benchmark_database
+from benchmarks.seed import WORDS
+
+BASELINE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# A p95 latency, peak memory or payload this much above the baseline counts as a regression
+REGRESSION_THRESHOLD = 0.25
+
+
+def json_size(result):
+    """Bytes of the JSON Dash would send back for a callback result."""
+    return len(json.dumps(result, cls=PlotlyJSONEncoder).encode())
+
+
+def load_pages():
+    use_benchmark_database()
+    import app  # noqa: F401 -- creates the Dash app, which imports and registers every page
+    return {name: sys.modules[f"pages.{name}"] for name in ('1_movies', '2_producers', '3_customers', '4_reports')}
+
+
+def benchmark_cases(pages, scratch_dir):
+    """Map case name -> (call(search_term), payload_size(result))."""
+    import exports
+    from figure_cache import data_version
+
+    movies, producers, customers, reports = (pages[name] for name in ('1_movies', '2_producers', '3_customers', '4_reports'))
+    sorted_by_amount = [{'column_id': 'amount_paid', 'direction': 'desc'}]
+    xlsx_path = os.path.join(scratch_dir, "customers.xlsx")
+
+    def export_xlsx(term):
+        exports.write_xlsx(xlsx_path, term)
+        return os.path.getsize(xlsx_path)
+
+    cases = {
+        "movies.update_movies": (lambda term: movies.update_movies('schedule-section', None, None), json_size),
+        "movies.refresh_movie_catalog": (lambda term: movies.refresh_movie_catalog(None, None), json_size),
+        "producers.update_table": (lambda term: producers.update_table(term), json_size),
+        "customers.fetch_customer_snapshot": (lambda term: customers.fetch_customer_snapshot(term), json_size),
+        "customers.update_customer_table": (lambda term: customers.update_customer_table(term, 0, 10, [], '', None, None), json_size),
+        "customers.update_customer_table[page 5, sorted]": (
+            lambda term: customers.update_customer_table(term, 5, 10, sorted_by_amount, '', None, None), json_size
+        ),
+        "customers.show_modal_details": (
+            lambda term: customers.show_modal_details({'row': 0, 'column': 0, 'row_id': 'T000000001'}), json_size
+        ),
+        "customers.generate_top_spending_customers_chart": (
+            lambda term: customers.generate_top_spending_customers_chart(term), json_size
+        ),
+        "customers.generate_ticket_purchase_trends": (
+            lambda term: customers.generate_ticket_purchase_trends(term), json_size
+        ),
+        "exports.csv": (lambda term: sum(len(chunk.encode()) for chunk in exports.iter_csv(term)), lambda size: size),
+        "exports.xlsx": (export_xlsx, lambda size: size)
+    }
+    # The app builds report figures in its job pool; here they are built in this process, so the
+    # redirected figure cache is the one used and their memory is traced with the rest
+    for tab in ('tab-1', 'tab-2', 'tab-3'):
+        cases[f"reports.render_tab_content[{tab}]"] = (
+            lambda term, tab=tab: reports.tab_content(
+                tab, reports.build_report_figures(data_version(*reports.REPORT_TABLES))
+            ), json_size
+        )
+    return cases
+
+
+def reset_caches(pages):
+    """Drop every in-process and on-disk cache so each call measures the full database work."""
+    import database
+    import figure_cache
+
+    database.result_cache.invalidate()
+    figure_cache._memory.clear()
+    shutil.rmtree(figure_cache.CACHE_DIR, ignore_errors=True)
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def run_case(call, payload_size, iterations, warm, pages):
+    terms = [random.choice(WORDS) for _ in range(iterations)]
+    timings = []
+    payload = 0
+    for term in terms:
+        if not warm:
+            reset_caches(pages)
+        started = time.perf_counter()
+        result = call(term)
+        timings.append((time.perf_counter() - started) * 1000)
+        payload = max(payload, payload_size(result))
+
+    # Memory is traced on a separate call: tracemalloc would distort the timings
+    if not warm:
+        reset_caches(pages)
+    tracemalloc.start()
+    call(terms[0])
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {
+        "p50_ms": round(percentile(timings, 0.50), 2),
+        "p95_ms": round(percentile(timings, 0.95), 2),
+        "p99_ms": round(percentile(timings, 0.99), 2),
+        "peak_kib": round(peak / 1024, 1),
+        "payload_kib": round(payload / 1024, 1)
+    }
+
+
+def compare(results, baseline):
+    """Return a list of human-readable regressions against a stored baseline."""
+    regressions = []
+    for name, result in results.items():
+        previous = baseline.get(name)
+        if not previous:
+            continue
+        for metric in ("p95_ms", "peak_kib", "payload_kib"):
+            if previous[metric] and result[metric] > previous[metric] * (1 + REGRESSION_THRESHOLD):
+                regressions.append(f"{name}: {metric} {previous[metric]} -> {result[metric]}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--scale', choices=SCALES, default='1k', help="scale the database was seeded with")
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--warm', action='store_true', help="keep caches between calls")
+    parser.add_argument('--only', help="run only cases whose name contains this text")
+    parser.add_argument('--save-baseline', action='store_true', help="store the results as the baseline for this scale")
+    parser.add_argument('--compare', help="baseline JSON to compare against (default: the stored baseline for this scale)")
+    args = parser.parse_args()
+
+    random.seed(172)
+    pages = load_pages()
+    scratch_dir = tempfile.mkdtemp(prefix="ie172-bench-")
+    import figure_cache
+    figure_cache.CACHE_DIR = os.path.join(scratch_dir, "figures")  # Never touch the app's own figure cache
+
+    results = {}
+    try:
+        print(f"{'case':<52} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'peak KiB':>10} {'payload KiB':>12}")
+        for name, (call, payload_size) in benchmark_cases(pages, scratch_dir).items():
+            if args.only and args.only not in name:
+                continue
+            result = run_case(call, payload_size, args.iterations, args.warm, pages)
+            results[name] = result
+            print(f"{name:<52} {result['p50_ms']:>9} {result['p95_ms']:>9} {result['p99_ms']:>9} "
+                  f"{result['peak_kib']:>10} {result['payload_kib']:>12}")
+    finally:
+        shutil.rmtree(scratch_dir, ignore_errors=True)
+
+    mode = "warm" if args.warm else "cold"
+    baseline_path = args.compare or os.path.join(BASELINE_DIR, f"baseline-{args.scale}-{mode}.json")
+    if args.save_baseline:
+        with open(baseline_path, 'w') as baseline_file:
+            json.dump(results, baseline_file, indent=2, sort_keys=True)
+            baseline_file.write("\n")
+        print(f"Saved baseline to {baseline_path}")
+    elif os.path.exists(baseline_path):
+        with open(baseline_path) as baseline_file:
+            regressions = compare(results, json.load(baseline_file))
+        if regressions:
+            print("Regressions against " + baseline_path)
+            for regression in regressions:
+                print("  " + regression)
+            sys.exit(1)
+        print(f"No regressions against {baseline_path}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+"""Create the benchmark database and fill it with synthetic rows at a given scale."""
+import argparse
+import time
+
+import psycopg2
+
+import database
+import migrate
+from benchmarks import BENCH_DBNAME, SCALES, use_benchmark_database
+
+SCHEMA = [
+    "CREATE TABLE movies (link_to_pictures text, title text, ratings numeric(3, 1), description text)",
+    "CREATE TABLE scheduling (link_to_pictures text, movie_title text, showtimes text, duration integer, capacity integer)",
+    "CREATE TABLE producers (name text, address text, contact_information text, current_balance numeric(12, 2))",
+    "CREATE TABLE customers (name text, address text, telephone_number text, email text, ticket_purchase text, "
+    "ticket_number text, date date, unit_price numeric(8, 2), amount_paid numeric(10, 2), tickets_purchased integer)",
+    "CREATE TABLE reports (year integer, annual_revenue numeric(14, 2), new_members integer, annual_expenses numeric(14, 2))"
+]
+
+# Words titles and names are made of, so searches hit a realistic share of rows
+WORDS = ['star', 'night', 'river', 'ghost', 'summer', 'city', 'storm', 'dragon', 'love', 'last',
+         'secret', 'winter', 'shadow', 'golden', 'lost', 'empire', 'ocean', 'fire', 'dream', 'iron']
+
+
+def word_sql(offset, number="i"):
+    # Pick a pseudo-random word from WORDS for row number (an SQL expression over generate_series' i).
+    # offset must share no factor with len(WORDS), or only some of the words are ever picked
+    words = ", ".join(f"'{word}'" for word in WORDS)
+    return f"(ARRAY[{words}])[1 + (({number} * {offset}) % {len(WORDS)})]"
+
+
+def title_sql(number="i"):
+    # Title of movie number, shared by movies, scheduling and customers so they join up
+    return f"initcap({word_sql(7, number)} || ' ' || {word_sql(13, number)}) || ' ' || {number}"
+
+
+def seed_statements(rows):
+    """INSERT ... SELECT FROM generate_series statements sized from the customers row count."""
+    movies = max(rows // 100, 20)
+    schedules = max(rows // 10, 20)
+    producers = max(rows // 100, 20)
+    movie = f"(1 + i % {movies})"  # Movie shown by scheduling / bought by customers row i
+    return [
+        ("movies", movies,
+         f"INSERT INTO movies SELECT 'https://posters.example.com/' || i || '.jpg', "
+         f"{title_sql()}, round((1 + random() * 9)::numeric, 1), "
+         f"'A ' || {word_sql(3)} || ' story about the ' || {word_sql(11)} FROM generate_series(1, {movies}) i"),
+        ("scheduling", schedules,
+         f"INSERT INTO scheduling SELECT 'https://posters.example.com/' || {movie} || '.jpg', "
+         f"{title_sql(movie)}, "
+         f"to_char(time '10:00' + (i % 12) * interval '1 hour', 'HH24:MI'), 90 + i % 60, 50 + i % 150 "
+         f"FROM generate_series(1, {schedules}) i"),
+        ("producers", producers,
+         f"INSERT INTO producers SELECT initcap({word_sql(9)} || ' ' || {word_sql(19)}) || ' Pictures ' || i, i || ' Main St', "
+         f"'producer' || i || '@example.com', round((random() * 100000)::numeric, 2) FROM generate_series(1, {producers}) i"),
+        ("customers", rows,
+         f"INSERT INTO customers SELECT initcap({word_sql(17)}) || ' Customer ' || i, i || ' Side St', "
+         f"'555-' || lpad((i % 10000)::text, 4, '0'), 'customer' || i || '@example.com', "
+         f"{title_sql(movie)}, 'T' || lpad(i::text, 9, '0'), date '2020-01-01' + (i % 1500), "
+         f"12.50, 12.50 * (1 + i % 6), 1 + i % 6 FROM generate_series(1, {rows}) i"),
+        ("reports", 20,
+         "INSERT INTO reports SELECT 2004 + i, 1000000 + i * 50000, 100 + i * 10, 800000 + i * 30000 "
+         "FROM generate_series(1, 20) i")
+    ]
+
+
+def create_database():
+    admin_config = dict(database.db_config, dbname='postgres')
+    conn = psycopg2.connect(**admin_config)
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM pg_database WHERE datname = %s", [BENCH_DBNAME])
+            if not cursor.fetchone():
+                cursor.execute(f'CREATE DATABASE "{BENCH_DBNAME}"')
+    finally:
+        conn.close()
+
+
+def seed(rows):
+    use_benchmark_database()
+    create_database()
+
+    conn = psycopg2.connect(**database.db_config)
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cursor:
+            for table in ('movies', 'scheduling', 'producers', 'customers', 'reports'):
+                cursor.execute(f"DROP TABLE IF EXISTS {table} CASCADE")
+            for statement in SCHEMA:
+                cursor.execute(statement)
+            for table, count, statement in seed_statements(rows):
+                started = time.perf_counter()
+                cursor.execute(statement)
+                print(f"{table}: {count:,} rows in {time.perf_counter() - started:.1f}s")
+    finally:
+        conn.close()
+
+    # Dropping the tables took their indexes, triggers and views with them
+    migrate.migrate()
+    database.execute("ANALYZE")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--scale', choices=SCALES, default='1k', help="customers row count")
+    args = parser.parse_args()
+    seed(SCALES[args.scale])
+
+
+if __name__ == '__main__':
+    main()
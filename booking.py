@@ -0,0 +1,301 @@
+import secrets
+import threading
+
+import psycopg2
+
+from database import create_index, transaction
+
+# Seconds a reservation holds its seats before they go back on sale
+HOLD_SECONDS = 300
+
+# Seconds between sweeps releasing expired holds
+EXPIRY_INTERVAL = 30
+
+# Seats per row on the seat map (A1..A10, B1..)
+SEATS_PER_ROW = 10
+
+# Most seats one reservation may take
+MAX_SEATS_PER_HOLD = 10
+
+# Per-showtime seat inventory: bit n of sold/held is seat n (little-endian bytea
+# bitmaps, one bit per seat). Rows are created from scheduling.capacity on first use.
+BOOKING_TABLES = [
+    "CREATE TABLE IF NOT EXISTS seat_inventory ("
+    "movie_title text NOT NULL, showtimes text NOT NULL, capacity integer NOT NULL, "
+    "sold bytea NOT NULL DEFAULT ''::bytea, held bytea NOT NULL DEFAULT ''::bytea, "
+    "PRIMARY KEY (movie_title, showtimes))",
+    "CREATE TABLE IF NOT EXISTS seat_holds ("
+    "hold_id bigserial PRIMARY KEY, movie_title text NOT NULL, showtimes text NOT NULL, "
+    "seats integer[] NOT NULL, status text NOT NULL DEFAULT 'held', "
+    "expires_at timestamptz NOT NULL, created_at timestamptz NOT NULL DEFAULT now(), ticket_number text)",
+    # Secret handed to whoever made the hold; confirm() and release() require it
+    "ALTER TABLE seat_holds ADD COLUMN IF NOT EXISTS hold_token text",
+    # Finds a showtime's live holds, and the expired ones for the sweeper
+    "CREATE INDEX IF NOT EXISTS seat_holds_held_idx ON seat_holds (movie_title, showtimes, expires_at) "
+    "WHERE status = 'held'"
+]
+
+# Random bytes in a hold token (URL-safe base64 encoded)
+HOLD_TOKEN_BYTES = 24
+
+
+class BookingError(Exception):
+    """A reservation could not be made or completed."""
+
+
+class SeatsUnavailable(BookingError):
+    """The requested seats are sold or held by someone else."""
+
+
+class HoldNotActive(BookingError):
+    """The hold was already confirmed, released or has expired."""
+
+
+def create_booking_tables():
+    """Create the seat inventory and hold tables (run by migrate.py)."""
+    with transaction() as conn:
+        with conn.cursor() as cursor:
+            for statement in BOOKING_TABLES:
+                cursor.execute(statement)
+    create_index("seat_holds", ["hold_token"], unique=True)
+
+
+def to_bitmap(bits, capacity):
+    """int with bit n set for seat n -> bytea bitmap of capacity bits."""
+    return psycopg2.Binary(bits.to_bytes((capacity + 7) // 8, 'little'))
+
+
+def from_bitmap(data):
+    """bytea bitmap -> int with bit n set for seat n."""
+    return int.from_bytes(bytes(data or b''), 'little')
+
+
+def seat_numbers(bits):
+    """Seat numbers whose bit is set."""
+    return [seat for seat in range(bits.bit_length()) if bits >> seat & 1]
+
+
+def seat_label(seat):
+    """0 -> 'A1', 10 -> 'B1', ... rows after Z are AA, AB, ..."""
+    row, number = divmod(seat, SEATS_PER_ROW)
+    letters = ""
+    row += 1
+    while row:
+        row, remainder = divmod(row - 1, 26)
+        letters = chr(ord('A') + remainder) + letters
+    return f"{letters}{number + 1}"
+
+
+def _lock_inventory(cursor, movie_title, showtimes):
+    """Lock a showtime's inventory row (creating it from scheduling) and return (capacity, sold, held)."""
+    select = ("SELECT capacity, sold, held FROM seat_inventory "
+              "WHERE movie_title = %s AND showtimes = %s FOR UPDATE")
+    cursor.execute(select, [movie_title, showtimes])
+    row = cursor.fetchone()
+    if row is None:
+        cursor.execute(
+            "INSERT INTO seat_inventory (movie_title, showtimes, capacity) "
+            "SELECT movie_title, showtimes::text, max(capacity) FROM scheduling "
+            "WHERE movie_title = %s AND showtimes::text = %s GROUP BY movie_title, showtimes::text "
+            "ON CONFLICT DO NOTHING",
+            [movie_title, showtimes]
+        )
+        cursor.execute(select, [movie_title, showtimes])
+        row = cursor.fetchone()
+        if row is None:
+            raise BookingError(f"No showing of {movie_title!r} at {showtimes}")
+    return row[0], from_bitmap(row[1]), from_bitmap(row[2])
+
+
+def _expire_locked(cursor, movie_title, showtimes, held):
+    """Expire a locked showtime's overdue holds; return the held bitmap without their seats."""
+    cursor.execute(
+        "UPDATE seat_holds SET status = 'expired' WHERE movie_title = %s AND showtimes = %s "
+        "AND status = 'held' AND expires_at <= now() RETURNING seats",
+        [movie_title, showtimes]
+    )
+    for (seats,) in cursor.fetchall():
+        for seat in seats:
+            held &= ~(1 << seat)
+    return held
+
+
+def _save_inventory(cursor, movie_title, showtimes, capacity, sold, held):
+    cursor.execute(
+        "UPDATE seat_inventory SET sold = %s, held = %s WHERE movie_title = %s AND showtimes = %s",
+        [to_bitmap(sold, capacity), to_bitmap(held, capacity), movie_title, showtimes]
+    )
+
+
+def reserve(movie_title, showtimes, count=1, seats=None, hold_seconds=HOLD_SECONDS):
+    """
+    Hold seats for a showing until confirm() or the hold expires.
+    - seats: specific seat numbers; otherwise the first count free seats are taken
+    Returns {'hold_id', 'hold_token', 'seats', 'expires_at'}; raises SeatsUnavailable if
+    they are taken. Only the hold_token can confirm or release the hold, so keep it
+    where just the customer sees it. Concurrent reservations for one showing queue on
+    its inventory row lock, so a seat can never be handed out twice.
+    """
+    count = len(seats) if seats else count
+    if not 1 <= count <= MAX_SEATS_PER_HOLD:
+        raise BookingError(f"Between 1 and {MAX_SEATS_PER_HOLD} seats can be reserved at once")
+
+    with transaction() as conn:
+        with conn.cursor() as cursor:
+            capacity, sold, held = _lock_inventory(cursor, movie_title, showtimes)
+            held = _expire_locked(cursor, movie_title, showtimes, held)
+            taken = sold | held
+
+            if seats:
+                if any(seat < 0 or seat >= capacity or taken >> seat & 1 for seat in seats):
+                    raise SeatsUnavailable("Some of those seats are no longer available")
+                chosen = sorted(set(seats))
+            else:
+                chosen = []
+                for seat in range(capacity):
+                    if not taken >> seat & 1:
+                        chosen.append(seat)
+                        if len(chosen) == count:
+                            break
+                if len(chosen) < count:
+                    raise SeatsUnavailable(f"Only {len(chosen)} seats are left")
+
+            for seat in chosen:
+                held |= 1 << seat
+            hold_token = secrets.token_urlsafe(HOLD_TOKEN_BYTES)
+            cursor.execute(
+                "INSERT INTO seat_holds (movie_title, showtimes, seats, expires_at, hold_token) "
+                "VALUES (%s, %s, %s, now() + %s * interval '1 second', %s) RETURNING hold_id, expires_at",
+                [movie_title, showtimes, chosen, hold_seconds, hold_token]
+            )
+            hold_id, expires_at = cursor.fetchone()
+            _save_inventory(cursor, movie_title, showtimes, capacity, sold, held)
+
+    return {'hold_id': hold_id, 'hold_token': hold_token, 'seats': chosen, 'expires_at': expires_at}
+
+
+def _finish_hold(hold_token, status, ticket_number=None):
+    """Move a live hold's seats to sold (status 'confirmed') or back on sale ('released')."""
+    error = None
+    with transaction() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                "SELECT hold_id, movie_title, showtimes FROM seat_holds WHERE hold_token = %s", [hold_token]
+            )
+            row = cursor.fetchone()
+            if row is None:
+                raise HoldNotActive("Unknown hold")
+            hold_id, movie_title, showtimes = row
+
+            # Inventory row first, then the hold: every writer locks in this order
+            capacity, sold, held = _lock_inventory(cursor, movie_title, showtimes)
+            held = _expire_locked(cursor, movie_title, showtimes, held)
+            cursor.execute(
+                "SELECT seats, status FROM seat_holds WHERE hold_id = %s FOR UPDATE", [hold_id]
+            )
+            seats, current_status = cursor.fetchone()
+
+            if current_status != 'held':
+                # Still commit, so an expiry found above is saved
+                error = HoldNotActive(f"Hold {hold_id} is {current_status}")
+            else:
+                for seat in seats:
+                    held &= ~(1 << seat)
+                    if status == 'confirmed':
+                        sold |= 1 << seat
+                cursor.execute(
+                    "UPDATE seat_holds SET status = %s, ticket_number = %s WHERE hold_id = %s",
+                    [status, ticket_number, hold_id]
+                )
+            _save_inventory(cursor, movie_title, showtimes, capacity, sold, held)
+
+    if error:
+        raise error
+    return {'hold_id': hold_id, 'seats': seats, 'status': status}
+
+
+def confirm(hold_token, ticket_number=None):
+    """Turn a live hold into sold seats; raises HoldNotActive if it expired, was already used or the token is wrong."""
+    return _finish_hold(hold_token, 'confirmed', ticket_number)
+
+
+def release(hold_token):
+    """Give a hold's seats back before it expires."""
+    return _finish_hold(hold_token, 'released')
+
+
+def expire_holds():
+    """
+    Put the seats of expired holds back on sale; returns the number of showings swept.
+    Showings whose inventory row is locked are skipped (SKIP LOCKED): whoever holds
+    the lock is booking that showing and expires its holds itself.
+    """
+    swept = 0
+    with transaction() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                "SELECT DISTINCT movie_title, showtimes FROM seat_holds "
+                "WHERE status = 'held' AND expires_at <= now()"
+            )
+            showings = cursor.fetchall()
+    for movie_title, showtimes in showings:
+        with transaction() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    "SELECT capacity, sold, held FROM seat_inventory "
+                    "WHERE movie_title = %s AND showtimes = %s FOR UPDATE SKIP LOCKED",
+                    [movie_title, showtimes]
+                )
+                row = cursor.fetchone()
+                if row is None:
+                    continue
+                capacity, sold, held = row[0], from_bitmap(row[1]), from_bitmap(row[2])
+                held = _expire_locked(cursor, movie_title, showtimes, held)
+                _save_inventory(cursor, movie_title, showtimes, capacity, sold, held)
+                swept += 1
+    return swept
+
+
+def start_expiry_schedule(interval=EXPIRY_INTERVAL):
+    """Sweep expired holds every interval seconds on a daemon thread."""
+    def run():
+        while not stop.wait(interval):
+            try:
+                expire_holds()
+            except Exception as e:
+                print(f"Database error: {e}")
+
+    stop = threading.Event()
+    threading.Thread(target=run, name="booking-expiry", daemon=True).start()
+    return stop
+
+
+def seat_map(movie_title, showtimes):
+    """
+    Current seats of a showing: {'capacity', 'sold', 'held', 'available'} with sold
+    and held as lists of seat numbers. Read without locking, so it may be a moment old.
+    """
+    with transaction() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                "SELECT capacity, sold, held FROM seat_inventory WHERE movie_title = %s AND showtimes = %s",
+                [movie_title, showtimes]
+            )
+            row = cursor.fetchone()
+            if row is None:
+                cursor.execute(
+                    "SELECT max(capacity) FROM scheduling WHERE movie_title = %s AND showtimes::text = %s",
+                    [movie_title, showtimes]
+                )
+                capacity = cursor.fetchone()[0]
+                if capacity is None:
+                    raise BookingError(f"No showing of {movie_title!r} at {showtimes}")
+                row = (capacity, b'', b'')
+
+    capacity, sold, held = row[0], from_bitmap(row[1]), from_bitmap(row[2])
+    return {
+        'capacity': capacity,
+        'sold': seat_numbers(sold),
+        'held': seat_numbers(held),
+        'available': capacity - bin(sold | held).count('1')
+    }
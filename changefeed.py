@@ -0,0 +1,283 @@
+"""
+Live change notifications: Postgres triggers (installed by migrate.py) NOTIFY on every
+write to the watched tables, one listener thread per app process receives them, drops
+the caches built from those tables and pushes a "change" event to every open browser
+tab over server-sent events (/changes). Pages react through the change-feed store.
+"""
+import json
+import queue
+import select
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import dash
+import psycopg2
+from dash.exceptions import MissingCallbackContextException
+from flask import Response
+
+import database
+import figure_cache
+import layout_cache
+
+# NOTIFY channel the triggers publish on
+CHANNEL = 'table_changes'
+
+# Tables whose writes are announced
+WATCHED_TABLES = ["customers", "movies", "scheduling", "producers", "reports"]
+
+# Statement-level triggers: one notification per table per transaction, however many rows it wrote
+# (Postgres also folds identical notifications sent within one transaction). Each write also
+# advances the table's change sequence, which figure_cache.data_version reads
+NOTIFY_FUNCTION_SQL = (
+    "CREATE OR REPLACE FUNCTION notify_table_change() RETURNS trigger LANGUAGE plpgsql AS $$ "
+    "BEGIN PERFORM nextval(format('%I.%I', TG_TABLE_SCHEMA, "
+    f"TG_TABLE_NAME || '{figure_cache.CHANGE_SEQUENCE_SUFFIX}')::regclass); "
+    f"PERFORM pg_notify('{CHANNEL}', json_build_object('table', TG_TABLE_NAME, 'op', TG_OP)::text); "
+    "RETURN NULL; END $$"
+)
+
+# Seconds the listener keeps collecting notifications before acting on them, so a burst
+# of transactions (e.g. a bulk ingest) costs one cache flush and one browser update
+DEBOUNCE_SECONDS = 0.25
+
+# Seconds of silence after which the listener pings its connection, so a dead link is noticed
+IDLE_PING_SECONDS = 30
+
+# Seconds to wait before reconnecting after the listener connection failed
+RECONNECT_SECONDS = 5
+
+# Open /changes streams per process; each one holds a server thread while it is open, and
+# gunicorn.conf.py adds this many threads to every worker so requests never wait behind them
+MAX_STREAMS = 8
+
+# Seconds a stream stays open before the browser is told to reconnect (frees the thread
+# of tabs that went away without closing the connection)
+STREAM_SECONDS = 120
+
+# Seconds between keep-alive comments on an idle stream
+HEARTBEAT_SECONDS = 15
+
+# Milliseconds the browser waits before reconnecting a closed stream, and when the server is full
+RETRY_MS = 2000
+BUSY_RETRY_MS = 30000
+
+# Events waiting for one slow browser before newer ones are dropped
+CLIENT_QUEUE_SIZE = 100
+
+_clients = set()
+_clients_lock = threading.Lock()
+_hooks = []
+_hook_executor = None
+_pending_tables = set()  # Changed tables waiting for the hook thread
+_pending_lock = threading.Lock()
+_listener = None
+_listener_lock = threading.Lock()
+
+
+def create_change_triggers():
+    """Install the NOTIFY trigger and change sequence on every watched table that exists (run by migrate.py)."""
+    with database.transaction() as conn:
+        with conn.cursor() as cursor:
+            # Concurrent CREATE OR REPLACE of one function fails, so processes take turns
+            cursor.execute("SELECT pg_advisory_xact_lock(hashtext('changefeed-triggers'))")
+            cursor.execute(
+                "SELECT relname FROM pg_class WHERE relname = ANY(%s) AND relkind = 'r' AND pg_table_is_visible(oid)",
+                [WATCHED_TABLES]
+            )
+            for (table_name,) in cursor.fetchall():
+                # Created in the same transaction as the function that advances them
+                cursor.execute(f"CREATE SEQUENCE IF NOT EXISTS {table_name}{figure_cache.CHANGE_SEQUENCE_SUFFIX}")
+            cursor.execute(NOTIFY_FUNCTION_SQL)
+            cursor.execute(
+                "SELECT c.relname FROM pg_class c WHERE c.relname = ANY(%s) AND c.relkind = 'r' "
+                "AND pg_table_is_visible(c.oid) AND NOT EXISTS (SELECT 1 FROM pg_trigger t "
+                "WHERE t.tgrelid = c.oid AND t.tgname = c.relname || '_notify_change')",
+                [WATCHED_TABLES]
+            )
+            for (table_name,) in cursor.fetchall():
+                cursor.execute(
+                    f"CREATE TRIGGER {table_name}_notify_change "
+                    f"AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON {table_name} "
+                    "FOR EACH STATEMENT EXECUTE FUNCTION notify_table_change()"
+                )
+
+
+def on_change(tables, callback):
+    """
+    Call callback() whenever any of tables changes, after the caches are dropped and
+    before browsers are told, e.g. to rebuild report figures. Hooks run one at a time
+    on this process's hook thread, so a slow one never holds up the listener.
+    """
+    _hooks.append((set(tables), callback))
+
+
+def apply_change(tables):
+    """Drop every cache built from tables, then run the on_change hooks and notify the browsers."""
+    tables = set(tables)
+    for table_name in tables:
+        database.invalidate(table_name)
+        figure_cache.mark_changed(table_name)
+    database.invalidate("pg_stat_user_tables")
+    layout_cache.invalidate_tables(*tables)
+
+    if not any(hook_tables & tables for hook_tables, _ in _hooks):
+        publish(tables)
+        return
+    # Changes arriving while the hooks are queued join that run instead of queuing another
+    with _pending_lock:
+        queued = bool(_pending_tables)
+        _pending_tables.update(tables)
+    if not queued:
+        hook_executor().submit(_run_hooks)
+
+
+def hook_executor():
+    """This process's hook thread, started on first use (after forking)."""
+    global _hook_executor
+    with _listener_lock:
+        if _hook_executor is None:
+            _hook_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="change-hooks")
+        return _hook_executor
+
+
+def _run_hooks():
+    with _pending_lock:
+        tables = set(_pending_tables)
+        _pending_tables.clear()
+    for hook_tables, callback in _hooks:
+        if hook_tables & tables:
+            try:
+                callback()
+            except Exception as e:
+                print(f"Change feed hook error: {e}")
+    publish(tables)
+
+
+def publish(tables):
+    """Push a change event about tables to every open /changes stream."""
+    event = {'tables': sorted(tables), 'at': time.time()}
+    with _clients_lock:
+        for client in _clients:
+            try:
+                client.put_nowait(event)
+            except queue.Full:
+                pass  # A stalled tab misses this event; the next one still reaches it
+
+
+def _drain(conn):
+    """Tables named in the notifications received so far."""
+    tables = set()
+    while conn.notifies:
+        notification = conn.notifies.pop(0)
+        try:
+            tables.add(json.loads(notification.payload)['table'])
+        except (ValueError, KeyError):
+            print(f"Change feed: unexpected payload {notification.payload!r}")
+    return tables
+
+
+def _listen(stop):
+    reconnecting = False
+    while not stop.is_set():
+        conn = None
+        try:
+            # A connection of its own: LISTEN only lasts while the session does, so it cannot be pooled
+            conn = psycopg2.connect(**database.pool.config)
+            conn.autocommit = True
+            with conn.cursor() as cursor:
+                cursor.execute(f"LISTEN {CHANNEL}")
+            if reconnecting:
+                # Notifications sent while disconnected are lost, so assume everything changed
+                apply_change(WATCHED_TABLES)
+
+            while not stop.is_set():
+                if not select.select([conn], [], [], IDLE_PING_SECONDS)[0]:
+                    with conn.cursor() as cursor:
+                        cursor.execute("SELECT 1")
+                    continue
+                conn.poll()
+                tables = _drain(conn)
+                deadline = time.monotonic() + DEBOUNCE_SECONDS
+                while time.monotonic() < deadline:
+                    if select.select([conn], [], [], max(deadline - time.monotonic(), 0))[0]:
+                        conn.poll()
+                        tables |= _drain(conn)
+                if tables:
+                    apply_change(tables)
+        except Exception as e:
+            print(f"Change feed error: {e}")
+            reconnecting = True
+            stop.wait(RECONNECT_SECONDS)
+        finally:
+            if conn is not None:
+                conn.close()
+
+
+def start_listener():
+    """
+    Start this process's listener thread (once; call after forking, never before).
+    Returns an Event that stops it.
+    """
+    global _listener
+    with _listener_lock:
+        if _listener is None:
+            _listener = threading.Event()
+            threading.Thread(target=_listen, args=(_listener,), name="change-feed", daemon=True).start()
+        return _listener
+
+
+def _sse(fields):
+    return "".join(f"{name}: {value}\n" for name, value in fields) + "\n"
+
+
+def stream_changes():
+    """GET /changes: server-sent events, one 'change' event ({tables, at}) per batch of writes."""
+    def generate():
+        client = queue.Queue(maxsize=CLIENT_QUEUE_SIZE)
+        with _clients_lock:
+            full = len(_clients) >= MAX_STREAMS
+            if not full:
+                _clients.add(client)
+        if full:
+            # EventSource gives up on an error status, so answer normally and ask it to come back later
+            yield _sse([('retry', BUSY_RETRY_MS)])
+            return
+        try:
+            yield _sse([('retry', RETRY_MS)])
+            closes_at = time.monotonic() + STREAM_SECONDS
+            while time.monotonic() < closes_at:
+                try:
+                    event = client.get(timeout=min(HEARTBEAT_SECONDS, max(closes_at - time.monotonic(), 0)))
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield _sse([('event', 'change'), ('data', json.dumps(event))])
+        finally:
+            with _clients_lock:
+                _clients.discard(client)
+
+    response = Response(generate(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # Stop nginx from holding events back
+    return response
+
+
+def register_routes(server):
+    """Add the /changes event stream to the Flask server."""
+    server.add_url_rule('/changes', 'changes', stream_changes)
+
+
+def unrelated_change(tables):
+    """
+    True when the running callback was triggered only by a change-feed event about
+    tables other than these; the callback can then return dash.no_update.
+    """
+    try:
+        triggered = dash.ctx.triggered
+    except MissingCallbackContextException:
+        return False  # Called directly, not by Dash
+    if [trigger['prop_id'] for trigger in triggered] != ['change-feed.data']:
+        return False
+    change = triggered[0]['value'] or {}
+    return not set(change.get('tables', [])) & set(tables)
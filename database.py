@@ -1,4 +1,17 @@
+import hashlib
+import itertools
+import os
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
 import psycopg2
+import psycopg2.errors
+import psycopg2.extensions
+import psycopg2.pool
 from psycopg2.extras import RealDictCursor
 
 # Database connection parameters
@@ -10,37 +23,757 @@ db_config = {
     'port': '5432'
 }
 
-def fetch_data(table_name, columns="*", conditions=None, order_column=None, order_direction='ASC' , limit=None):
+# Connection pool parameters
+pool_config = {
+    'min_size': 1,            # Connections opened up front and kept warm
+    'max_size': 10,           # Hard cap on open connections (Postgres backends)
+    'async_max_size': 10,     # Hard cap on the asyncpg pool's connections (async_database)
+    'max_idle': 300,          # Seconds an idle connection may sit before it is recycled
+    'health_check_after': 30, # Ping connections that have been idle longer than this
+    'wait_timeout': 10        # Seconds a caller waits for a free connection
+}
+
+# Postgres connections every app process on this host may hold together under gunicorn:
+# each worker's psycopg2 pool, asyncpg pool and change listener, plus its job processes'
+# pools. Keep it below the server's max_connections, less what other clients (psql,
+# backups, migrate.py) need. gunicorn.conf.py runs only as many workers as fit.
+CONNECTION_BUDGET = int(os.environ.get('DB_CONNECTION_BUDGET', 80))
+
+# Connections in each gunicorn worker's asyncpg pool; fetch_many reads beyond it wait their turn
+ASYNC_POOL_SIZE = int(os.environ.get('DB_ASYNC_POOL_SIZE', 4))
+
+# Background threads per worker that check out a psycopg2 connection: the insights
+# refresh, booking expiry, slow-query EXPLAIN and change-feed hook threads
+BACKGROUND_CONNECTIONS = 4
+
+# Connections per pool in a job process, which runs one job (one query at a time) on one thread
+JOB_POOL_SIZE = 1
+
+
+class PooledConnection(psycopg2.extensions.connection):
+    """psycopg2 connection that tracks its idle time and the statements prepared on it."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.last_used = time.monotonic()
+        self.prepared = OrderedDict()  # Prepared statement name -> SQL, least recently used first
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of psycopg2 connections.
+    - Keeps between min_size and max_size connections open.
+    - Threads block (up to wait_timeout) when every connection is checked out.
+    - A thread that already holds a connection gets the same one back (re-entrant checkout).
+    - Idle connections are pinged before reuse and closed after max_idle seconds.
+    """
+
+    def __init__(self, config, min_size=1, max_size=10, max_idle=300, health_check_after=30, wait_timeout=10):
+        self.config = config
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_idle = max_idle
+        self.health_check_after = health_check_after
+        self.wait_timeout = wait_timeout
+
+        self._idle = []            # Connections ready to be checked out (most recently used last)
+        self._size = 0             # Open connections, idle or checked out
+        self._lock = threading.Condition()
+        self._local = threading.local()
+        self._stats = {
+            'checkouts': 0,
+            'waits': 0,
+            'wait_time_total': 0.0,
+            'wait_time_max': 0.0,
+            'timeouts': 0,
+            'connections_opened': 0,
+            'connections_recycled': 0,
+            'connections_broken': 0
+        }
+
+    def _connect(self):
+        conn = psycopg2.connect(connection_factory=PooledConnection, **self.config)
+        conn.autocommit = True  # Reads should not hold a transaction open while pooled
+        with self._lock:
+            self._stats['connections_opened'] += 1
+        return conn
+
+    def _is_healthy(self, conn):
+        if conn.closed:
+            return False
+        if time.monotonic() - conn.last_used < self.health_check_after:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _release_slot(self):
+        # Called with the lock held, for a connection that is (about to be) closed
+        self._size -= 1
+        self._lock.notify()
+
+    @staticmethod
+    def _close(conn):
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+
+    def _open_in_slot(self):
+        # Connect for a slot reserved under the lock; the slot is given back if that fails
+        try:
+            return self._connect()
+        except Exception:
+            with self._lock:
+                self._release_slot()
+            raise
+
+    def warm_up(self):
+        """Open connections until min_size are available."""
+        while True:
+            with self._lock:
+                if self._size >= self.min_size:
+                    return
+                self._size += 1
+            conn = self._open_in_slot()
+            with self._lock:
+                self._idle.append(conn)
+                self._lock.notify()
+
+    def recycle_idle(self):
+        """Close connections that have been idle longer than max_idle, keeping min_size open."""
+        now = time.monotonic()
+        stale = []
+        with self._lock:
+            for conn in list(self._idle):
+                if self._size <= self.min_size:
+                    break
+                if now - conn.last_used > self.max_idle:
+                    self._idle.remove(conn)
+                    self._stats['connections_recycled'] += 1
+                    self._release_slot()
+                    stale.append(conn)
+        for conn in stale:
+            self._close(conn)
+
+    def getconn(self):
+        """Check out a connection, blocking until one is free or wait_timeout expires."""
+        held = getattr(self._local, 'conn', None)
+        if held is not None:
+            self._local.depth += 1
+            return held
+
+        self.recycle_idle()
+        started = time.monotonic()
+        waited = False
+        # Under the lock, only take an idle connection or reserve a slot for a new one: the
+        # health check ping and connecting happen after it is released, so a slow server
+        # never holds up the other threads' checkouts and returns
+        with self._lock:
+            while not self._idle and self._size >= self.max_size:
+                # Pool exhausted: wait for another thread to give a connection back
+                waited = True
+                remaining = self.wait_timeout - (time.monotonic() - started)
+                if remaining <= 0:
+                    self._stats['timeouts'] += 1
+                    raise psycopg2.pool.PoolError(
+                        f"No database connection available after {self.wait_timeout}s"
+                    )
+                self._lock.wait(remaining)
+            # Reuse the most recently returned connection, or open a new one
+            conn = self._idle.pop() if self._idle else None
+            if conn is None:
+                self._size += 1
+
+        if conn is not None and not self._is_healthy(conn):
+            # Dead: close it and open a fresh connection in its slot
+            self._close(conn)
+            with self._lock:
+                self._stats['connections_broken'] += 1
+            conn = None
+        if conn is None:
+            conn = self._open_in_slot()
+
+        elapsed = time.monotonic() - started
+        with self._lock:
+            self._stats['checkouts'] += 1
+            if waited:
+                self._stats['waits'] += 1
+                self._stats['wait_time_total'] += elapsed
+                self._stats['wait_time_max'] = max(self._stats['wait_time_max'], elapsed)
+
+        self._local.conn = conn
+        self._local.depth = 1
+        return conn
+
+    def putconn(self, conn, broken=False):
+        """Return a connection checked out with getconn."""
+        if getattr(self._local, 'conn', None) is conn:
+            self._local.depth -= 1
+            if self._local.depth > 0:
+                return
+            self._local.conn = None
+
+        if not broken and not conn.closed and conn.status != psycopg2.extensions.STATUS_READY:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                broken = True
+        if broken or conn.closed:
+            self._close(conn)
+            with self._lock:
+                self._stats['connections_broken'] += 1
+                self._release_slot()
+            return
+        conn.last_used = time.monotonic()
+        with self._lock:
+            self._idle.append(conn)
+            self._lock.notify()
+
+    @contextmanager
+    def connection(self):
+        """Context manager around getconn/putconn that drops connections that failed mid-query."""
+        conn = self.getconn()
+        broken = False
+        try:
+            yield conn
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            broken = True
+            raise
+        finally:
+            self.putconn(conn, broken=broken)
+
+    def closeall(self):
+        """Close every idle connection, e.g. before forking worker processes."""
+        with self._lock:
+            idle, self._idle = self._idle, []
+            for _ in idle:
+                self._release_slot()
+        for conn in idle:
+            self._close(conn)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = self._size
+            stats['idle'] = len(self._idle)
+            stats['in_use'] = self._size - len(self._idle)
+        return stats
+
+
+# Shared pool used by every helper in this module
+pool = ConnectionPool(db_config, **{key: value for key, value in pool_config.items() if key != 'async_max_size'})
+
+
+def worker_pool_size(threads):
+    """psycopg2 pool size of a gunicorn worker: one connection per request thread and background thread, so none waits for another."""
+    return threads + BACKGROUND_CONNECTIONS
+
+
+def worker_connections(threads, job_workers):
+    """Connections one gunicorn worker may hold: its two pools, the change listener's and its job processes' pools."""
+    return worker_pool_size(threads) + ASYNC_POOL_SIZE + 1 + job_workers * 2 * JOB_POOL_SIZE
+
+
+def budget_workers(requested, threads, job_workers):
+    """
+    Number of gunicorn workers to run: requested, or as many as CONNECTION_BUDGET holds
+    if that is fewer. Raises ValueError when it cannot hold even one worker.
+    """
+    per_worker = worker_connections(threads, job_workers)
+    fitting = CONNECTION_BUDGET // per_worker
+    if fitting < 1:
+        raise ValueError(
+            f"DB_CONNECTION_BUDGET={CONNECTION_BUDGET} cannot hold one worker's {per_worker} connections "
+            f"({threads} threads, {job_workers} job processes); raise it or lower the threads or JOB_WORKERS"
+        )
+    if fitting < requested:
+        print(f"Connection budget: running {fitting} workers instead of {requested} "
+              f"({per_worker} connections each, DB_CONNECTION_BUDGET={CONNECTION_BUDGET})")
+    return min(requested, fitting)
+
+
+def set_pool_sizes(max_size, async_max_size):
+    """Cap this process's psycopg2 and asyncpg pools; call before either opens a connection."""
+    pool_config['max_size'] = max_size
+    pool_config['async_max_size'] = async_max_size
+    pool_config['min_size'] = min(pool_config['min_size'], max_size, async_max_size)
+    pool.max_size = pool_config['max_size']
+    pool.min_size = pool_config['min_size']
+
+
+@contextmanager
+def get_connection():
+    """Borrow a pooled connection, e.g. `with get_connection() as conn:` for write helpers."""
+    with pool.connection() as conn:
+        yield conn
+
+
+@contextmanager
+def transaction():
+    """
+    Borrow a pooled connection inside a transaction: committed when the block
+    succeeds, rolled back otherwise. Needed for writes and named (server-side) cursors.
+    """
+    with get_connection() as conn:
+        if not conn.autocommit:
+            # Already inside an outer transaction on this thread
+            yield conn
+            return
+        conn.autocommit = False
+        try:
+            yield conn
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            if conn.status != psycopg2.extensions.STATUS_READY:
+                conn.rollback()
+            conn.autocommit = True
+
+
+# Result cache parameters
+cache_config = {
+    'default_ttl': 30,               # Seconds a cached result stays fresh
+    'table_ttls': {                  # Per-table overrides for tables that change more or less often
+        'reports': 300,
+        'movies': 120,
+        'producers': 60,
+        'scheduling': 60,
+        'customers': 15,
+        'pg_stat_user_tables': 2     # Backs figure_cache.data_version, must notice writes quickly
+    },
+    'max_bytes': 64 * 1024 * 1024    # Approximate memory budget before least recently used results are evicted
+}
+
+
+def estimate_size(rows):
+    """
+    Rough in-memory size of a result set, good enough to enforce the cache budget.
+    Values that are themselves lists of rows (e.g. a memoized page snapshot) are counted too.
+    """
+    size = sys.getsizeof(rows)
+    for row in rows:
+        size += sys.getsizeof(row)
+        for value in row.values():
+            if isinstance(value, list) and value and isinstance(value[0], dict):
+                size += estimate_size(value)
+            else:
+                size += sys.getsizeof(value)
+    return size
+
+
+class ResultCache:
+    """
+    Thread-safe LRU cache of query results.
+    - Entries expire after their table's TTL.
+    - The least recently used entries are evicted once max_bytes is exceeded.
+    - invalidate(table) drops every cached result read from that table.
+    """
+
+    def __init__(self, default_ttl=30, table_ttls=None, max_bytes=64 * 1024 * 1024):
+        self.default_ttl = default_ttl
+        self.table_ttls = table_ttls or {}
+        self.max_bytes = max_bytes
+
+        self._entries = OrderedDict()  # key -> (table, expires_at, size, rows), least recently used first
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'expired': 0, 'evictions': 0, 'invalidations': 0}
+
+    def _remove(self, key):
+        # Called with the lock held
+        _, _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def get(self, key):
+        """Return the cached rows for key, or None on a miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats['misses'] += 1
+                return None
+            if entry[1] < time.monotonic():
+                self._remove(key)
+                self._stats['expired'] += 1
+                self._stats['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats['hits'] += 1
+            return list(entry[3])
+
+    def put(self, table_name, key, rows):
+        size = estimate_size(rows)
+        if size > self.max_bytes:
+            return  # Never let one huge result flush the whole cache
+        expires_at = time.monotonic() + self.table_ttls.get(table_name, self.default_ttl)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (table_name, expires_at, size, list(rows))
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self._stats['evictions'] += 1
+
+    def invalidate(self, table_name=None):
+        """Drop cached results for table_name, or everything when no table is given."""
+        with self._lock:
+            for key, entry in list(self._entries.items()):
+                if table_name is None or entry[0] == table_name:
+                    self._remove(key)
+                    self._stats['invalidations'] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+            stats['bytes'] = self._bytes
+        return stats
+
+
+# Shared result cache used by fetch_data
+result_cache = ResultCache(**cache_config)
+
+
+def invalidate(table_name=None):
+    """Call after writing to a table so readers stop seeing cached rows from before the write."""
+    result_cache.invalidate(table_name)
+
+
+# Identifiers cannot be bound as parameters, so only plain (optionally qualified) names are accepted
+IDENTIFIER_PATTERN = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*(\.[A-Za-z_][A-Za-z0-9_]*)?$')
+
+# Prepared statements kept per connection before the least recently used one is deallocated
+MAX_PREPARED_STATEMENTS = 100
+
+statement_stats = {'prepared': 0, 'reused': 0, 'deallocated': 0}
+
+
+def check_identifier(name):
+    """Return name unchanged if it is a safe table/column identifier, else raise ValueError."""
+    if not IDENTIFIER_PATTERN.match(name):
+        raise ValueError(f"Invalid identifier: {name!r}")
+    return name
+
+
+def like_pattern(text):
+    """Wrap user text as an ILIKE '%text%' parameter, escaping the LIKE wildcards it contains."""
+    escaped = text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f"%{escaped}%"
+
+
+class Query:
+    """
+    Small SELECT builder that keeps values out of the SQL text.
+    - Conditions use %s placeholders and their values are bound separately.
+    - Table, column and ORDER BY names are validated as identifiers.
+    The SQL returned by build() depends only on the statement's shape, never on the
+    searched values, so it doubles as the prepared-statement cache key.
+    """
+
+    def __init__(self, table_name, columns="*"):
+        self.table_name = check_identifier(table_name)
+        if isinstance(columns, str):
+            columns = [column.strip() for column in columns.split(',')]
+        self.columns = [column if column == '*' else check_identifier(column) for column in columns]
+        self.conditions = []
+        self.params = []
+        self.order = []
+        self.order_params = []
+        self.limit_value = None
+        self.offset_value = None
+
+    def where(self, condition, *params):
+        """Add a condition (ANDed with the others), e.g. where("title ILIKE %s", pattern)."""
+        self.conditions.append(f"({condition})")
+        self.params.extend(params)
+        return self
+
+    def order_by(self, column, direction='ASC', nulls=None):
+        """
+        Order by column. nulls='FIRST' or 'LAST' places NULLs explicitly; by default
+        Postgres sorts them last ascending and first descending.
+        """
+        direction = direction.upper()
+        if direction not in ('ASC', 'DESC'):
+            raise ValueError(f"Invalid sort direction: {direction!r}")
+        order = f"{check_identifier(column)} {direction}"
+        if nulls:
+            if nulls.upper() not in ('FIRST', 'LAST'):
+                raise ValueError(f"Invalid NULLS placement: {nulls!r}")
+            order += f" NULLS {nulls.upper()}"
+        self.order.append(order)
+        return self
+
+    def order_by_expression(self, expression, *params, direction='ASC'):
+        """Order by a trusted SQL expression, e.g. order_by_expression("similarity(title, %s)", text, direction='DESC')."""
+        direction = direction.upper()
+        if direction not in ('ASC', 'DESC'):
+            raise ValueError(f"Invalid sort direction: {direction!r}")
+        self.order.append(f"{expression} {direction}")
+        self.order_params.extend(params)
+        return self
+
+    def after(self, columns, values, direction='ASC', nulls=None):
+        """
+        Keyset pagination: keep rows sorting after (or, for DESC, before) the given key values.
+        Pass nulls='LAST' when the query is ordered NULLS LAST on these columns: NULL
+        columns and key values are then placed correctly, which the plain row
+        comparison used otherwise cannot do (it never matches a NULL).
+        """
+        condition, params = self._after_condition(columns, values, direction, nulls)
+        return self.where(condition, *params)
+
+    def through(self, columns, values, direction='ASC', nulls=None):
+        """The rows after() leaves out: those sorting up to and including the given key values."""
+        condition, params = self._after_condition(columns, values, direction, nulls)
+        return self.where(f"NOT COALESCE({condition}, false)", *params)
+
+    def _after_condition(self, columns, values, direction, nulls):
+        names = [check_identifier(column) for column in columns]
+        operator = '<' if direction.upper() == 'DESC' else '>'
+        if not nulls:
+            placeholders = ", ".join(["%s"] * len(values))
+            return f"({', '.join(names)}) {operator} ({placeholders})", list(values)
+        if nulls.upper() != 'LAST':
+            raise ValueError(f"Invalid NULLS placement for keyset pagination: {nulls!r}")
+
+        # Rows equal on the first columns and after the key on the next one; after a
+        # non-NULL value come the greater (or, DESC, smaller) values and then the NULLs
+        terms, params = [], []
+        for position, (name, value) in enumerate(zip(names, values)):
+            if value is not None:
+                parts, term_params = [], []
+                for previous_name, previous_value in zip(names[:position], values[:position]):
+                    if previous_value is None:
+                        parts.append(f"{previous_name} IS NULL")
+                    else:
+                        parts.append(f"{previous_name} = %s")
+                        term_params.append(previous_value)
+                parts.append(f"({name} {operator} %s OR {name} IS NULL)")
+                terms.append(" AND ".join(parts))
+                params.extend(term_params + [value])
+        if not terms:
+            return "false", []  # The key is all NULLs: nothing sorts after it
+        return "(" + " OR ".join(f"({term})" for term in terms) + ")", params
+
+    def limit(self, count):
+        self.limit_value = int(count)
+        return self
+
+    def offset(self, count):
+        self.offset_value = int(count)
+        return self
+
+    def build(self):
+        """Return (sql, params) ready for cursor.execute."""
+        query = f"SELECT {', '.join(self.columns)} FROM {self.table_name}"
+        params = list(self.params)
+        if self.conditions:
+            query += " WHERE " + " AND ".join(self.conditions)
+        if self.order:
+            query += " ORDER BY " + ", ".join(self.order)
+            params.extend(self.order_params)
+        if self.limit_value is not None:
+            query += " LIMIT %s"
+            params.append(self.limit_value)
+        if self.offset_value is not None:
+            query += " OFFSET %s"
+            params.append(self.offset_value)
+        return query, params
+
+    def build_count(self):
+        """Return (sql, params) counting the rows matched by this query's conditions."""
+        query = f"SELECT count(*) AS count FROM {self.table_name}"
+        if self.conditions:
+            query += " WHERE " + " AND ".join(self.conditions)
+        return query, list(self.params)
+
+
+def to_server_placeholders(sql):
+    """Rewrite psycopg2 %s placeholders as PREPARE-style $1, $2, ... placeholders."""
+    counter = itertools.count(1)
+    return re.sub(r'%([s%])', lambda m: f"${next(counter)}" if m.group(1) == 's' else '%', sql)
+
+
+def execute_prepared(conn, cursor, sql, params):
+    """
+    Execute sql through a server-side prepared statement cached on the connection.
+    Statements are keyed on their SQL text, so repeated searches with different
+    values skip Postgres' parse/plan step after the first call.
+    """
+    name = "stmt_" + hashlib.md5(sql.encode()).hexdigest()[:16]
+    prepared = conn.prepared
+
+    if name in prepared:
+        prepared.move_to_end(name)
+        statement_stats['reused'] += 1
+    else:
+        if len(prepared) >= MAX_PREPARED_STATEMENTS:
+            oldest, _ = prepared.popitem(last=False)
+            cursor.execute(f"DEALLOCATE {oldest}")
+            statement_stats['deallocated'] += 1
+        cursor.execute(f"PREPARE {name} AS {to_server_placeholders(sql)}")
+        prepared[name] = sql
+        statement_stats['prepared'] += 1
+
+    if params:
+        cursor.execute(f"EXECUTE {name} ({', '.join(['%s'] * len(params))})", params)
+    else:
+        cursor.execute(f"EXECUTE {name}")
+
+
+# Callables notified after every query as listener(sql, params, seconds, rows), e.g. instrumentation
+query_listeners = []
+
+
+def notify_query_listeners(sql, params, seconds, rows):
+    for listener in query_listeners:
+        try:
+            listener(sql, params, seconds, rows)
+        except Exception as e:
+            print(f"Query listener error: {e}")
+
+
+def run_query(sql, params=()):
+    """Execute a SELECT on a pooled connection and return its rows; errors are raised to the caller."""
+    started = time.perf_counter()
+    # Borrow a connection from the pool
+    with get_connection() as conn:
+        with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+            try:
+                execute_prepared(conn, cursor, sql, params)
+            except psycopg2.errors.InvalidSqlStatementName:
+                # The session lost its prepared statements (e.g. DISCARD ALL); prepare again
+                conn.prepared.clear()
+                execute_prepared(conn, cursor, sql, params)
+            rows = cursor.fetchall()
+    notify_query_listeners(sql, params, time.perf_counter() - started, rows)
+    return rows
+
+
+def run_explain(sql, params=()):
+    """Return the EXPLAIN plan rows for a SELECT with its parameters bound."""
+    with get_connection() as conn:
+        with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+            cursor.execute("EXPLAIN " + sql, params or None)
+            return cursor.fetchall()
+
+
+def fetch_query(query, cache_table=None):
+    """
+    Run a Query (or an (sql, params) pair) and return its rows as a list of dictionaries.
+    When cache_table is given the result is memoized under that table's TTL and
+    dropped by invalidate(cache_table).
+    """
+    sql, params = query.build() if isinstance(query, Query) else query
+    key = (sql, tuple(tuple(param) if isinstance(param, list) else param for param in params))
+    if cache_table:
+        cached = result_cache.get(key)
+        if cached is not None:
+            return cached
+
+    try:
+        results = run_query(sql, params)
+    except Exception as e:
+        print(f"Database error: {e}")
+        return []
+
+    if cache_table:
+        result_cache.put(cache_table, key, results)
+
+    # Return results as a list of dictionaries
+    return results
+
+
+def create_index(table_name, columns, name=None, using=None, unique=False):
+    """
+    Build an index with CREATE INDEX CONCURRENTLY, so writes to table_name carry on meanwhile.
+    For migrate.py only: request code never issues DDL. Must run outside a transaction.
+    - columns: column names, or trusted index expressions when name is given
+    - name: defaults to <table>_<columns>_idx
+    A build that failed part way leaves an invalid index behind; it is dropped and rebuilt.
+    """
+    if name is None:
+        name = f"{check_identifier(table_name)}_{'_'.join(check_identifier(column) for column in columns)}_idx"
+    rows = run_query(
+        "SELECT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+        "WHERE c.relname = %s AND pg_table_is_visible(c.oid)", [name]
+    )
+    if rows and rows[0]['indisvalid']:
+        return False
+    if rows:
+        execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+    method = f" USING {using}" if using else ""
     try:
-        # Connect to the database
-        conn = psycopg2.connect(**db_config)
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        execute(
+            f"CREATE {'UNIQUE ' if unique else ''}INDEX CONCURRENTLY IF NOT EXISTS {name} "
+            f"ON {check_identifier(table_name)}{method} ({', '.join(columns)})"
+        )
+    except Exception:
+        # Writes keep maintaining an invalid index, so don't leave one behind (e.g. after duplicate keys)
+        execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+        raise
+    return True
+
+
+def fetch_one(table_name, key_column, key, columns="*"):
+    """
+    Return the row of table_name whose key_column equals key, or None.
+    Index key_column (migrate.KEY_INDEXES) so the lookup stays a single index probe.
+    """
+    try:
+        query = Query(table_name, columns).where(f"{check_identifier(key_column)} = %s", key).limit(1)
+    except ValueError as e:
+        print(f"Database error: {e}")
+        return None
+    rows = fetch_query(query, cache_table=table_name)
+    return rows[0] if rows else None
+
+
+def fetch_count(query, cache_table=None):
+    """Return the number of rows a Query matches, ignoring its ORDER BY/LIMIT."""
+    rows = fetch_query(query.build_count(), cache_table=cache_table)
+    return rows[0]['count'] if rows else 0
+
+
+def execute(sql, params=None):
+    """Run a write or DDL statement on a pooled connection and return the affected row count."""
+    with get_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.rowcount
+
+
+def fetch_data(table_name, columns="*", conditions=None, order_column=None, order_direction='ASC' , limit=None, params=None, use_cache=True):
+    """
+    Fetch rows from a table.
+    - conditions: SQL condition using %s placeholders, e.g. "title ILIKE %s"
+    - params: values bound to the placeholders in conditions
+    - use_cache: serve repeated reads from result_cache (see cache_config)
+    """
+    try:
+        # Create the query from its parts
+        query = Query(table_name, columns)
 
-        # Create the query dynamically
-        query = f"SELECT {columns} FROM {table_name}"
-        
         # Add conditions to the query if provided
         if conditions:
-            query += f" WHERE {conditions}"
-        
+            query.where(conditions, *(params or []))
+
         # Add the order by clause
         if order_column:
-            query += f" ORDER BY {order_column} {order_direction}"
-        
+            query.order_by(order_column, order_direction)
+
         # Add limit if provided
         if limit:
-            query += f" LIMIT {limit}"
-
-        # Execute the query
-        cursor.execute(query)
-        results = cursor.fetchall()
-
-        # Return results as a list of dictionaries
-        return results
-    except Exception as e:
+            query.limit(limit)
+    except ValueError as e:
         print(f"Database error: {e}")
         return []
-    finally:
-        if 'conn' in locals():
-            cursor.close()
-            conn.close()
\ No newline at end of file
+
+    return fetch_query(query, cache_table=table_name if use_cache else None)
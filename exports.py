@@ -0,0 +1,171 @@
+import csv
+import io
+
+import jobs
+from database import Query, fetch_count, get_connection, transaction
+from search import search_condition
+
+EXPORT_COLUMNS = ["name", "address", "telephone_number", "email", "ticket_purchase", "ticket_number", "date", "unit_price", "amount_paid", "tickets_purchased"]
+
+# Rows pulled from the server-side cursor per round trip; bounds worker memory
+CHUNK_SIZE = 5000
+
+# Postgres type OID of numeric, whose Arrow type depends on its precision and scale
+NUMERIC_OID = 1700
+
+EXPORT_FORMATS = {
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'csv': 'text/csv',
+    'parquet': 'application/vnd.apache.parquet'
+}
+
+
+def customer_export_query(search_value=None):
+    query = Query("customers", EXPORT_COLUMNS).order_by("ticket_number")
+    if search_value:
+        condition, params = search_condition("customers", search_value)
+        query.where(condition, *params)
+    return query
+
+
+def iter_customer_chunks(search_value=None, chunk_size=CHUNK_SIZE, on_chunk=None):
+    """
+    Yield lists of customer rows matching search_value, chunk_size rows at a time.
+    Rows are read through a named (server-side) cursor, so only one chunk is in memory.
+    - on_chunk: called with the number of rows read so far after each chunk
+    """
+    sql, params = customer_export_query(search_value).build()
+    read = 0
+
+    with transaction() as conn:
+        with conn.cursor(name="customers_export") as cursor:
+            cursor.itersize = chunk_size
+            cursor.execute(sql, params)
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                read += len(rows)
+                if on_chunk:
+                    on_chunk(read)
+                yield rows
+
+
+def iter_csv(search_value=None, on_chunk=None):
+    """Yield the export as CSV text, one chunk of rows at a time."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    for rows in iter_customer_chunks(search_value, on_chunk=on_chunk):
+        writer.writerows(rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+def write_xlsx(path, search_value=None, on_chunk=None):
+    """Write the export to an xlsx file with xlsxwriter's constant-memory mode (rows are flushed as written)."""
+    import xlsxwriter
+
+    workbook = xlsxwriter.Workbook(path, {'constant_memory': True, 'default_date_format': 'yyyy-mm-dd'})
+    worksheet = workbook.add_worksheet("customers")
+    worksheet.write_row(0, 0, EXPORT_COLUMNS)
+    row_number = 1
+    for rows in iter_customer_chunks(search_value, on_chunk=on_chunk):
+        for row in rows:
+            worksheet.write_row(row_number, 0, [float(value) if hasattr(value, 'as_tuple') else value for value in row])
+            row_number += 1
+    workbook.close()
+
+
+def arrow_type(column):
+    """Arrow type for a psycopg2 result column (a cursor.description entry); text for other types."""
+    import pyarrow as pa
+
+    if column.type_code == NUMERIC_OID:
+        # numeric(p, s) fits a decimal; unconstrained numeric can hold any scale, so it is written as double
+        if column.precision and column.precision <= 38 and column.scale is not None:
+            return pa.decimal128(column.precision, column.scale)
+        return pa.float64()
+    return {
+        16: pa.bool_(),
+        20: pa.int64(),
+        21: pa.int16(),
+        23: pa.int32(),
+        700: pa.float32(),
+        701: pa.float64(),
+        1082: pa.date32(),
+        1114: pa.timestamp('us'),
+        1184: pa.timestamp('us', tz='UTC')
+    }.get(column.type_code, pa.string())
+
+
+def export_schema(search_value=None):
+    """
+    Arrow schema of the export, from the types of the query's result columns, so it is
+    right even for a column that is NULL in every row or an export with no rows.
+    """
+    import pyarrow as pa
+
+    sql, params = customer_export_query(search_value).limit(0).build()
+    with get_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(sql, params)
+            return pa.schema([pa.field(column.name, arrow_type(column)) for column in cursor.description])
+
+
+def arrow_column(values, field):
+    """One column of rows as an Arrow array of the field's type."""
+    import pyarrow as pa
+
+    if pa.types.is_floating(field.type):
+        values = [None if value is None else float(value) for value in values]
+    elif pa.types.is_string(field.type):
+        values = [None if value is None else str(value) for value in values]
+    return pa.array(values, type=field.type)
+
+
+def write_parquet(path, search_value=None, on_chunk=None):
+    """Write the export to a Parquet file, one row group per chunk."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = export_schema(search_value)
+    # Written even when nothing matches, so an empty export is still a valid file with the right columns
+    with pq.ParquetWriter(path, schema) as writer:
+        for rows in iter_customer_chunks(search_value, on_chunk=on_chunk):
+            columns = list(zip(*rows))
+            writer.write_table(pa.Table.from_arrays(
+                [arrow_column(column, field) for column, field in zip(columns, schema)], schema=schema
+            ))
+
+
+def export_job(export_format, search_value=None):
+    """
+    Background job (see jobs.py): write the customers export to a file kept with the
+    job, reporting rows written as progress. Returns what /jobs/<id>/download serves.
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format {export_format!r}")
+    total = fetch_count(customer_export_query(search_value))
+    jobs.progress(0, total)
+    written = 0  # Rows actually exported; total was counted beforehand and may differ
+
+    def report(read):
+        nonlocal written
+        written = read
+        jobs.progress(read, total)
+
+    filename = f"customers.{export_format}"
+    path = jobs.result_path(filename)
+    if export_format == 'csv':
+        with open(path, 'w', newline='', encoding='utf-8') as handle:
+            for text in iter_csv(search_value, on_chunk=report):
+                handle.write(text)
+    elif export_format == 'xlsx':
+        write_xlsx(path, search_value, on_chunk=report)
+    else:
+        write_parquet(path, search_value, on_chunk=report)
+    return {'path': path, 'filename': filename, 'mimetype': EXPORT_FORMATS[export_format], 'rows': written}
+
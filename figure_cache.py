@@ -0,0 +1,134 @@
+import fcntl
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+from plotly.utils import PlotlyJSONEncoder
+
+from database import fetch_query
+
+# Serialized figures live on local disk so every worker process on the host shares them
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache', 'figures')
+
+# Versions of one figure kept on disk; older files are pruned when a new one is written
+MAX_FILES_PER_FIGURE = 50
+
+# Parsed figures kept in memory per process, so a hit costs no disk read or JSON parsing
+MAX_MEMORY_ENTRIES = 64
+
+# Sequence the change feed's trigger (changefeed.py) advances on every write to a table
+CHANGE_SEQUENCE_SUFFIX = '_change_seq'
+
+_memory = OrderedDict()  # Path -> (local versions of its tables when stored, value)
+_memory_lock = threading.Lock()
+_local_versions = {}
+stats = {'memory_hits': 0, 'disk_hits': 0, 'builds': 0}
+
+
+def data_version(*tables):
+    """
+    Token that changes whenever rows in any of tables change, the same in every process
+    on every host. Uses the change feed's per-table sequences, which move as soon as a
+    write happens, and Postgres' insert/update/delete counters, which catch up shortly
+    after its commit (both cached briefly under 'pg_stat_user_tables').
+    """
+    rows = fetch_query((
+        "SELECT t.relname, t.n_tup_ins, t.n_tup_upd, t.n_tup_del, s.last_value FROM pg_stat_user_tables t "
+        "LEFT JOIN pg_sequences s ON s.schemaname = t.schemaname AND s.sequencename = t.relname || %s "
+        "WHERE t.relname = ANY(%s) ORDER BY t.relname",
+        [CHANGE_SEQUENCE_SUFFIX, list(tables)]
+    ), cache_table="pg_stat_user_tables")
+    counters = [[row['relname'], row['n_tup_ins'], row['n_tup_upd'], row['n_tup_del'], row['last_value']] for row in rows]
+    return hashlib.sha1(json.dumps(counters).encode()).hexdigest()[:16]
+
+
+def mark_changed(table_name):
+    """
+    Note that table_name changed: this process stops trusting figures it holds in memory
+    for it and looks on disk again. Versions (and so disk files) are not affected.
+    """
+    _local_versions[table_name] = _local_versions.get(table_name, 0) + 1
+
+
+def _local_stamp(tables):
+    return [_local_versions.get(table, 0) for table in tables]
+
+
+def _write_atomic(path, text):
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    handle, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    with os.fdopen(handle, 'w') as temp_file:
+        temp_file.write(text)
+    os.replace(temp_path, path)  # Readers never see a half-written file
+
+
+def _prune(directory):
+    files = [os.path.join(directory, name) for name in os.listdir(directory) if name.endswith('.json')]
+    if len(files) <= MAX_FILES_PER_FIGURE:
+        return
+    files.sort(key=os.path.getmtime)
+    for path in files[:-MAX_FILES_PER_FIGURE]:
+        for stale in (path, path[:-len('.json')] + '.lock'):
+            try:
+                os.remove(stale)
+            except OSError:
+                pass
+
+
+def _read(path):
+    try:
+        with open(path) as cache_file:
+            value = json.load(cache_file)
+    except (OSError, ValueError):
+        return None
+    stats['disk_hits'] += 1
+    return value
+
+
+def cached_figures(name, tables, build, key=None):
+    """
+    Return build()'s result (a figure, or any structure of figures and plain data)
+    as JSON-ready Python data, rebuilding only when the data version of tables changes.
+    - name: cache namespace, e.g. "reports-page"
+    - tables: tables the figures are computed from
+    - key: extra JSON-serializable value distinguishing variants, e.g. a search term
+    """
+    version = data_version(*tables)
+    digest = hashlib.sha1(json.dumps([version, key], default=str).encode()).hexdigest()
+    path = os.path.join(CACHE_DIR, name, f"{digest}.json")
+
+    stamp = _local_stamp(tables)
+    with _memory_lock:
+        if path in _memory and _memory[path][0] == stamp:
+            _memory.move_to_end(path)
+            stats['memory_hits'] += 1
+            return _memory[path][1]
+
+    value = _read(path)
+    if value is None:
+        # Processes asking for the same version at once (e.g. every worker after a write)
+        # queue on a lock file, so one builds and the rest read its result from disk
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path[:-len('.json')] + '.lock', 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            value = _read(path)
+            if value is None:
+                text = json.dumps(build(), cls=PlotlyJSONEncoder)
+                stats['builds'] += 1
+                try:
+                    _write_atomic(path, text)
+                    _prune(os.path.dirname(path))
+                except OSError as e:
+                    print(f"Figure cache error: {e}")
+                value = json.loads(text)
+
+    with _memory_lock:
+        _memory[path] = (stamp, value)
+        _memory.move_to_end(path)
+        while len(_memory) > MAX_MEMORY_ENTRIES:
+            _memory.popitem(last=False)
+    return value
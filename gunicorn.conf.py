@@ -0,0 +1,65 @@
+"""
+gunicorn settings for wsgi:server, overridable through environment variables.
+
+Graceful reload: `kill -HUP <master pid>` starts fresh workers from the preloaded
+app and stops the old ones once their requests finish. Because the app is preloaded,
+deploying new code needs a new master: `kill -USR2 <master pid>`, then
+`kill -WINCH` / `kill -TERM` the old master once the new one is ready (/readyz).
+"""
+import multiprocessing
+import os
+
+import changefeed
+import database
+import jobs
+
+bind = os.environ.get('BIND', '0.0.0.0:8050')
+
+# Threads per worker for ordinary requests; they share the worker's connection pool, result
+# cache and figure cache
+request_threads = int(os.environ.get('GUNICORN_THREADS', 12))
+
+# Every open /changes stream holds a thread for minutes but no database connection, so the
+# streams (up to changefeed.MAX_STREAMS per worker) get threads on top of the request threads
+threads = request_threads + changefeed.MAX_STREAMS
+
+# Every worker holds a connection per request thread plus its other pools (database.worker_connections);
+# only as many workers run as DB_CONNECTION_BUDGET holds, and gunicorn refuses to start if not one does
+workers = database.budget_workers(
+    int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1)), request_threads, jobs.JOB_WORKERS
+)
+worker_class = 'gthread'
+
+# Import the app (and every page) once in the master; workers are forked from it
+preload_app = True
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = 5
+
+# Recycle workers now and then so slow leaks cannot build up; jitter avoids restarting all at once
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 2000))
+max_requests_jitter = 200
+
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG', '-')
+
+
+def when_ready(server):
+    import wsgi
+    wsgi.preload()
+
+
+def pre_fork(server, worker):
+    # Also covers workers started later (reloads, max_requests recycling)
+    import wsgi
+    wsgi.release_connections()
+
+
+def post_fork(server, worker):
+    import wsgi
+    wsgi.init_worker(request_threads)
+
+
+def worker_exit(server, worker):
+    jobs.shutdown()
+    database.pool.closeall()
@@ -0,0 +1,33 @@
+import time
+
+from flask import jsonify
+
+import database
+
+
+def healthz():
+    """Liveness: the worker process is up and answering requests."""
+    return jsonify({'status': 'ok'})
+
+
+def readyz():
+    """Readiness: the database answers a trivial query; load balancers should only route here on 200."""
+    started = time.perf_counter()
+    try:
+        with database.get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+    except Exception as e:
+        print(f"Database error: {e}")
+        return jsonify({'status': 'unavailable', 'database': str(e)}), 503
+    return jsonify({
+        'status': 'ok',
+        'database_ms': round((time.perf_counter() - started) * 1000, 2),
+        'pool': database.pool.stats()
+    })
+
+
+def register_routes(server):
+    """Add /healthz (liveness) and /readyz (database reachable) to the Flask server."""
+    server.add_url_rule('/healthz', 'healthz', healthz)
+    server.add_url_rule('/readyz', 'readyz', readyz)
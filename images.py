@@ -0,0 +1,172 @@
+import hashlib
+import io
+import os
+import tempfile
+import threading
+import time
+import urllib.request
+from urllib.parse import urlencode, urlparse
+
+from flask import abort, redirect, request, send_file
+
+from database import fetch_data
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+ASSETS_DIR = os.path.join(APP_DIR, 'assets')
+
+# Resized posters are generated on first request and kept here
+CACHE_DIR = os.path.join(APP_DIR, '.cache', 'posters')
+
+# Heights (px) a poster can be requested at: card size and its 2x variant for high-DPI screens
+POSTER_HEIGHTS = (150, 300, 600)
+
+# Posters larger than this are not downloaded
+MAX_SOURCE_BYTES = 20 * 1024 * 1024
+FETCH_TIMEOUT = 10
+
+# Seconds after a failed build (broken link, unreadable image) before the poster is tried
+# again; meanwhile requests for it go straight to the original
+FAILURE_SECONDS = 300
+
+# Thumbnails never change for a given source and height, so browsers may keep them for a year
+CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+# 1x1 transparent GIF shown until lazy_images.js swaps in the real poster
+PLACEHOLDER = 'data:image/gif;base64,R0lGODlhAQABAIAAAAAAAP///yH5BAEAAAAALAAAAAABAAEAAAIBRAA7'
+
+# Posters are built under one of these locks, picked by hashing the poster's path, so
+# memory stays fixed however many posters are requested
+LOCK_STRIPES = 64
+_locks = [threading.Lock() for _ in range(LOCK_STRIPES)]
+
+
+def poster_url(src, height=300):
+    """URL of the cached, resized copy of a poster."""
+    if not src:
+        return src
+    return f"/posters/{height}?" + urlencode({'src': src})
+
+
+def poster_props(src, height=300):
+    """
+    Props for an html.Img showing a poster at height px: a placeholder src plus
+    data-src/data-srcset (1x and 2x thumbnails) that assets/lazy_images.js
+    loads once the image nears the viewport.
+    """
+    return {
+        'src': PLACEHOLDER,
+        'data-src': poster_url(src, height),
+        'data-srcset': f"{poster_url(src, height)} 1x, {poster_url(src, height * 2)} 2x"
+    }
+
+
+def is_known_poster(src):
+    """Only posters referenced by the catalog (or shipped in assets/) are fetched, never arbitrary URLs."""
+    if src.startswith('assets/') or src.startswith('/assets/'):
+        return '..' not in src
+    for table, column in (('movies', 'link_to_pictures'), ('scheduling', 'link_to_pictures')):
+        if fetch_data(table, column, f"{column} = %s", params=[src], limit=1):
+            return True
+    return False
+
+
+def read_source(src):
+    """Bytes of the original poster, from assets/ or over HTTP(S)."""
+    if src.startswith('/'):
+        src = src[1:]
+    if src.startswith('assets/'):
+        path = os.path.realpath(os.path.join(APP_DIR, src))
+        if not path.startswith(ASSETS_DIR + os.sep):
+            raise ValueError("poster outside assets")
+        with open(path, 'rb') as handle:
+            return handle.read()
+
+    if urlparse(src).scheme not in ('http', 'https'):
+        raise ValueError("unsupported poster URL")
+    with urllib.request.urlopen(src, timeout=FETCH_TIMEOUT) as response:
+        data = response.read(MAX_SOURCE_BYTES + 1)
+    if len(data) > MAX_SOURCE_BYTES:
+        raise ValueError("poster too large")
+    return data
+
+
+def build_thumbnails(src, height, base_path):
+    """Write base_path.webp and base_path.jpg, src resized to height px (never enlarged)."""
+    from PIL import Image
+
+    image = Image.open(io.BytesIO(read_source(src)))
+    image.load()
+    if image.height > height:
+        width = max(1, round(image.width * height / image.height))
+        image = image.resize((width, height), Image.LANCZOS)
+
+    os.makedirs(os.path.dirname(base_path), exist_ok=True)
+    variants = (
+        ('.webp', 'WEBP', {'quality': 80, 'method': 4}),
+        ('.jpg', 'JPEG', {'quality': 85, 'progressive': True, 'optimize': True})
+    )
+    for extension, image_format, options in variants:
+        converted = image.convert('RGBA' if image_format == 'WEBP' else 'RGB')
+        handle, temp_path = tempfile.mkstemp(dir=os.path.dirname(base_path), suffix='.tmp')
+        with os.fdopen(handle, 'wb') as temp_file:
+            converted.save(temp_file, image_format, **options)
+        os.replace(temp_path, base_path + extension)  # Concurrent readers never see partial files
+
+
+def recently_failed(base_path):
+    """True if building this thumbnail failed less than FAILURE_SECONDS ago (in any process)."""
+    try:
+        return time.time() - os.path.getmtime(base_path + '.failed') < FAILURE_SECONDS
+    except OSError:
+        return False
+
+
+def record_failure(base_path):
+    try:
+        os.makedirs(os.path.dirname(base_path), exist_ok=True)
+        with open(base_path + '.failed', 'w'):
+            pass  # The file's mtime is the time of the failure
+    except OSError as e:
+        print(f"Poster cache error: {e}")
+
+
+def original_poster(src):
+    return redirect(src if '://' in src else '/' + src.lstrip('/'))
+
+
+def serve_poster(height):
+    """Flask view: the poster at ?src= resized to height, as WebP when the browser accepts it, else JPEG."""
+    src = request.args.get('src', '')
+    if height not in POSTER_HEIGHTS or not src:
+        abort(404)
+
+    base_path = os.path.join(CACHE_DIR, f"{hashlib.sha1(src.encode()).hexdigest()}-{height}")
+    wants_webp = 'image/webp' in request.headers.get('Accept', '')
+    path, mimetype = (base_path + '.webp', 'image/webp') if wants_webp else (base_path + '.jpg', 'image/jpeg')
+
+    if not os.path.exists(path):
+        if not is_known_poster(src):
+            abort(404)
+        if recently_failed(base_path):
+            return original_poster(src)
+        # One thread per poster generates it; others wait for the result
+        with _locks[hash(base_path) % LOCK_STRIPES]:
+            if recently_failed(base_path):
+                return original_poster(src)
+            if not os.path.exists(path):
+                try:
+                    build_thumbnails(src, height, base_path)
+                except Exception as e:
+                    print(f"Poster error for {src}: {e}")
+                    record_failure(base_path)
+                    return original_poster(src)
+
+    response = send_file(path, mimetype=mimetype, conditional=True, etag=True, max_age=31536000)
+    response.headers['Cache-Control'] = CACHE_CONTROL
+    response.vary.add('Accept')
+    return response
+
+
+def register_routes(server):
+    """Add the /posters/<height>?src= thumbnail route to the Flask server behind the Dash app."""
+    server.add_url_rule('/posters/<int:height>', 'serve_poster', serve_poster)
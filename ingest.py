@@ -0,0 +1,232 @@
+"""
+Bulk-load CSV or Parquet files into customers, movies, scheduling or producers.
+
+    python ingest.py customers pos-export.csv
+    python ingest.py movies catalog.parquet --batch-size 100000
+
+Each batch is COPYed into a temporary staging table and merged into the target
+with INSERT ... ON CONFLICT (upsert on the table's key), in its own transaction.
+Re-running a file after a failure is safe: rows already loaded are just updated.
+Rows with an empty key column cannot be merged and are skipped and reported.
+The unique key indexes the upsert relies on are built by migrate.py.
+"""
+import argparse
+import csv
+import io
+import os
+import sys
+import time
+
+import database
+import rollups
+
+# Rows per COPY/merge transaction
+BATCH_SIZE = 50000
+
+# Row numbers of skipped rows printed per file
+REPORTED_SKIPS = 10
+
+# Columns that can be loaded per table, and the key rows are merged on
+INGEST_TABLES = {
+    'customers': {
+        'columns': ["name", "address", "telephone_number", "email", "ticket_purchase", "ticket_number",
+                    "date", "unit_price", "amount_paid", "tickets_purchased"],
+        'key': ["ticket_number"]
+    },
+    'movies': {
+        'columns': ["link_to_pictures", "title", "ratings", "description"],
+        'key': ["title"]
+    },
+    'scheduling': {
+        'columns': ["link_to_pictures", "movie_title", "showtimes", "duration", "capacity"],
+        'key': ["movie_title", "showtimes"]
+    },
+    'producers': {
+        'columns': ["name", "address", "contact_information", "current_balance"],
+        'key': ["name"]
+    }
+}
+
+
+def create_merge_keys():
+    """
+    Build the unique indexes ON CONFLICT needs, concurrently (run by migrate.py). A table
+    that already holds duplicate keys is skipped; its loads merge with UPDATE + INSERT.
+    """
+    for table_name, spec in INGEST_TABLES.items():
+        key = spec['key']
+        try:
+            database.create_index(table_name, key, name=merge_key_name(table_name, key), unique=True)
+        except Exception as e:
+            print(f"Database error: {e}")
+            print(f"{table_name} has duplicate {', '.join(key)} values; merging without ON CONFLICT")
+
+
+def merge_key_name(table_name, key):
+    return f"{table_name}_{'_'.join(key)}_key"
+
+
+def has_merge_key(table_name, key):
+    """True if migrate.py built table_name's unique key index, so merges can use ON CONFLICT."""
+    rows = database.fetch_query((
+        "SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+        "WHERE c.relname = %s AND i.indisvalid AND i.indisunique AND pg_table_is_visible(c.oid)",
+        [merge_key_name(table_name, key)]
+    ))
+    return bool(rows)
+
+
+def merge_sql(table_name, columns, key, use_conflict):
+    """Statements moving the staging rows into table_name, the last row per key winning."""
+    names = ", ".join(columns)
+    latest = (f"SELECT DISTINCT ON ({', '.join(key)}) {names} FROM ingest_staging "
+              f"ORDER BY {', '.join(key)}, ingest_line DESC")
+    updates = [column for column in columns if column not in key]
+    matches = " AND ".join(f"target.{column} = source.{column}" for column in key)
+
+    if use_conflict:
+        action = ("DO UPDATE SET " + ", ".join(f"{column} = EXCLUDED.{column}" for column in updates)
+                  if updates else "DO NOTHING")
+        return [f"INSERT INTO {table_name} ({names}) {latest} ON CONFLICT ({', '.join(key)}) {action}"]
+
+    statements = []
+    if updates:
+        statements.append(
+            f"UPDATE {table_name} AS target SET "
+            + ", ".join(f"{column} = source.{column}" for column in updates)
+            + f" FROM ({latest}) AS source WHERE {matches}"
+        )
+    statements.append(
+        f"INSERT INTO {table_name} ({names}) SELECT {names} FROM ({latest}) AS source "
+        f"WHERE NOT EXISTS (SELECT 1 FROM {table_name} AS target WHERE {matches})"
+    )
+    return statements
+
+
+def load_batch(table_name, columns, key, rows, statements):
+    """
+    COPY one batch into a staging table and merge it, all in one transaction. Rows with
+    a NULL key column are left out (DISTINCT ON would fold them all into one row);
+    returns their positions in the batch, counting from 1.
+    """
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    buffer.seek(0)
+
+    with database.transaction() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                f"CREATE TEMPORARY TABLE ingest_staging (LIKE {table_name} INCLUDING DEFAULTS) ON COMMIT DROP"
+            )
+            cursor.execute("ALTER TABLE ingest_staging ADD COLUMN ingest_line bigserial")
+            cursor.copy_expert(f"COPY ingest_staging ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
+            cursor.execute(
+                "DELETE FROM ingest_staging WHERE " + " OR ".join(f"{column} IS NULL" for column in key)
+                + " RETURNING ingest_line"
+            )
+            skipped = sorted(line for (line,) in cursor.fetchall())
+            for statement in statements:
+                cursor.execute(statement)
+    return skipped
+
+
+def iter_csv_batches(path, columns, batch_size):
+    """Yield lists of rows (in columns order) from a CSV file with a header line."""
+    with open(path, newline='', encoding='utf-8-sig') as handle:
+        reader = csv.reader(handle)
+        header = [name.strip().lower() for name in next(reader, [])]
+        missing = [column for column in columns if column not in header]
+        if missing:
+            raise ValueError(f"{path} has no column(s) {', '.join(missing)}")
+        positions = [header.index(column) for column in columns]
+
+        batch = []
+        for row in reader:
+            if not row:
+                continue
+            batch.append([row[position] if position < len(row) else None for position in positions])
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+
+def iter_parquet_batches(path, columns, batch_size):
+    """Yield lists of rows (in columns order) from a Parquet file, one record batch at a time."""
+    import pyarrow.parquet as pq
+
+    parquet_file = pq.ParquetFile(path)
+    for record_batch in parquet_file.iter_batches(batch_size=batch_size, columns=columns):
+        data = record_batch.to_pydict()
+        yield [list(row) for row in zip(*(data[column] for column in columns))]
+
+
+def total_rows(path):
+    """Row count if it is cheap to know up front (Parquet metadata), else None."""
+    if path.endswith('.parquet'):
+        import pyarrow.parquet as pq
+        return pq.ParquetFile(path).metadata.num_rows
+    return None
+
+
+def ingest(table_name, path, batch_size=BATCH_SIZE):
+    """
+    Load a CSV or Parquet file into table_name; returns the number of rows read.
+    Rows with an empty key column are skipped, and their row numbers printed.
+    """
+    if table_name not in INGEST_TABLES:
+        raise ValueError(f"Cannot ingest into {table_name!r}")
+    spec = INGEST_TABLES[table_name]
+    columns, key = spec['columns'], spec['key']
+    batches = (iter_parquet_batches if path.endswith('.parquet') else iter_csv_batches)(path, columns, batch_size)
+
+    statements = merge_sql(table_name, columns, key, has_merge_key(table_name, key))
+    expected = total_rows(path)
+    loaded = 0
+    skipped = []  # Row numbers in the file (data rows, counting from 1)
+    started = time.perf_counter()
+    try:
+        for rows in batches:
+            skipped += [loaded + line for line in load_batch(table_name, columns, key, rows, statements)]
+            loaded += len(rows)
+            elapsed = time.perf_counter() - started
+            progress = f" ({loaded / expected:.0%})" if expected else ""
+            print(f"{table_name}: {loaded:,} rows{progress}, {loaded / elapsed:,.0f} rows/s", flush=True)
+    finally:
+        if skipped:
+            shown = ", ".join(str(line) for line in skipped[:REPORTED_SKIPS])
+            more = f" and {len(skipped) - REPORTED_SKIPS:,} more" if len(skipped) > REPORTED_SKIPS else ""
+            print(f"{table_name}: skipped {len(skipped):,} rows with an empty {', '.join(key)} "
+                  f"(rows {shown}{more})", flush=True)
+        if loaded and table_name == 'customers':
+            # Running apps drop their caches and refresh the insight views when the change
+            # feed's NOTIFY arrives; the sales rollups are folded in here
+            try:
+                rollups.update_rollups()
+            except Exception as e:
+                print(f"Database error: {e}")
+    return loaded
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('table', choices=sorted(INGEST_TABLES))
+    parser.add_argument('paths', nargs='+', help="CSV (with a header line) or .parquet files")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+
+    for path in args.paths:
+        if not os.path.exists(path):
+            sys.exit(f"No such file: {path}")
+    for path in args.paths:
+        started = time.perf_counter()
+        try:
+            count = ingest(args.table, path, args.batch_size)
+        except Exception as e:
+            sys.exit(f"Ingest of {path} failed: {e}")
+        print(f"Loaded {count:,} rows from {path} in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+import threading
+
+from database import Query, create_index, execute, fetch_data, fetch_query, invalidate, transaction
+
+# Tickets purchased per month; also run directly (with a search condition) for filtered charts
+MONTHLY_TICKETS_SQL = (
+    "SELECT to_char(date_trunc('month', date::date), 'YYYY-MM') AS month, "
+    "sum(tickets_purchased) AS tickets_purchased FROM customers "
+    "WHERE date IS NOT NULL"
+)
+
+# Materialized views behind the Customers page charts. Each one has a unique
+# index so it can be refreshed CONCURRENTLY without blocking readers.
+INSIGHT_VIEWS = {
+    'customer_top_spenders': {
+        'query': (
+            "SELECT row_number() OVER (ORDER BY amount_paid DESC NULLS LAST, ticket_number) AS rank, "
+            "name, amount_paid FROM customers "
+            "ORDER BY amount_paid DESC NULLS LAST, ticket_number LIMIT 100"
+        ),
+        'unique_column': 'rank'
+    },
+    'customer_monthly_tickets': {
+        'query': MONTHLY_TICKETS_SQL + " GROUP BY 1",
+        'unique_column': 'month'
+    }
+}
+
+# Seconds between scheduled refreshes of the views
+REFRESH_INTERVAL = 300
+
+
+def create_insight_views():
+    """Create the insight materialized views and their unique indexes (run by migrate.py)."""
+    for view_name, spec in INSIGHT_VIEWS.items():
+        execute(f"CREATE MATERIALIZED VIEW IF NOT EXISTS {view_name} AS {spec['query']}")
+        create_index(view_name, [spec['unique_column']], unique=True)
+    # Keeps the top spenders query an index scan as the customers table grows
+    create_index("customers", ["amount_paid DESC NULLS LAST"], name="customers_amount_paid_idx")
+
+
+def insight_views_ready():
+    """True once migrate.py created the insight views (looked up through the result cache)."""
+    rows = fetch_data("pg_matviews", "matviewname", "matviewname = ANY(%s) AND ispopulated",
+                      params=[list(INSIGHT_VIEWS)])
+    return len(rows) == len(INSIGHT_VIEWS)
+
+
+def refresh_insights():
+    """
+    Refresh every insight view; call after bulk writes to customers or let the schedule do it.
+    Every app process asks when customers change, but only one refresh runs per cluster:
+    the others wait for it to finish and then just drop their cached copies.
+    """
+    if not insight_views_ready():
+        invalidate("customers")
+        return
+    try:
+        with transaction() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT pg_try_advisory_xact_lock(hashtext('insights-refresh'))")
+                if cursor.fetchone()[0]:
+                    for view_name in INSIGHT_VIEWS:
+                        cursor.execute(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {view_name}")
+                else:
+                    cursor.execute("SELECT pg_advisory_xact_lock_shared(hashtext('insights-refresh'))")
+    except Exception as e:
+        print(f"Insights refresh error: {e}")
+    for view_name in INSIGHT_VIEWS:
+        invalidate(view_name)
+
+
+def start_refresh_schedule(interval=REFRESH_INTERVAL):
+    """Refresh the insight views every interval seconds on a daemon thread."""
+    def run():
+        while not stop.wait(interval):
+            refresh_insights()
+
+    stop = threading.Event()
+    threading.Thread(target=run, name="insights-refresh", daemon=True).start()
+    return stop
+
+
+def top_spending_customers(limit=5):
+    """Return the limit highest amount_paid purchases as rows of name and amount_paid."""
+    if insight_views_ready():
+        return fetch_data("customer_top_spenders", "name, amount_paid", order_column="rank", limit=limit)
+    query = Query("customers", "name, amount_paid").order_by("amount_paid", "DESC", nulls="LAST").order_by("ticket_number")
+    return fetch_query(query.limit(limit), cache_table="customers")
+
+
+def monthly_ticket_purchases():
+    """Return tickets purchased per month as rows of month ('YYYY-MM') and tickets_purchased."""
+    if insight_views_ready():
+        return fetch_data("customer_monthly_tickets", "month, tickets_purchased", order_column="month")
+    return fetch_query((MONTHLY_TICKETS_SQL + " GROUP BY 1 ORDER BY 1", []), cache_table="customers")
+
+
+def top_spending_query(condition, params, limit=5):
+    """Query for the limit highest amount_paid purchases among customers matching condition."""
+    query = Query("customers", "name, amount_paid").where(condition, *params).where("amount_paid IS NOT NULL")
+    return query.order_by("amount_paid", "DESC").order_by("ticket_number").limit(limit)
+
+
+def monthly_tickets_query(condition, params):
+    """(sql, params) for tickets purchased per month among customers matching condition."""
+    return MONTHLY_TICKETS_SQL + f" AND ({condition}) GROUP BY 1 ORDER BY 1", list(params)
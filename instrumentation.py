@@ -0,0 +1,285 @@
+import functools
+import hmac
+import logging
+import os
+import queue
+import random
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+
+from flask import Response, abort, g, jsonify, request
+
+import database
+
+logger = logging.getLogger(__name__)
+
+# Histogram bucket upper bounds, in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Queries slower than this (seconds) are logged with their EXPLAIN plan
+SLOW_QUERY_THRESHOLD = 0.2
+
+# Slow queries kept in memory for /metrics/slow-queries
+SLOW_QUERY_LOG_SIZE = 50
+
+# Seconds before the same statement is EXPLAINed again; repeats in between reuse the last plan
+EXPLAIN_INTERVAL = 600
+
+# Slow queries waiting for the EXPLAIN thread; more are dropped (counted in db_slow_queries_dropped_total)
+EXPLAIN_QUEUE_SIZE = 20
+
+# Statements whose last plan is remembered
+EXPLAINED_STATEMENTS = 500
+
+# Result sizes are measured for a random one in this many queries and scaled up, keeping the hot path cheap
+BYTES_SAMPLE_EVERY = 20
+
+# Pool, result cache and prepared statement stats that are current levels (gauges); the
+# rest only ever grow and are exported as counters
+GAUGE_STATS = {'size', 'idle', 'in_use', 'wait_time_max', 'entries', 'bytes'}
+
+# Bearer token that lets other hosts read /metrics; without it only local clients are served.
+# The metrics include SQL text and query plans
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+TABLE_PATTERN = re.compile(r'\bFROM\s+([A-Za-z_][A-Za-z0-9_.]*)', re.IGNORECASE)
+
+_lock = threading.Lock()
+_histograms = {}   # (metric name, label value) -> Histogram
+_counters = {}     # (metric name, label value) -> float
+slow_queries = deque(maxlen=SLOW_QUERY_LOG_SIZE)
+_explain_queue = queue.Queue(maxsize=EXPLAIN_QUEUE_SIZE)
+_explain_thread = None
+_explained = OrderedDict()  # Normalized SQL -> (time explained, plan); None while queued
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram in the Prometheus style."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+        self.total += value
+        self.count += 1
+
+
+def observe(metric, label, seconds):
+    with _lock:
+        histogram = _histograms.get((metric, label))
+        if histogram is None:
+            histogram = _histograms[(metric, label)] = Histogram()
+        histogram.observe(seconds)
+
+
+def increment(metric, label, amount=1):
+    with _lock:
+        _counters[(metric, label)] = _counters.get((metric, label), 0) + amount
+
+
+def timed(name):
+    """Decorator recording a function's duration in the function_duration_seconds histogram."""
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                observe('function_duration_seconds', name, time.perf_counter() - started)
+        return wrapper
+    return decorator
+
+
+def query_table(sql):
+    match = TABLE_PATTERN.search(sql)
+    return match.group(1) if match else "unknown"
+
+
+def normalize_sql(sql):
+    """Statement text with whitespace and letter case folded; values are already placeholders."""
+    return " ".join(sql.split()).lower()
+
+
+def log_slow_query(sql, seconds, table, plan):
+    slow_queries.append({
+        'time': time.time(),
+        'table': table,
+        'seconds': round(seconds, 4),
+        'sql': sql,
+        'plan': plan
+    })
+    logger.warning("Slow query on %s (%.3fs): %s\n%s", table, seconds, sql, plan)
+
+
+def explain_slow_queries():
+    """EXPLAIN thread: capture the plans of queued slow queries one at a time, using one pooled connection."""
+    while True:
+        sql, params, seconds, table = _explain_queue.get()
+        try:
+            plan_rows = database.run_explain(sql, params)
+            plan = "\n".join(row['QUERY PLAN'] for row in plan_rows)
+        except Exception as e:
+            plan = f"EXPLAIN failed: {e}"
+        with _lock:
+            _explained[normalize_sql(sql)] = (time.monotonic(), plan)
+        log_slow_query(sql, seconds, table, plan)
+
+
+def queue_slow_query(sql, params, seconds, table):
+    """
+    Log a slow query with its plan. Each statement is EXPLAINed at most once per
+    EXPLAIN_INTERVAL by a single background thread; repeats reuse the last plan,
+    and when the thread falls behind new statements are dropped.
+    """
+    global _explain_thread
+    key = normalize_sql(sql)
+    dropped = False
+    with _lock:
+        if key in _explained and _explained[key] is None:
+            return  # Already waiting for the EXPLAIN thread
+        explained = _explained.get(key)
+        if explained is not None and time.monotonic() - explained[0] < EXPLAIN_INTERVAL:
+            _explained.move_to_end(key)
+            plan = explained[1]
+        else:
+            plan = None
+            try:
+                _explain_queue.put_nowait((sql, params, seconds, table))
+                _explained[key] = None
+                _explained.move_to_end(key)
+                while len(_explained) > EXPLAINED_STATEMENTS:
+                    _explained.popitem(last=False)
+            except queue.Full:
+                dropped = True
+            # Started on first use, and again in a forked worker (threads do not survive a fork)
+            if _explain_thread is None or not _explain_thread.is_alive():
+                _explain_thread = threading.Thread(target=explain_slow_queries, name="slow-query-explain", daemon=True)
+                _explain_thread.start()
+    if dropped:
+        increment('db_slow_queries_dropped_total', table)
+    elif plan is not None:
+        log_slow_query(sql, seconds, table, plan)
+
+
+def record_query(sql, params, seconds, rows):
+    """database.query_listeners hook: per-table latency, row and byte counts, plus the slow-query log."""
+    if sql.startswith("EXPLAIN"):
+        return
+    table = query_table(sql)
+    observe('db_query_duration_seconds', table, seconds)
+    increment('db_query_rows_total', table, len(rows))
+    if random.random() * BYTES_SAMPLE_EVERY < 1:
+        increment('db_query_bytes_total', table, database.estimate_size(rows) * BYTES_SAMPLE_EVERY)
+    if seconds > SLOW_QUERY_THRESHOLD:
+        queue_slow_query(sql, params, seconds, table)
+
+
+def before_callback():
+    if request.path.endswith('/_dash-update-component'):
+        g.callback_started = time.perf_counter()
+        body = request.get_json(silent=True) or {}
+        g.callback_name = body.get('output', 'unknown')
+
+
+def after_callback(response):
+    started = g.pop('callback_started', None)
+    if started is not None:
+        name = g.pop('callback_name', 'unknown')
+        observe('dash_callback_duration_seconds', name, time.perf_counter() - started)
+        increment('dash_callback_bytes_total', name, response.calculate_content_length() or 0)
+        if response.status_code >= 500:
+            increment('dash_callback_errors_total', name)
+    return response
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def render_metrics():
+    """All metrics in the Prometheus text exposition format."""
+    label_names = {
+        'dash_callback': 'callback',
+        'db_query': 'table',
+        'function': 'function'
+    }
+
+    def label_for(metric):
+        return next((label for prefix, label in label_names.items() if metric.startswith(prefix)), 'name')
+
+    lines = []
+    with _lock:
+        histograms = sorted(_histograms.items())
+        counters = sorted(_counters.items())
+
+    seen = set()
+    for (metric, label), histogram in histograms:
+        if metric not in seen:
+            lines.append(f"# TYPE {metric} histogram")
+            seen.add(metric)
+        label_text = f'{label_for(metric)}="{_escape(label)}"'
+        for bound, count in zip(histogram.buckets, histogram.counts):
+            lines.append(f'{metric}_bucket{{{label_text},le="{bound}"}} {count}')
+        lines.append(f'{metric}_bucket{{{label_text},le="+Inf"}} {histogram.count}')
+        lines.append(f'{metric}_sum{{{label_text}}} {histogram.total}')
+        lines.append(f'{metric}_count{{{label_text}}} {histogram.count}')
+
+    for (metric, label), value in counters:
+        if metric not in seen:
+            lines.append(f"# TYPE {metric} counter")
+            seen.add(metric)
+        lines.append(f'{metric}{{{label_for(metric)}="{_escape(label)}"}} {value}')
+
+    # Connection pool, result cache and prepared statement stats
+    stats = {}
+    for prefix, values in (("db_pool", database.pool.stats()), ("result_cache", database.result_cache.stats()),
+                           ("prepared_statements", dict(database.statement_stats))):
+        for name, value in values.items():
+            if name in GAUGE_STATS:
+                stats[f"{prefix}_{name}"] = ("gauge", value)
+            else:
+                stats[f"{prefix}_{name}" + ("" if name.endswith("_total") else "_total")] = ("counter", value)
+    for name, (metric_type, value) in sorted(stats.items()):
+        lines.append(f"# TYPE {name} {metric_type}")
+        lines.append(f"{name} {value}")
+
+    return "\n".join(lines) + "\n"
+
+
+def metrics_allowed():
+    """True for a request carrying METRICS_TOKEN, or made directly (not through a proxy) from this host."""
+    if METRICS_TOKEN and hmac.compare_digest(request.headers.get('Authorization', ''), f"Bearer {METRICS_TOKEN}"):
+        return True
+    # A reverse proxy on this host also connects from loopback, so forwarded requests need the token
+    return request.remote_addr in ('127.0.0.1', '::1') and 'X-Forwarded-For' not in request.headers
+
+
+def metrics():
+    if not metrics_allowed():
+        abort(403)
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
+
+def slow_query_log():
+    if not metrics_allowed():
+        abort(403)
+    return jsonify(list(slow_queries))
+
+
+def register(server):
+    """Time every Dash callback and database query, and serve /metrics on the Flask server."""
+    if record_query not in database.query_listeners:
+        database.query_listeners.append(record_query)
+    server.before_request(before_callback)
+    server.after_request(after_callback)
+    server.add_url_rule('/metrics', 'metrics', metrics)
+    server.add_url_rule('/metrics/slow-queries', 'slow_query_log', slow_query_log)
@@ -0,0 +1,288 @@
+"""
+Local background jobs: slow work (file exports, report rebuilds) runs in a small pool
+of worker processes instead of a request thread.
+
+    job_id = jobs.submit("exports:export_job", "xlsx", "smith", kind="export")
+    jobs.status(job_id)   # {'status': 'running', 'done': 5000, 'total': 120000, ...}
+    jobs.cancel(job_id)
+
+Job records (status, progress, result) live in a diskcache store under .cache/jobs,
+shared by every process on the host, and expire RESULT_SECONDS after their last update
+together with any files the job wrote.
+"""
+import importlib
+import multiprocessing
+import os
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import dash
+import diskcache
+from flask import abort, jsonify, send_file
+
+import database
+
+JOBS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache', 'jobs')
+
+# Files written by jobs (one directory per job), served by /jobs/<id>/download
+FILES_DIR = os.path.join(JOBS_DIR, 'files')
+
+# Worker processes per app process
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))
+
+# Seconds a finished job's record and files are kept
+RESULT_SECONDS = 3600
+
+# Statuses after which a job no longer changes
+FINISHED = ('done', 'failed', 'cancelled')
+
+_store = None
+_executor = None
+_executor_lock = threading.Lock()
+_futures = {}        # job_id -> Future, for jobs submitted by this process
+_current_job = None  # Set inside a worker process while it runs a job
+
+
+class JobCancelled(Exception):
+    """Raised by progress() inside a job once cancel() was called for it."""
+
+
+def store():
+    """This process's handle on the job store (opened on first use, so never shared across a fork)."""
+    global _store
+    if _store is None:
+        _store = diskcache.Cache(os.path.join(JOBS_DIR, 'store'))
+    return _store
+
+
+def _update(job_id, **fields):
+    """Merge fields into a job's record and push its expiry back; returns the record."""
+    cache = store()
+    with cache.transact():
+        record = cache.get(f"job:{job_id}") or {'id': job_id}
+        record.update(fields)
+        cache.set(f"job:{job_id}", record, expire=RESULT_SECONDS)
+    return record
+
+
+def status(job_id):
+    """The job's record, or None if it is unknown or expired."""
+    return store().get(f"job:{job_id}")
+
+
+def _init_worker(db_config):
+    # Worker processes are spawned fresh, so they get the parent's database settings (e.g. the
+    # benchmark database) and their share of the connection budget, and import the app once,
+    # making page-defined job targets importable. Under `python app.py` the app was already
+    # loaded as the spawned process's __main__.
+    database.db_config.update(db_config)
+    database.set_pool_sizes(database.JOB_POOL_SIZE, database.JOB_POOL_SIZE)
+    if not dash.page_registry:
+        import app  # noqa: F401
+
+
+def executor():
+    """This process's job pool, started on first use (after forking, in gunicorn workers)."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=JOB_WORKERS,
+                mp_context=multiprocessing.get_context('spawn'),  # Never inherit threads or pooled connections
+                initializer=_init_worker,
+                initargs=(dict(database.db_config),)
+            )
+        return _executor
+
+
+def _noop():
+    return None
+
+
+def warm_up(wait=False):
+    """Start the pool's worker processes now, so the first job does not wait for them to import the app."""
+    futures = [executor().submit(_noop) for _ in range(JOB_WORKERS)]
+    if wait:
+        for future in futures:
+            future.result()
+
+
+def shutdown():
+    """Stop this process's job pool; queued jobs are dropped, running ones are left to finish."""
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+
+
+def _discard_broken(broken):
+    """Forget a pool whose worker process died, so the next job starts a fresh one."""
+    global _executor
+    with _executor_lock:
+        if _executor is broken:
+            _executor = None
+    broken.shutdown(wait=False, cancel_futures=True)
+
+
+def _finished(job_id, pool, future):
+    """
+    Done-callback of every job's future. A job whose worker process died (killed for
+    memory, crashed) never records its own end, so it is marked failed here.
+    """
+    _futures.pop(job_id, None)
+    if future.cancelled():
+        return
+    error = future.exception()
+    if error is None:
+        return
+    if isinstance(error, BrokenProcessPool):
+        _discard_broken(pool)
+    record = status(job_id)
+    if record is not None and record.get('status') not in FINISHED:
+        print(f"Job error ({record.get('target')}): {error}")
+        _update(job_id, status='failed', error=str(error) or type(error).__name__, finished_at=time.time())
+
+
+def _submit(target, args, kind):
+    purge_expired()
+    job_id = uuid.uuid4().hex
+    _update(job_id, kind=kind, target=target, status='queued', done=0, total=None, message="",
+            result=None, error=None, created_at=time.time(), finished_at=None)
+    pool = executor()
+    try:
+        future = pool.submit(_run, job_id, target, args)
+    except BrokenProcessPool:
+        # A worker process died (e.g. killed for memory); start a fresh pool
+        _discard_broken(pool)
+        pool = executor()
+        future = pool.submit(_run, job_id, target, args)
+    _futures[job_id] = future
+    future.add_done_callback(lambda done: _finished(job_id, pool, done))
+    return job_id, future
+
+
+def submit(target, *args, kind="job"):
+    """
+    Queue target(*args) on the job pool and return the new job's id.
+    - target: "module:function", importable in a worker process; it may call progress()
+      and result_path(), and its return value becomes the job's result
+    """
+    return _submit(target, args, kind)[0]
+
+
+def run(target, *args, kind="job", timeout=None):
+    """Run target(*args) on the job pool and wait for its result; raises if the job failed."""
+    job_id, future = _submit(target, args, kind)
+    future.result(timeout=timeout)
+    record = status(job_id) or {}
+    if record.get('status') != 'done':
+        raise RuntimeError(record.get('error') or f"Job {job_id} {record.get('status', 'expired')}")
+    return record['result']
+
+
+def cancel(job_id):
+    """
+    Ask a job to stop. A queued job is dropped at once; a running one stops at its next
+    progress() call. Returns False if the job already finished.
+    """
+    record = status(job_id)
+    if record is None or record.get('status') in FINISHED:
+        return False
+    store().set(f"cancel:{job_id}", True, expire=RESULT_SECONDS)
+    future = _futures.get(job_id)
+    if future is not None and future.cancel():
+        _update(job_id, status='cancelled', finished_at=time.time())
+    return True
+
+
+def _run(job_id, target, args):
+    """Worker process: run one job, keeping its record up to date."""
+    global _current_job
+    if store().get(f"cancel:{job_id}"):
+        _update(job_id, status='cancelled', finished_at=time.time())
+        return
+    _current_job = job_id
+    _update(job_id, status='running', started_at=time.time())
+    try:
+        module_name, function_name = target.split(':')
+        result = getattr(importlib.import_module(module_name), function_name)(*args)
+    except JobCancelled:
+        _update(job_id, status='cancelled', finished_at=time.time())
+        shutil.rmtree(os.path.join(FILES_DIR, job_id), ignore_errors=True)
+    except Exception as e:
+        print(f"Job error ({target}): {e}")
+        _update(job_id, status='failed', error=str(e), finished_at=time.time())
+    else:
+        _update(job_id, status='done', result=result, finished_at=time.time())
+    finally:
+        _current_job = None
+
+
+def progress(done, total=None, message=None):
+    """
+    Inside a job: record how far it got. Raises JobCancelled once the job was cancelled,
+    so long loops stop at the next call. Does nothing outside a job (e.g. in the benchmarks).
+    """
+    if _current_job is None:
+        return
+    fields = {'done': done}
+    if total is not None:
+        fields['total'] = total
+    if message is not None:
+        fields['message'] = message
+    _update(_current_job, **fields)
+    if store().get(f"cancel:{_current_job}"):
+        raise JobCancelled()
+
+
+def result_path(filename):
+    """Inside a job: where to write an output file that should be kept with the job's result."""
+    directory = os.path.join(FILES_DIR, _current_job or 'local')
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, filename)
+
+
+def purge_expired():
+    """Drop expired job records and delete job files older than RESULT_SECONDS."""
+    store().expire()
+    if not os.path.isdir(FILES_DIR):
+        return
+    cutoff = time.time() - RESULT_SECONDS
+    for name in os.listdir(FILES_DIR):
+        path = os.path.join(FILES_DIR, name)
+        try:
+            if os.path.getmtime(path) < cutoff and status(name) is None:
+                shutil.rmtree(path, ignore_errors=True)
+        except OSError:
+            pass
+
+
+def job_status(job_id):
+    """GET /jobs/<id>: the job's record as JSON (without its result data)."""
+    record = status(job_id)
+    if record is None:
+        abort(404)
+    return jsonify({key: value for key, value in record.items() if key != 'result'})
+
+
+def download(job_id):
+    """GET /jobs/<id>/download: the file a finished job produced."""
+    record = status(job_id)
+    result = (record or {}).get('result')
+    if record is None or record.get('status') != 'done' or not isinstance(result, dict) or 'path' not in result:
+        abort(404)
+    if not os.path.exists(result['path']):
+        abort(410)  # Expired and deleted
+    return send_file(result['path'], mimetype=result.get('mimetype'), as_attachment=True,
+                     download_name=result.get('filename'))
+
+
+def register_routes(server):
+    """Add the job status and download routes to the Flask server."""
+    server.add_url_rule('/jobs/<job_id>', 'job_status', job_status)
+    server.add_url_rule('/jobs/<job_id>/download', 'job_download', download)
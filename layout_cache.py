@@ -0,0 +1,67 @@
+import threading
+import time
+
+from figure_cache import data_version
+
+# Seconds between checks of whether the tables behind a cached layout changed
+VERSION_CHECK_INTERVAL = 10
+
+# Every LayoutCache, so invalidate_tables() can reach them
+caches = []
+
+
+class LayoutCache:
+    """
+    Keeps a rendered component tree until one of its tables changes.
+    - get() returns the cached tree without touching the database; at most once
+      every check_interval seconds it compares data_version(*tables) with the
+      version the tree was built from, and rebuilds on a change.
+    - If a rebuild fails, the last good tree keeps being served.
+    """
+
+    def __init__(self, build, tables, check_interval=VERSION_CHECK_INTERVAL, name="layout"):
+        self.build = build
+        self.tables = list(tables)
+        self.check_interval = check_interval
+        self.name = name
+
+        self._tree = None
+        self._version = None
+        self._checked_at = None
+        self._lock = threading.Lock()
+        caches.append(self)
+
+    def get(self):
+        """Return the tree, rebuilding it if it was never built or its tables changed."""
+        now = time.monotonic()
+        if self._tree is not None and now - self._checked_at < self.check_interval:
+            return self._tree
+
+        with self._lock:
+            # Another thread may have checked while this one waited for the lock
+            if self._tree is not None and time.monotonic() - self._checked_at < self.check_interval:
+                return self._tree
+            try:
+                version = data_version(*self.tables)
+                if self._tree is None or version != self._version:
+                    self._tree = self.build()
+                    self._version = version
+            except Exception as e:
+                print(f"Layout build error ({self.name}): {e}")
+                if self._tree is None:
+                    raise
+            self._checked_at = time.monotonic()
+            return self._tree
+
+    def invalidate(self):
+        """Rebuild on the next get()."""
+        with self._lock:
+            self._version = None
+            self._checked_at = -float('inf')
+
+
+def invalidate_tables(*tables):
+    """Invalidate every cached layout built from any of tables."""
+    for cache in caches:
+        if set(tables) & set(cache.tables):
+            cache.invalidate()
@@ -0,0 +1,73 @@
+"""
+Database setup: the extensions, indexes, tables and views the app relies on.
+
+    python migrate.py
+
+Run it once per deploy (and after restoring or reseeding a database), before the app
+starts. Request handlers never issue DDL. The Movies schedule needs the schedule_id
+column added here; other features whose objects are missing fall back to plain
+queries until this has run. Every step is safe to repeat, and indexes
+on the data tables are built CONCURRENTLY so writes carry on meanwhile.
+"""
+import argparse
+
+import booking
+import changefeed
+import ingest
+import insights
+import rollups
+import search
+from database import create_index, execute
+
+# (table, columns) btree indexes behind single-row lookups (database.fetch_one) and keyset paging
+KEY_INDEXES = [
+    ("customers", ["ticket_number"]),
+    ("scheduling", ["movie_title", "showtimes", "schedule_id"])  # Movies page SCHEDULE_KEY
+]
+
+
+def create_schedule_ids():
+    """Number the scheduling rows; schedule_id breaks ties in the Movies page's schedule order."""
+    execute("ALTER TABLE scheduling ADD COLUMN IF NOT EXISTS schedule_id bigint GENERATED ALWAYS AS IDENTITY")
+
+
+def create_key_indexes():
+    for table_name, columns in KEY_INDEXES:
+        create_index(table_name, columns)
+
+
+# (description, function) in the order they run
+STEPS = [
+    ("schedule ids", create_schedule_ids),
+    ("key indexes", create_key_indexes),
+    ("search indexes", search.create_search_indexes),
+    ("insight views", insights.create_insight_views),
+    ("ingest merge keys", ingest.create_merge_keys),
+    ("sales rollups", rollups.create_rollup_tables),
+    ("booking tables", booking.create_booking_tables),
+    ("change feed triggers", changefeed.create_change_triggers)
+]
+
+
+def migrate():
+    """Run every setup step; returns the descriptions of the steps that failed."""
+    failed = []
+    for description, step in STEPS:
+        try:
+            step()
+            print(f"Set up {description}")
+        except Exception as e:
+            print(f"Database error ({description}): {e}")
+            failed.append(description)
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.parse_args()
+    if migrate():
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
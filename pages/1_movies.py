@@ -1,11 +1,25 @@
+import re
+
 import dash
-from dash import html, dcc, Input, Output
-import pandas as pd
-from database import fetch_data  # Ensure fetch_data works as intended
+from dash import html, dcc, Input, Output, State, ClientsideFunction, Patch
+from changefeed import unrelated_change
+from database import Query, fetch_data, fetch_query  # Ensure fetch_data works as intended
+from figure_cache import data_version
+from images import poster_props
 
 # Register the Movies page
 dash.register_page(__name__, name="Movies")
 
+# Movie fields shipped to the browser for client-side search
+CATALOG_COLUMNS = ["title", "ratings", "link_to_pictures", "description"]
+
+# Schedule cards are loaded this many at a time, the next window when the user scrolls near the end
+SCHEDULE_PAGE_SIZE = 24
+
+# Sort key of the schedule cards (NULLs last); also the keyset the next window starts after.
+# Titles and showtimes repeat, so the unique schedule_id (added by migrate.py) breaks ties
+SCHEDULE_KEY = ["movie_title", "showtimes", "schedule_id"]
+
 # Layout for Movies Page
 layout = html.Div([
     html.H1("Movie Schedules & Search", className="text-center my-4 text-light"),
@@ -22,110 +36,214 @@ layout = html.Div([
         )
     ], className='text-center'),
 
+    # Movie catalog and search index, kept in the browser; searching filters it client-side
+    # and it is re-sent when the change feed reports a write to movies
+    dcc.Store(id='movie-catalog-store', storage_type='local'),
+    # Version of the stored catalog: the only part the server needs to see to skip an unchanged catalog
+    dcc.Store(id='movie-catalog-version', storage_type='local'),
+
     # Message when no results are found
     html.Div(id='no-movie-results-message', className="text-center text-light my-4"),
 
-    # Cards Container
+    # Search Results Container (filled in the browser by assets/movies.js)
     html.Div(
-        id='movies-card-container',
-        className="d-flex flex-wrap justify-content-center",  # Flexbox for responsive layout
-        style={'gap': '20px'}  # Space between cards
+        id='movie-search-results',
+        className="d-flex flex-wrap justify-content-center",
+        style={'gap': '20px'}
+    ),
+
+    # Schedules shown while the search box is empty
+    html.Div(
+        id='schedule-section',
+        children=[
+            html.Div(id='no-schedule-message', className="text-center text-light my-4"),
+
+            # Cards Container
+            html.Div(
+                id='movies-card-container',
+                className="d-flex flex-wrap justify-content-center",  # Flexbox for responsive layout
+                style={'gap': '20px'}  # Space between cards
+            ),
+
+            # Key of the last card shown; None once every schedule is on the page
+            dcc.Store(id='schedule-cursor'),
+
+            # Clicked by assets/movies.js when it scrolls into view, or by hand
+            html.Div(
+                html.Button("Load more", id='schedule-load-more', className="btn btn-outline-light my-4",
+                            style={'display': 'none'}),
+                className="text-center"
+            )
+        ]
     )
 ])
 
 
-# Callback for dynamic movie card display
+def build_movie_catalog(version):
+    """
+    Pack the movies table for the browser: rows as lists plus a sorted token index
+    ([token, [row numbers]]) that the client searches by prefix.
+    """
+    movie_data = fetch_data("movies", ", ".join(CATALOG_COLUMNS), order_column="title")
+    rows = [[movie[column] for column in CATALOG_COLUMNS] for movie in movie_data]
+
+    tokens = {}
+    for number, row in enumerate(rows):
+        for token in set(re.findall(r"\w+", str(row[0] or "").lower())):
+            tokens.setdefault(token, []).append(number)
+
+    return {
+        "version": version,
+        "columns": CATALOG_COLUMNS,
+        "rows": rows,
+        "index": sorted(tokens.items())
+    }
+
+
+# Callback shipping the movie catalog to the browser, only when it changed
+@dash.callback(
+    [Output('movie-catalog-store', 'data'),
+     Output('movie-catalog-version', 'data')],
+    Input('change-feed', 'data'),
+    State('movie-catalog-version', 'data'),
+    prevent_initial_call=False
+)
+def refresh_movie_catalog(change, stored_version):
+    if unrelated_change(["movies"]):
+        return dash.no_update, dash.no_update
+    try:
+        version = data_version("movies")
+        if stored_version == version:
+            return dash.no_update, dash.no_update
+        return build_movie_catalog(version), version
+    except Exception as e:
+        print(f"Database error: {e}")
+        return dash.no_update, dash.no_update
+
+
+# Searching is done in the browser against the catalog (see assets/movies.js)
+dash.clientside_callback(
+    ClientsideFunction(namespace='movies', function_name='filterCatalog'),
+    [Output('movie-search-results', 'children'),
+     Output('no-movie-results-message', 'children'),
+     Output('schedule-section', 'style')],
+    [Input('search-movie-input', 'value'),
+     Input('movie-catalog-store', 'data')]
+)
+
+
+def schedule_card(schedule):
+    """Card for one row of the scheduling table."""
+    return html.Div([
+        # Movie Image
+        html.Img(**poster_props(schedule['link_to_pictures'], 300), alt=schedule['movie_title'],
+                 className="card-img-top lazy-poster", style={"height": "300px", "objectFit": "cover"}),
+
+        # Card Body
+        html.Div([
+            # Movie Title
+            html.H5(schedule['movie_title'], className="card-title", 
+                    style={"color": "white", "textAlign": "center"}),
+
+            # Movie Details
+            html.P(
+                f"Showtimes: {schedule['showtimes']} | Duration: {schedule['duration']} mins | Capacity: {schedule['capacity']}",
+                className="card-text",
+                style={"color": "yellow", "fontSize": "14px", "textAlign": "center"}
+            )
+        ], className="card-body", style={"backgroundColor": "#333"})
+    ],
+    className="card",
+    style={"width": "18rem", "border": "1px solid #444", "boxShadow": "0px 4px 8px rgba(0,0,0,0.3)"}
+    )
+
+
+def schedule_page(cursor=None, page_size=SCHEDULE_PAGE_SIZE):
+    """
+    Return (rows, next cursor) for the window of schedules sorting after cursor
+    (a SCHEDULE_KEY value). The next cursor is None on the last window.
+    The key is indexed by migrate.py, so each window is one index range scan.
+    """
+    query = Query("scheduling", "link_to_pictures, movie_title, showtimes, duration, capacity, schedule_id")
+    for column in SCHEDULE_KEY:
+        query.order_by(column, nulls='LAST')
+    if cursor:
+        query.after(SCHEDULE_KEY, cursor, nulls='LAST')
+    # One extra row tells whether another window follows
+    rows = fetch_query(query.limit(page_size + 1), cache_table="scheduling")
+    if len(rows) <= page_size:
+        return rows, None
+    rows = rows[:page_size]
+    return rows, [rows[-1][column] for column in SCHEDULE_KEY]
+
+
+def schedule_through(cursor):
+    """Every schedule up to and including cursor, i.e. the cards already on the page (all of them if None)."""
+    query = Query("scheduling", "link_to_pictures, movie_title, showtimes, duration, capacity, schedule_id")
+    for column in SCHEDULE_KEY:
+        query.order_by(column, nulls='LAST')
+    if cursor:
+        query.through(SCHEDULE_KEY, cursor, nulls='LAST')
+    return fetch_query(query, cache_table="scheduling")
+
+
+# Callback for the schedule card display
 @dash.callback(
     [Output('movies-card-container', 'children'),
-     Output('no-movie-results-message', 'children')],
-    Input('search-movie-input', 'value'),
+     Output('no-schedule-message', 'children'),
+     Output('schedule-cursor', 'data'),
+     Output('schedule-load-more', 'style')],
+    [Input('schedule-section', 'id'),
+     Input('schedule-load-more', 'n_clicks')],
+    State('schedule-cursor', 'data'),
     prevent_initial_call=False
 )
-def update_movies(search_value):
+def update_movies(_, n_clicks, cursor):
     """
-    Dynamically display movie cards. 
-    - Default: Show all cards from scheduling table.
-    - On Search Input: Show filtered cards from movies table.
+    Display the first window of schedule cards, then append the next window each
+    time Load more is clicked (assets/movies.js clicks it as the user scrolls).
+    Movie searches are handled client-side and never reach this callback.
     """
+    # The section id never changes, so any call after the first one is a Load more click
+    load_more = bool(n_clicks)
+    if load_more and not cursor:
+        return dash.no_update, dash.no_update, None, {'display': 'none'}
+
     try:
-        if search_value:
-            # Fetch filtered movies from the 'movies' table
-            condition = f"title ILIKE '%{search_value}%'"
-            movie_data = fetch_data("movies", conditions=condition)
-
-            if not movie_data:
-                # No results found
-                return [], "No movies match your search."
-
-            # Convert to DataFrame
-            movies_df = pd.DataFrame(movie_data, columns=["link_to_pictures", "title", "ratings", "description"])
-
-            # Generate Cards for 'movies' table
-            cards = [
-                html.Div([
-                    # Movie Image
-                    html.Img(src=movie['link_to_pictures'], className="card-img-top", 
-                             style={"height": "300px", "objectFit": "cover"}),
-
-                    # Card Body
-                    html.Div([
-                        # Movie Title and Ratings
-                        html.H5(movie['title'], className="card-title", 
-                                style={"color": "white", "textAlign": "center"}),
-
-                        html.P(f"Ratings: {movie['ratings']}", className="card-text", 
-                               style={"color": "yellow", "fontSize": "16px", "textAlign": "center"}),
-
-                        # Movie Description
-                        html.P(movie['description'], className="card-text",
-                               style={"color": "white", "fontSize": "12px", "textAlign": "center"})
-                    ], className="card-body", style={"backgroundColor": "#333"})
-                ],
-                className="card",
-                style={"width": "18rem", "border": "1px solid #444", "boxShadow": "0px 4px 8px rgba(0,0,0,0.3)"}
-                )
-                for movie in movies_df.to_dict('records')
-            ]
-            return cards, ""  # Display filtered cards and clear the message
-
-        else:
-            # Default View: Fetch all data from 'scheduling' table
-            scheduling_data = fetch_data("scheduling")
-
-            if not scheduling_data:
-                return [], "No movie schedules available."
-
-            # Convert to DataFrame
-            schedules_df = pd.DataFrame(scheduling_data, columns=["link_to_pictures", "movie_title", "showtimes", "duration", "capacity"])
-
-            # Generate Cards for 'scheduling' table
-            cards = [
-                html.Div([
-                    # Movie Image
-                    html.Img(src=schedule['link_to_pictures'], className="card-img-top", 
-                             style={"height": "300px", "objectFit": "cover"}),
-
-                    # Card Body
-                    html.Div([
-                        # Movie Title
-                        html.H5(schedule['movie_title'], className="card-title", 
-                                style={"color": "white", "textAlign": "center"}),
-
-                        # Movie Details
-                        html.P(
-                            f"Showtimes: {schedule['showtimes']} | Duration: {schedule['duration']} mins | Capacity: {schedule['capacity']}",
-                            className="card-text",
-                            style={"color": "yellow", "fontSize": "14px", "textAlign": "center"}
-                        )
-                    ], className="card-body", style={"backgroundColor": "#333"})
-                ],
-                className="card",
-                style={"width": "18rem", "border": "1px solid #444", "boxShadow": "0px 4px 8px rgba(0,0,0,0.3)"}
-                )
-                for schedule in schedules_df.to_dict('records')
-            ]
-            return cards, ""  # Display all cards from scheduling table
+        rows, next_cursor = schedule_page(cursor if load_more else None)
+    except Exception as e:
+        print(f"Database error: {e}")
+        return [], "An error occurred while fetching movie data.", None, {'display': 'none'}
+
+    button_style = {'display': 'inline-block'} if next_cursor else {'display': 'none'}
+    cards = [schedule_card(schedule) for schedule in rows]
+    if load_more:
+        # Only the new cards travel to the browser; the ones on screen stay as they are
+        patch = Patch()
+        patch.extend(cards)
+        return patch, dash.no_update, next_cursor, button_style
+
+    if not rows:
+        return [], "No movie schedules available.", None, {'display': 'none'}
+    return cards, "", next_cursor, button_style
 
+
+# Re-read the cards already on the page when the change feed reports a write to scheduling
+@dash.callback(
+    [Output('movies-card-container', 'children', allow_duplicate=True),
+     Output('no-schedule-message', 'children', allow_duplicate=True)],
+    Input('change-feed', 'data'),
+    State('schedule-cursor', 'data'),
+    prevent_initial_call=True
+)
+def reload_schedule(change, cursor):
+    if unrelated_change(["scheduling"]):
+        return dash.no_update, dash.no_update
+    try:
+        rows = schedule_through(cursor)
     except Exception as e:
         print(f"Database error: {e}")
-        return [], "An error occurred while fetching movie data."
+        return dash.no_update, dash.no_update
+    if not rows:
+        return [], "No movie schedules available."
+    return [schedule_card(schedule) for schedule in rows], ""
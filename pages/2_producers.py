@@ -1,7 +1,7 @@
 import dash
 from dash import html, dcc, dash_table, Input, Output
 import pandas as pd
-from database import fetch_data  # Ensure fetch_data fetches data correctly
+from search import search
 
 # Register the Producers page
 dash.register_page(__name__, name="Producers")
@@ -74,11 +74,7 @@ def update_table(search_value):
 
     # Fetch filtered data from the database
     try:
-        producers_data = fetch_data(
-            "producers", 
-            conditions=f"name ILIKE '%{search_value}%'"
-        )
-        print(producers_data)
+        producers_data = search("producers", search_value, limit=None)  # Every match, as before ranking
         if not producers_data:
             # No matches found: Hide the table and show the no-results message
             return [], "No producers match your search.", {"display": "none"}
@@ -1,13 +1,64 @@
+import datetime
+import decimal
+import re
+
 import dash
-from dash import html, dcc, dash_table, Input, Output
+from dash import html, dcc, dash_table, Input, Output, State
 import pandas as pd
 import plotly.express as px
-from dash.dash_table import Format
-from database import fetch_data  # Ensure fetch_data is correct for fetching customer data
+from dash.dash_table.Format import Format, Scheme
+from async_database import fetch_many
+from changefeed import on_change, unrelated_change
+from database import Query, fetch_one, like_pattern, result_cache
+from figure_cache import cached_figures
+from instrumentation import timed
+import jobs
+from insights import (monthly_ticket_purchases, monthly_tickets_query, refresh_insights, top_spending_customers,
+                      top_spending_query)
+from search import search_condition
 
 # Register the Customers page
 dash.register_page(__name__, name="Customers")
 
+CUSTOMER_COLUMNS = ["name", "address", "telephone_number", "email", "ticket_purchase", "ticket_number", "date", "unit_price", "amount_paid", "tickets_purchased"]
+
+# SQL type filter values are compared as, per column (text when not listed). asyncpg binds
+# parameters strictly by type, so values are checked here and cast in the SQL; integer
+# columns compare as numeric so "2.5" matches nothing instead of being rounded to 2.
+FILTER_TYPES = {'date': 'date', 'unit_price': 'numeric', 'amount_paid': 'numeric', 'tickets_purchased': 'numeric'}
+
+# Rows per table page; the first page of each search is read together with the charts
+PAGE_SIZE = 10
+
+# Export buttons and the file format each one produces
+EXPORT_BUTTONS = {'export-excel-button': 'xlsx', 'export-csv-button': 'csv', 'export-parquet-button': 'parquet'}
+
+# How often (ms) the page checks on a running export job
+EXPORT_POLL_INTERVAL = 1000
+
+# Unique column used to break ties when sorting and to page with keyset pagination
+CUSTOMER_KEY = "ticket_number"
+
+# DataTable filter operators (either spelling, as written in filter_query) and their names
+FILTER_OPERATORS = {
+    'ge': 'ge', '>=': 'ge',
+    'le': 'le', '<=': 'le',
+    'lt': 'lt', '<': 'lt',
+    'gt': 'gt', '>': 'gt',
+    'ne': 'ne', '!=': 'ne',
+    'eq': 'eq', '=': 'eq',
+    'contains': 'contains',
+    'datestartswith': 'datestartswith'
+}
+
+# SQL for the comparison operators
+SQL_COMPARISONS = {'eq': '=', 'ne': '!=', 'lt': '<', 'le': '<=', 'gt': '>', 'ge': '>='}
+
+# One filter expression: the {column}, the operator right after it, then the value
+FILTER_PART = re.compile(
+    r"\s*\{(?P<column>[^}]*)\}\s*(?P<operator>>=|<=|!=|<|>|=|[a-z]+\b)\s*(?P<value>.*?)\s*$"
+)
+
 # Layout for Customers Page
 layout = html.Div([
     html.H1("Customer Information", className="text-center my-4 text-light"),
@@ -27,9 +78,22 @@ layout = html.Div([
     # Message when no results or empty search
     html.Div(id='no-results-message', className="text-center text-light my-4"),
 
-    # Export Button
-    html.Button("Export to Excel", id="export-excel-button", className="btn btn-primary my-4"),
-    dcc.Download(id="download-dataframe-xlsx"),
+    # Export Buttons (files are written by a background job, see exports.export_job, then downloaded)
+    html.Div([
+        html.Button("Export to Excel", id="export-excel-button", className="btn btn-primary my-4 me-2"),
+        html.Button("Export to CSV", id="export-csv-button", className="btn btn-primary my-4 me-2"),
+        html.Button("Export to Parquet", id="export-parquet-button", className="btn btn-primary my-4")
+    ]),
+
+    # Running export: progress and Cancel while the job works, then the download link
+    dcc.Store(id='export-job'),
+    dcc.Interval(id='export-job-interval', interval=EXPORT_POLL_INTERVAL, disabled=True),
+    html.Div([
+        html.Span(id='export-status', className="text-light me-3"),
+        html.Progress(id='export-progress', style={'display': 'none'}),
+        html.Button("Cancel", id='export-cancel', className="btn btn-outline-light btn-sm ms-3", style={'display': 'none'}),
+        html.A("Download", id='export-download', className="btn btn-success btn-sm ms-3", style={'display': 'none'})
+    ], className="mb-4"),
 
     # Data Table Wrapper
     html.Div(
@@ -46,11 +110,17 @@ layout = html.Div([
                     {"name": "Ticket Number", "id": "ticket_number", "deletable": False},
                     {"name": "Date", "id": "date", "deletable": False},
                     {"name": "Unit Price", "id": "unit_price", "deletable": False, "type": "numeric"},
-                    {"name": "Amount Paid", "id": "amount_paid", "deletable": False, "type": "numeric", "format": Format(precision=2, scheme='fixed')},
+                    {"name": "Amount Paid", "id": "amount_paid", "deletable": False, "type": "numeric", "format": Format(precision=2, scheme=Scheme.fixed)},
                     {"name": "Tickets Purchased", "id": "tickets_purchased", "deletable": False, "type": "numeric"}
                 ],
                 data=[],  # Will be populated with callback
-                sort_action="native",  # Enable sorting on columns
+                page_action="custom",  # Paging, sorting and filtering happen in SQL
+                page_current=0,
+                sort_action="custom",
+                sort_mode="single",
+                sort_by=[],
+                filter_action="custom",
+                filter_query="",
                 style_table={'height': '400px', 'overflowY': 'auto'},
                 style_cell={
                     'textAlign': 'center',
@@ -59,12 +129,18 @@ layout = html.Div([
                     'backgroundColor': '#222'
                 },
                 style_header={'backgroundColor': '#333', 'fontWeight': 'bold'},
-                page_size=10  # Number of rows per page
+                page_size=PAGE_SIZE  # Number of rows per page
             )
         ],
         style={"display": "none"}  # Initially hidden
     ),
 
+    # Current search term, set once the shared snapshot for it has been loaded
+    dcc.Store(id='customer-search-store'),
+
+    # Last row key of each page already shown, so the next page can be read with keyset pagination
+    dcc.Store(id='customers-page-keys'),
+
     # Customer Details Modal (Initially hidden)
     html.Div([
         dcc.Store(id='selected-customer-data'),
@@ -80,54 +156,326 @@ layout = html.Div([
 ])
 
 
-# Callback for Search Filtering
+def split_filter_part(filter_part):
+    """
+    Split one DataTable filter expression, e.g. '{name} contains "ann"', into (column, operator, value).
+    The value is the text as typed (without quotes), so contains and datestartswith match what the user wrote.
+    Anything unparseable, an unknown operator or an empty value gives (None, None, None): no filter.
+    """
+    match = FILTER_PART.match(filter_part)
+    if not match or match.group('operator') not in FILTER_OPERATORS:
+        return [None] * 3
+
+    value = match.group('value')
+    if len(value) >= 2 and value[0] == value[-1] and value[0] in ("'", '"', '`'):
+        value = value[1: -1].replace('\\' + value[0], value[0])
+    if not value:
+        return [None] * 3
+    return match.group('column'), FILTER_OPERATORS[match.group('operator')], value
+
+
+def comparison_value(column, value):
+    """
+    Filter text compared with eq/ne/lt/le/gt/ge against column, checked against the column's
+    FILTER_TYPES type; raises ValueError with a message for the user when it does not fit.
+    """
+    filter_type = FILTER_TYPES.get(column, 'text')
+    try:
+        if filter_type == 'numeric':
+            if not decimal.Decimal(value).is_finite():
+                raise ValueError(value)
+        elif filter_type == 'date':
+            datetime.date.fromisoformat(value)
+    except (ValueError, decimal.InvalidOperation):
+        expected = "a number" if filter_type == 'numeric' else "a date (YYYY-MM-DD)"
+        raise ValueError(f"{column} must be compared with {expected}, not {value!r}")
+    return value
+
+
+def build_customer_query(search_value, filter_query):
+    """
+    Build the customers Query for the current search box text and DataTable filter.
+    Raises ValueError when a filter value does not fit its column's type.
+    """
+    query = Query("customers", CUSTOMER_COLUMNS)
+    if search_value:
+        condition, params = search_condition("customers", search_value)
+        query.where(condition, *params)
+
+    for filter_part in (filter_query or "").split(' && '):
+        column, operator, value = split_filter_part(filter_part)
+        if column not in CUSTOMER_COLUMNS:
+            continue
+        if operator in SQL_COMPARISONS:
+            query.where(f"{column} {SQL_COMPARISONS[operator]} %s::{FILTER_TYPES.get(column, 'text')}",
+                        comparison_value(column, value))
+        elif operator == 'contains':
+            query.where(f"{column}::text ILIKE %s", like_pattern(value))
+        elif operator == 'datestartswith':
+            query.where(f"{column}::text LIKE %s", like_pattern(value)[1:])
+    return query
+
+
+def customer_page_query(search_value, filter_query, sort_column, direction, page_current, page_size, page_keys):
+    """
+    Build (count_query, page_query, sort_columns) for one page of the customers table.
+    The page is read with keyset pagination when the previous page's last key is
+    known, with OFFSET as fallback. NULLs sort last in both directions, and the
+    keyset condition accounts for them.
+    """
+    query = build_customer_query(search_value, filter_query)
+    count_query = query.build_count()
+
+    sort_columns = [sort_column, CUSTOMER_KEY] if sort_column != CUSTOMER_KEY else [CUSTOMER_KEY]
+    previous_key = page_keys['keys'].get(str(page_current - 1))
+    if page_current == 0:
+        pass
+    elif previous_key is not None:
+        query.after(sort_columns, previous_key, direction, nulls='LAST')
+    else:
+        query.offset(page_current * page_size)
+    for column in sort_columns:
+        query.order_by(column, direction, nulls='LAST')
+    query.limit(page_size)
+    return count_query, query, sort_columns
+
+
+def build_top_spending_figure(top_customers_data):
+    top_customers = pd.DataFrame(top_customers_data, columns=["name", "amount_paid"])
+    return px.bar(top_customers, x="name", y="amount_paid", title="Top 5 Spending Customers")
+
+
+def build_purchase_trends_figure(monthly_data):
+    df_grouped = pd.DataFrame(monthly_data, columns=["month", "tickets_purchased"])
+    return px.line(df_grouped, x="month", y="tickets_purchased", title="Monthly Ticket Purchases")
+
+
+def unfiltered_insight_figures():
+    """Charts for the empty search, from the insight views; their figures are shared on disk."""
+    return cached_figures(
+        "customer-insights",
+        ["customers", "customer_top_spenders", "customer_monthly_tickets"],
+        lambda: {
+            "top_spending": build_top_spending_figure(top_spending_customers(5)),
+            "purchase_trends": build_purchase_trends_figure(monthly_ticket_purchases())
+        }
+    )
+
+
+@timed("customers.load_customer_snapshot")
+def load_customer_snapshot(search_term):
+    """
+    Everything the page reads for one search term: the match count, the first
+    table page and the rows behind both charts. All reads go out as one concurrent
+    batch and the snapshot is memoized in this process's result cache under
+    'customers', so the table and chart callbacks reuse it and invalidate('customers')
+    drops it. Only plain rows are kept, which estimate_size can measure; the chart
+    callbacks build their figures from them.
+    """
+    key = ('customer-snapshot', search_term)
+    cached = result_cache.get(key)
+    if cached is not None:
+        return cached[0]
+
+    if not search_term:
+        # Unfiltered charts are built by unfiltered_insight_figures
+        snapshot = {"total": 0, "first_page": [], "top_spending": [], "purchase_trends": []}
+    else:
+        condition, params = search_condition("customers", search_term)
+        page_keys = {'keys': {}}
+        count_query, page_query, _ = customer_page_query(search_term, "", CUSTOMER_KEY, 'ASC', 0, PAGE_SIZE, page_keys)
+        count_rows, first_page, top_customers_data, monthly_data = fetch_many([
+            count_query,
+            page_query,
+            top_spending_query(condition, params),
+            monthly_tickets_query(condition, params)
+        ], cache_table="customers")
+        snapshot = {
+            "total": count_rows[0]['count'] if count_rows else 0,
+            "first_page": first_page,
+            "top_spending": top_customers_data,
+            "purchase_trends": monthly_data
+        }
+
+    result_cache.put("customers", key, [snapshot])
+    return snapshot
+
+
+# Keep the unfiltered charts' insight views current when purchases are written
+on_change(["customers"], refresh_insights)
+
+
+# Single data-fetch stage: one batch of reads per search term, shared by the table and charts
+@dash.callback(
+    Output('customer-search-store', 'data'),
+    Input('customer-search-input', 'value'),
+    prevent_initial_call=False
+)
+def fetch_customer_snapshot(search_value):
+    search_term = (search_value or "").strip()
+    try:
+        load_customer_snapshot(search_term)
+    except Exception as e:
+        print(f"Database error: {e}")
+    return search_term
+
+
+# Callback for Search Filtering, Paging and Sorting; the page on screen is re-read when customers change
 @dash.callback(
     [Output('customers-table', 'data'),
+     Output('customers-table', 'page_count'),
+     Output('customers-page-keys', 'data'),
      Output('no-results-message', 'children'),
      Output('table-container', 'style')],
-    Input('customer-search-input', 'value'),
-    prevent_initial_call=False
+    [Input('customer-search-store', 'data'),
+     Input('customers-table', 'page_current'),
+     Input('customers-table', 'page_size'),
+     Input('customers-table', 'sort_by'),
+     Input('customers-table', 'filter_query'),
+     Input('change-feed', 'data')],
+    State('customers-page-keys', 'data')
 )
-def update_customer_table(search_value):
+def update_customer_table(search_term, page_current, page_size, sort_by, filter_query, change, page_keys):
     """
-    Dynamically filter customers data based on search input.
+    Return one page of customers matching the search term and the table's filter/sort.
+    The first page of a search comes from the memoized snapshot; other pages,
+    sorts and filters read just page_size rows and the match count.
     """
-    if not search_value:
+    if unrelated_change(["customers"]):
+        return dash.no_update, dash.no_update, dash.no_update, dash.no_update, dash.no_update
+    if not search_term:
         # No search input: Hide the table and show the default message
-        return [], "Search for customers to view their details", {"display": "none"}
+        return [], 0, None, "Search for customers to view their details", {"display": "none"}
+
+    page_current = page_current or 0
+    page_size = page_size or PAGE_SIZE
+    sort_column, direction = CUSTOMER_KEY, 'ASC'
+    if sort_by and sort_by[0]['column_id'] in CUSTOMER_COLUMNS:
+        sort_column = sort_by[0]['column_id']
+        direction = 'DESC' if sort_by[0]['direction'] == 'desc' else 'ASC'
+
+    # Page keys are only valid for the search, sort and filter they were recorded under
+    signature = [search_term, sort_column, direction, filter_query or ""]
+    if not page_keys or page_keys.get('signature') != signature:
+        page_keys = {'signature': signature, 'keys': {}}
 
-    # Fetch filtered data from the database
+    # Fetch the page and the total match count
     try:
-        customers_data = fetch_data(
-            "customers", 
-            conditions=f"name ILIKE '%{search_value}%' OR email ILIKE '%{search_value}%'"
-        )
-        if not customers_data:
+        sort_columns = [CUSTOMER_KEY]
+        if page_current == 0 and page_size == PAGE_SIZE and sort_column == CUSTOMER_KEY and direction == 'ASC' and not filter_query:
+            snapshot = load_customer_snapshot(search_term)
+            total, customers_data = snapshot["total"], snapshot["first_page"]
+        else:
+            count_query, query, sort_columns = customer_page_query(
+                search_term, filter_query, sort_column, direction, page_current, page_size, page_keys
+            )
+            # The row count and the page itself are read concurrently
+            count_rows, customers_data = fetch_many([count_query, query], cache_table="customers", raise_errors=True)
+            total = count_rows[0]['count'] if count_rows else 0
+
+        if not total:
             # No matches found: Hide the table and show the no-results message
-            return [], "No customers match your search.", {"display": "none"}
-        
+            return [], 0, page_keys, "No customers match your search.", {"display": "none"}
+
+        if customers_data:
+            last_row = customers_data[-1]
+            page_keys['keys'][str(page_current)] = [last_row[column] for column in sort_columns]
+
         # Convert to DataFrame
-        filtered_df = pd.DataFrame(customers_data, columns=["name", "address", "telephone_number", "email", "ticket_purchase", "ticket_number", "date", "unit_price", "amount_paid", "tickets_purchased"])
-        return filtered_df.to_dict('records'), "", {"display": "block"}  # Show the table
+        page_df = pd.DataFrame(customers_data, columns=CUSTOMER_COLUMNS)
+        page_df['id'] = page_df[CUSTOMER_KEY]  # DataTable row_id, used by the details modal
+        page_count = -(-total // page_size)
+        return page_df.to_dict('records'), page_count, page_keys, "", {"display": "block"}  # Show the table
+    except ValueError as e:
+        # A filter value that does not fit its column
+        return [], 0, None, f"Invalid filter: {e}", {"display": "none"}
     except Exception as e:
         print(f"Database error: {e}")
-        return [], "An error occurred while fetching data.", {"display": "none"}
+        return [], 0, None, "An error occurred while fetching data.", {"display": "none"}
 
 
-# Callback for Exporting Data to Excel
+# Go back to the first page whenever the matched rows or their order change
 @dash.callback(
-    Output("download-dataframe-xlsx", "data"),
-    Input("export-excel-button", "n_clicks"),
+    Output('customers-table', 'page_current'),
+    [Input('customer-search-store', 'data'),
+     Input('customers-table', 'sort_by'),
+     Input('customers-table', 'filter_query')],
     prevent_initial_call=True
 )
-def export_to_excel(n_clicks):
-    if n_clicks is None:
-        return dash.no_update
-    
-    # Fetch the data
-    customers_data = fetch_data("customers")
-    df = pd.DataFrame(customers_data, columns=["name", "address", "telephone_number", "email", "ticket_purchase", "ticket_number", "date", "unit_price", "amount_paid", "tickets_purchased"])
-    return dcc.send_data_frame(df.to_excel, "customers.xlsx", index=False)
+def reset_customer_page(search_term, sort_by, filter_query):
+    return 0
+
+
+# Callback for the Export Buttons: start a background export of the current search
+@dash.callback(
+    [Output('export-job', 'data'),
+     Output('export-job-interval', 'disabled')],
+    [Input(button_id, 'n_clicks') for button_id in EXPORT_BUTTONS],
+    [State('customer-search-input', 'value'),
+     State('export-job', 'data')],
+    prevent_initial_call=True
+)
+def start_export(excel_clicks, csv_clicks, parquet_clicks, search_value, current_job):
+    # A new export replaces one still running
+    if current_job and current_job.get('id'):
+        jobs.cancel(current_job['id'])
+    export_format = EXPORT_BUTTONS[dash.ctx.triggered_id]
+    try:
+        job_id = jobs.submit("exports:export_job", export_format, (search_value or "").strip() or None, kind="export")
+    except Exception as e:
+        print(f"Export error: {e}")
+        return {'error': "The export could not be started."}, True
+    return {'id': job_id}, False
+
+
+# Callback for export progress, polled while the job runs
+@dash.callback(
+    [Output('export-status', 'children'),
+     Output('export-progress', 'value'),
+     Output('export-progress', 'max'),
+     Output('export-progress', 'style'),
+     Output('export-cancel', 'style'),
+     Output('export-download', 'href'),
+     Output('export-download', 'style'),
+     Output('export-job-interval', 'disabled', allow_duplicate=True)],
+    [Input('export-job-interval', 'n_intervals'),
+     Input('export-job', 'data')],
+    prevent_initial_call=True
+)
+def show_export_progress(n_intervals, job):
+    hidden, shown = {'display': 'none'}, {'display': 'inline-block'}
+    if not job or job.get('error'):
+        return (job or {}).get('error', ""), None, None, hidden, hidden, None, hidden, True
+
+    record = jobs.status(job['id'])
+    if record is None:
+        return "The export has expired. Please export again.", None, None, hidden, hidden, None, hidden, True
+
+    if record['status'] == 'queued':
+        return "Waiting for a free export worker...", None, None, shown, shown, None, hidden, False
+    if record['status'] == 'running':
+        total = record.get('total')
+        text = f"Exported {record['done']:,} of {total:,} rows" if total is not None else "Starting export..."
+        return text, record['done'], max(total or 0, 1), shown, shown, None, hidden, False
+    if record['status'] == 'done':
+        text = f"Export ready: {record['result']['rows']:,} rows."
+        return text, None, None, hidden, hidden, f"/jobs/{job['id']}/download", shown, True
+    if record['status'] == 'cancelled':
+        return "Export cancelled.", None, None, hidden, hidden, None, hidden, True
+    return f"Export failed: {record.get('error')}", None, None, hidden, hidden, None, hidden, True
+
+
+# Callback for the Cancel button; polling continues until the job reports that it stopped
+@dash.callback(
+    Output('export-job-interval', 'disabled', allow_duplicate=True),
+    Input('export-cancel', 'n_clicks'),
+    State('export-job', 'data'),
+    prevent_initial_call=True
+)
+def cancel_export(n_clicks, job):
+    if job and job.get('id'):
+        jobs.cancel(job['id'])
+    return False
 
 
 # Callback for Row Click and Modal View
@@ -137,19 +485,21 @@ def export_to_excel(n_clicks):
     Input('customers-table', 'active_cell')
 )
 def show_modal_details(active_cell):
-    if active_cell:
-        row_idx = active_cell['row']
-        customer_data = fetch_data("customers")[row_idx]
+    if active_cell and active_cell.get('row_id') is not None:
+        # Look the customer up by key: the row index only describes the current page
+        customer_data = fetch_one("customers", CUSTOMER_KEY, active_cell['row_id'], CUSTOMER_COLUMNS)
+        if customer_data is None:
+            return None, None
         modal = html.Div([
-            html.H4(f"Details for {customer_data[0]}"),
-            html.P(f"Email: {customer_data[3]}"),
-            html.P(f"Tickets Purchased: {customer_data[9]}"),
-            html.P(f"Amount Paid: ${customer_data[8]:.2f}"),
-            html.P(f"Address: {customer_data[1]}"),
-            html.P(f"Telephone: {customer_data[2]}"),
-            html.P(f"Ticket Purchase: {customer_data[4]}"),
-            html.P(f"Ticket Number: {customer_data[5]}"),
-            html.P(f"Date: {customer_data[6]}")
+            html.H4(f"Details for {customer_data['name']}"),
+            html.P(f"Email: {customer_data['email']}"),
+            html.P(f"Tickets Purchased: {customer_data['tickets_purchased']}"),
+            html.P(f"Amount Paid: ${customer_data['amount_paid']:.2f}"),
+            html.P(f"Address: {customer_data['address']}"),
+            html.P(f"Telephone: {customer_data['telephone_number']}"),
+            html.P(f"Ticket Purchase: {customer_data['ticket_purchase']}"),
+            html.P(f"Ticket Number: {customer_data['ticket_number']}"),
+            html.P(f"Date: {customer_data['date']}")
         ])
         return customer_data, modal
     return None, None
@@ -158,25 +508,28 @@ def show_modal_details(active_cell):
 # Callback for Charts (Top Spending Customers)
 @dash.callback(
     Output("top-spending-customers", "figure"),
-    Input("customer-search-input", "value")
+    [Input("customer-search-store", "data"),
+     Input("change-feed", "data")]
 )
-def generate_top_spending_customers_chart(search_value):
-    customers_data = fetch_data("customers")
-    df = pd.DataFrame(customers_data, columns=["name", "amount_paid"])
-    top_customers = df.nlargest(5, "amount_paid")
-    fig = px.bar(top_customers, x="name", y="amount_paid", title="Top 5 Spending Customers")
-    return fig
+def generate_top_spending_customers_chart(search_term, change=None):
+    if unrelated_change(["customers"]):
+        return dash.no_update
+    if not search_term:
+        return unfiltered_insight_figures()["top_spending"]
+    # Rows read once per search term by load_customer_snapshot
+    return build_top_spending_figure(load_customer_snapshot(search_term)["top_spending"])
 
 
 # Callback for Ticket Purchase Trends
 @dash.callback(
     Output("ticket-purchase-trends", "figure"),
-    Input("customer-search-input", "value")
+    [Input("customer-search-store", "data"),
+     Input("change-feed", "data")]
 )
-def generate_ticket_purchase_trends(search_value):
-    customers_data = fetch_data("customers")
-    df = pd.DataFrame(customers_data, columns=["date", "tickets_purchased"])
-    df['date'] = pd.to_datetime(df['date'])
-    df_grouped = df.groupby(df['date'].dt.to_period("M")).sum()
-    fig = px.line(df_grouped, x=df_grouped.index.astype(str), y="tickets_purchased", title="Monthly Ticket Purchases")
-    return fig
+def generate_ticket_purchase_trends(search_term, change=None):
+    if unrelated_change(["customers"]):
+        return dash.no_update
+    if not search_term:
+        return unfiltered_insight_figures()["purchase_trends"]
+    # Rows read once per search term by load_customer_snapshot
+    return build_purchase_trends_figure(load_customer_snapshot(search_term)["purchase_trends"])
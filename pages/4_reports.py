@@ -2,23 +2,18 @@ import dash
 from dash import dcc, html
 import plotly.graph_objects as go
 import pandas as pd
-from database import fetch_data
+from async_database import fetch_many
+from changefeed import on_change, unrelated_change
+from database import Query
+from figure_cache import cached_figures, data_version
+from images import poster_props
+from instrumentation import timed
+import jobs
+from report_data import ReportDataProvider
+import rollups
 
 dash.register_page(__name__, name="Reports")
 
-# Fetch Data
-reports = fetch_data('reports')
-top_movies = fetch_data('movies', '*', None, 'ratings', 'DESC', 4)
-
-# Data Processing
-reports_df = pd.DataFrame(reports)
-years = reports_df['year'].tolist()
-annual_revenues = reports_df['annual_revenue'].tolist()
-new_members = reports_df['new_members'].tolist()
-annual_expenses = reports_df['annual_expenses'].tolist()
-
-ticket_sales = [5000, 4500, 3000, 4000]
-
 # Common Theme for Dark Aesthetic Charts with Updated Font
 chart_theme = {
     "plot_bgcolor": "#000000",  # Black background
@@ -29,74 +24,141 @@ chart_theme = {
     "yaxis": {"showgrid": True, "gridcolor": "#444444", "linecolor": "#FFFFFF"}
 }
 
-# Ticket Sales Chart with Updated Colors
-ticket_sales_chart = go.Figure()
-ticket_sales_chart.add_trace(
-    go.Bar(
-        x=[movie["title"] for movie in top_movies],
-        y=ticket_sales,
-        marker=dict(
-            color=["#E63946", "#E63946", "#6E6E6E", "#C4C4C4"],  # Red and gray shades
-            line=dict(width=0)
-        ),
-        width=0.5
+
+@timed("reports.build_reports")
+def build_reports():
+    """Query the report tables and sales rollups and build the Reports page figures."""
+    # Fold in the changes to customers made since the last build (only the change log is read)
+    try:
+        rollups.update_rollups()
+    except Exception as e:
+        print(f"Database error: {e}")
+
+    # Fetch Data (all queries run concurrently)
+    reports, top_movies, movie_sales, quarters = fetch_many([
+        Query('reports'),
+        Query('movies').order_by('ratings', 'DESC').limit(4),
+        Query('sales_by_movie', 'movie_title, tickets').order_by('tickets', 'DESC').limit(4),
+        Query('sales_by_quarter', 'quarter, new_members').order_by('quarter', 'DESC').limit(8)
+    ])
+    if not reports and not top_movies:
+        # Don't cache an empty report when the database is unreachable
+        raise RuntimeError("no report data available")
+
+    # Data Processing
+    reports_df = pd.DataFrame(reports, columns=['year', 'annual_revenue', 'new_members', 'annual_expenses'])
+    years = reports_df['year'].tolist()
+    annual_revenues = reports_df['annual_revenue'].tolist()
+    annual_expenses = reports_df['annual_expenses'].tolist()
+
+    # Best selling movies and the last eight quarters' new members, from the sales rollups
+    quarters = list(reversed(quarters))
+    quarter_labels = [f"{row['quarter'].year} Q{(row['quarter'].month - 1) // 3 + 1}" for row in quarters]
+
+    # Ticket Sales Chart with Updated Colors
+    ticket_sales_chart = go.Figure()
+    ticket_sales_chart.add_trace(
+        go.Bar(
+            x=[row["movie_title"] for row in movie_sales],
+            y=[row["tickets"] for row in movie_sales],
+            marker=dict(
+                color=["#E63946", "#E63946", "#6E6E6E", "#C4C4C4"],  # Red and gray shades
+                line=dict(width=0)
+            ),
+            width=0.5
+        )
+    )
+    ticket_sales_chart.update_traces(marker_line_width=1, marker_line_color="#FFFFFF")
+    ticket_sales_chart.update_layout(
+        title="Ticket Sales by Movie 🎟️",
+        xaxis_title="Movies",
+        yaxis_title="Tickets Sold",
+        height=350,
+        margin=dict(t=60, b=60),
+        **chart_theme
     )
-)
-ticket_sales_chart.update_traces(marker_line_width=1, marker_line_color="#FFFFFF")
-ticket_sales_chart.update_layout(
-    title="Ticket Sales by Movie 🎟️",
-    xaxis_title="Movies",
-    yaxis_title="Tickets Sold",
-    height=350,
-    margin=dict(t=60, b=60),
-    **chart_theme
-)
 
-# Annual Expenses vs Revenues Chart with Updated Colors
-expenses_vs_revenues = go.Figure()
-expenses_vs_revenues.add_trace(
-    go.Bar(
-        x=years, y=annual_expenses,
-        name="Expenses",
-        marker=dict(color="#E63946", opacity=0.8)  # Red
+    # Annual Expenses vs Revenues Chart with Updated Colors
+    expenses_vs_revenues = go.Figure()
+    expenses_vs_revenues.add_trace(
+        go.Bar(
+            x=years, y=annual_expenses,
+            name="Expenses",
+            marker=dict(color="#E63946", opacity=0.8)  # Red
+        )
     )
-)
-expenses_vs_revenues.add_trace(
-    go.Bar(
-        x=years, y=annual_revenues,
-        name="Revenue",
-        marker=dict(color="#6E6E6E", opacity=0.8)  # Gray
+    expenses_vs_revenues.add_trace(
+        go.Bar(
+            x=years, y=annual_revenues,
+            name="Revenue",
+            marker=dict(color="#6E6E6E", opacity=0.8)  # Gray
+        )
+    )
+    expenses_vs_revenues.update_layout(
+        title="Annual Expenses vs. Revenues 💼",
+        xaxis_title="Year",
+        yaxis_title="Amount ($)",
+        barmode="group",
+        height=350,
+        margin=dict(t=60, b=60),
+        **chart_theme
     )
-)
-expenses_vs_revenues.update_layout(
-    title="Annual Expenses vs. Revenues 💼",
-    xaxis_title="Year",
-    yaxis_title="Amount ($)",
-    barmode="group",
-    height=350,
-    margin=dict(t=60, b=60),
-    **chart_theme
-)
 
-# New Members Chart with Updated Colors
-new_members_chart = go.Figure()
-new_members_chart.add_trace(
-    go.Scatter(
-        x=["Q1", "Q2", "Q3", "Q4"],
-        y=new_members,
-        mode="lines+markers",
-        marker=dict(size=10, color="#E63946"),  # Red markers
-        line=dict(width=3, color="#C4C4C4")  # Gray line
+    # New Members Chart with Updated Colors
+    new_members_chart = go.Figure()
+    new_members_chart.add_trace(
+        go.Scatter(
+            x=quarter_labels,
+            y=[row["new_members"] for row in quarters],
+            mode="lines+markers",
+            marker=dict(size=10, color="#E63946"),  # Red markers
+            line=dict(width=3, color="#C4C4C4")  # Gray line
+        )
     )
+    new_members_chart.update_layout(
+        title="New Members per Quarter 📈",
+        xaxis_title="Quarter",
+        yaxis_title="New Members",
+        height=350,
+        margin=dict(t=60, b=80, l=80, r=80),  # Extra padding for better spacing
+        **chart_theme
+    )
+
+    return {
+        "top_movies": top_movies,
+        "ticket_sales_chart": ticket_sales_chart,
+        "expenses_vs_revenues": expenses_vs_revenues,
+        "new_members_chart": new_members_chart
+    }
+
+
+# Tables the report figures are built from
+REPORT_TABLES = ["reports", "movies", "customers"]
+
+# How often (ms) the page checks whether the first build of the figures has finished
+BUILD_POLL_INTERVAL = 1000
+
+
+def build_report_figures(version):
+    """
+    Job target (runs in a jobs worker process): the report figures, reused from disk
+    until the tables change. version is the requesting process's data version, which
+    counts the writes it was told about before the database statistics show them.
+    """
+    return cached_figures("reports-page", REPORT_TABLES, build_reports, key=version)
+
+
+# Figures are built on first render and rebuilt in the background once stale, both in
+# the job pool so no request thread does the work; the serialized copy on disk is
+# reused by every worker until the tables change
+reports_provider = ReportDataProvider(
+    lambda: jobs.run("pages.4_reports:build_report_figures", data_version(*REPORT_TABLES), kind="reports"),
+    name="reports-page"
 )
-new_members_chart.update_layout(
-    title="New Members per Quarter 📈",
-    xaxis_title="Quarter",
-    yaxis_title="New Members",
-    height=350,
-    margin=dict(t=60, b=80, l=80, r=80),  # Extra padding for better spacing
-    **chart_theme
-)
+
+# Rebuild as soon as a write lands, so open Reports pages re-render with the new figures
+on_change(REPORT_TABLES, reports_provider.rebuild)
+
 
 # Layout for Reports Page
 layout = html.Div(
@@ -117,16 +179,38 @@ layout = html.Div(
         ),
 
         # Tab Content
-        html.Div(id='reports-tabs-content')
+        html.Div(id='reports-tabs-content'),
+
+        # Enabled while the first build of the figures is still running
+        dcc.Interval(id='reports-build-interval', interval=BUILD_POLL_INTERVAL, disabled=True)
     ]
 )
 
-# Callback for Tabs
+# Callback for Tabs, also re-rendered when the report tables change
 @dash.callback(
-    dash.Output('reports-tabs-content', 'children'),
-    [dash.Input('reports-tabs', 'value')]
+    [dash.Output('reports-tabs-content', 'children'),
+     dash.Output('reports-build-interval', 'disabled')],
+    [dash.Input('reports-tabs', 'value'),
+     dash.Input('change-feed', 'data'),
+     dash.Input('reports-build-interval', 'n_intervals')]
 )
-def render_tab_content(tab):
+def render_tab_content(tab, change=None, n_intervals=None):
+    if unrelated_change(REPORT_TABLES):
+        return dash.no_update, dash.no_update
+    try:
+        report = reports_provider.get(wait=False)
+    except Exception as e:
+        print(f"Database error: {e}")
+        return html.Div("Reports are unavailable right now. Please try again later.", className="text-center text-light my-4"), True
+
+    if report is None:
+        # First build still running in the job pool: check again shortly
+        return html.Div("Building reports...", className="text-center text-light my-4"), False
+    return tab_content(tab, report), True
+
+
+def tab_content(tab, report):
+    """The selected tab's section, built from the report figures."""
     if tab == 'tab-1':
         return html.Div(
             [
@@ -136,9 +220,9 @@ def render_tab_content(tab):
                         html.Div(
                             [
                                 html.Img(
-                                    src=movie["link_to_pictures"],
+                                    **poster_props(movie["link_to_pictures"], 300),
                                     alt=movie["title"],
-                                    className="img-fluid"
+                                    className="img-fluid lazy-poster"
                                 ),
                                 html.H4(movie["title"]),
                                 html.P(f"⭐ Rating: {movie['ratings']}", className="rating"),
@@ -146,7 +230,7 @@ def render_tab_content(tab):
                             ],
                             className="movie-card"
                         )
-                        for movie in top_movies
+                        for movie in report["top_movies"]
                     ],
                     className="movie-grid"
                 ),
@@ -157,7 +241,7 @@ def render_tab_content(tab):
         return html.Div(
             [
                 html.H2("Ticket Sales Analysis", className="section-title"),
-                dcc.Graph(figure=ticket_sales_chart)
+                dcc.Graph(figure=report["ticket_sales_chart"])
             ],
             className="section-wrapper"
         )
@@ -168,13 +252,13 @@ def render_tab_content(tab):
                 html.Div(
                     [
                         html.H3("Annual Expenses vs. Revenues", className="section-title"),
-                        dcc.Graph(figure=expenses_vs_revenues)
+                        dcc.Graph(figure=report["expenses_vs_revenues"])
                     ]
                 ),
                 html.Div(
                     [
                         html.H3("New Members per Quarter", className="section-title"),
-                        dcc.Graph(figure=new_members_chart)
+                        dcc.Graph(figure=report["new_members_chart"])
                     ]
                 )
             ],
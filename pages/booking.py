@@ -0,0 +1,113 @@
+import dash
+from dash import html, dcc, Input, Output, State, ctx
+import dash_bootstrap_components as dbc
+import booking
+from database import fetch_data
+
+# Reached from the home page's Buy Tickets buttons (/booking?movie=...), so it stays out of the sidebar
+dash.register_page(__name__, name="Booking", path="/booking", nav=False)
+
+SEAT_COLORS = {'free': "#28a745", 'held': "#ffc107", 'sold': "#6c757d"}
+
+
+def layout(movie=None, **kwargs):
+    showings = fetch_data("scheduling", "showtimes, capacity", "movie_title = %s", "showtimes", params=[movie]) if movie else []
+    return dbc.Container([
+        html.H1("Buy Tickets", className="text-center my-4 text-light"),
+        html.H3(movie or "No movie selected", className="text-center text-light mb-4"),
+
+        dcc.Store(id='booking-movie', data=movie),
+        dcc.Store(id='booking-hold'),
+
+        dbc.Row([
+            dbc.Col(dcc.Dropdown(
+                id='booking-showtime',
+                options=[{'label': str(showing['showtimes']), 'value': str(showing['showtimes'])} for showing in showings],
+                value=str(showings[0]['showtimes']) if showings else None,
+                placeholder="Pick a showtime",
+                clearable=False
+            ), width=4),
+            dbc.Col(dbc.Input(id='booking-count', type='number', min=1, max=booking.MAX_SEATS_PER_HOLD, value=1), width=2),
+            dbc.Col(dbc.Button("Reserve seats", id='booking-reserve-button', color="primary"), width="auto"),
+            dbc.Col(dbc.Button("Confirm purchase", id='booking-confirm-button', color="success",
+                               style={'display': 'none'}), width="auto")
+        ], justify="center", className="mb-3"),
+
+        html.Div(id='booking-message', className="text-center text-light my-3"),
+        html.Div(id='booking-availability', className="text-center text-light mb-2"),
+        html.Div(id='booking-seat-map', className="d-flex flex-wrap justify-content-center mx-auto",
+                 style={'maxWidth': '420px', 'gap': '4px'})
+    ])
+
+
+def seat_squares(seats):
+    """One small square per seat, colored by status."""
+    sold, held = set(seats['sold']), set(seats['held'])
+    squares = []
+    for seat in range(seats['capacity']):
+        status = 'sold' if seat in sold else 'held' if seat in held else 'free'
+        squares.append(html.Span(
+            title=f"{booking.seat_label(seat)} ({status})",
+            style={'width': '32px', 'height': '16px', 'borderRadius': '3px', 'backgroundColor': SEAT_COLORS[status]}
+        ))
+    return squares
+
+
+# Callback drawing the seat map of the chosen showing (again after every reservation)
+@dash.callback(
+    [Output('booking-seat-map', 'children'),
+     Output('booking-availability', 'children')],
+    [Input('booking-showtime', 'value'),
+     Input('booking-hold', 'data')],
+    State('booking-movie', 'data')
+)
+def show_seat_map(showtime, hold, movie):
+    if not movie or not showtime:
+        return [], "No showings available."
+    try:
+        seats = booking.seat_map(movie, showtime)
+    except Exception as e:
+        print(f"Database error: {e}")
+        return [], "Seat availability is unavailable right now."
+    return seat_squares(seats), f"{seats['available']} of {seats['capacity']} seats available"
+
+
+# Callback reserving seats, then confirming the hold
+@dash.callback(
+    [Output('booking-hold', 'data'),
+     Output('booking-message', 'children'),
+     Output('booking-confirm-button', 'style')],
+    [Input('booking-reserve-button', 'n_clicks'),
+     Input('booking-confirm-button', 'n_clicks')],
+    [State('booking-movie', 'data'),
+     State('booking-showtime', 'value'),
+     State('booking-count', 'value'),
+     State('booking-hold', 'data')],
+    prevent_initial_call=True
+)
+def update_booking(reserve_clicks, confirm_clicks, movie, showtime, count, hold):
+    hidden, shown = {'display': 'none'}, {'display': 'inline-block'}
+    try:
+        if ctx.triggered_id == 'booking-confirm-button' and hold:
+            confirmed = booking.confirm(hold['hold_token'])
+            seats = ", ".join(booking.seat_label(seat) for seat in confirmed['seats'])
+            return None, f"Purchase confirmed: seats {seats}.", hidden
+
+        if hold:
+            # Reserving again replaces the previous hold
+            try:
+                booking.release(hold['hold_token'])
+            except booking.HoldNotActive:
+                pass
+        hold = booking.reserve(movie, showtime, count=int(count or 1))
+    except booking.BookingError as e:
+        return None, str(e), hidden
+    except Exception as e:
+        print(f"Database error: {e}")
+        return None, "Booking is unavailable right now.", hidden
+
+    seats = ", ".join(booking.seat_label(seat) for seat in hold['seats'])
+    # The token is this browser's proof of the hold; the seats are only for display
+    data = {'hold_token': hold['hold_token'], 'seats': hold['seats']}
+    minutes = booking.HOLD_SECONDS // 60
+    return data, f"Seats {seats} are held for you for {minutes} minutes. Confirm to buy them.", shown
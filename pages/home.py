@@ -1,103 +1,108 @@
+from urllib.parse import quote
+
 import dash
 from dash import html, dcc
 import dash_bootstrap_components as dbc
 from dash.dependencies import Input, Output
+from async_database import fetch_many
+from images import poster_props
+from layout_cache import LayoutCache
 
 
 dash.register_page(__name__, name='Home', path='/')
 
+# Movie cards shown per tab
+HOME_MOVIE_LIMIT = 12
 
-tab1_content = dbc.Card(
-    dbc.CardBody(
-        [
-            html.P("Now Showing", className="text-light fw-bold fs-1"),            
-            # Create a container for the movie cards
-            dbc.Row(
+# Movies with at least one showing, best rated first
+NOW_SHOWING_SQL = (
+    "SELECT s.movie_title AS title, min(coalesce(m.link_to_pictures, s.link_to_pictures)) AS link_to_pictures, "
+    "max(m.ratings) AS ratings, string_agg(DISTINCT s.showtimes::text, ', ') AS showtimes "
+    "FROM scheduling s LEFT JOIN movies m ON m.title = s.movie_title "
+    "GROUP BY s.movie_title ORDER BY max(m.ratings) DESC NULLS LAST, s.movie_title LIMIT %s"
+)
+
+# Movies in the catalog that are not scheduled yet
+COMING_SOON_SQL = (
+    "SELECT m.title, m.link_to_pictures, m.ratings FROM movies m "
+    "WHERE NOT EXISTS (SELECT 1 FROM scheduling s WHERE s.movie_title = m.title) "
+    "ORDER BY m.ratings DESC NULLS LAST, m.title LIMIT %s"
+)
+
+
+def movie_card(movie, button=None):
+    return dbc.Col(
+        dbc.Card(
+            dbc.CardBody(
                 [
-                    dbc.Col(
-                        dbc.Card(
-                            dbc.CardBody(
-                                [
-                                    # Movie Image
-                                    html.Img(src="assets/movie1.jpg", alt="Movie 1", className="img-fluid"),
-
-                                    # Movie Name
-                                    html.H5("Movie Name 1", className="text-light mt-2"),
-
-                                    # Buy Tickets Button
-                                    dbc.Button("Buy Tickets", color="primary", className="mt-2", href="#")
-                                ]
-                            ),
-                            className="mb-4"
-                        ),
-                        width=3
-                    ),
-                    
-                    dbc.Col(
-                        dbc.Card(
-                            dbc.CardBody(
-                                [
-                                    # Movie Image
-                                    html.Img(src="assets/movie2.jpg", alt="Movie 2", className="img-fluid"),
-
-                                    # Movie Name
-                                    html.H5("Movie Name 2", className="text-light mt-2"),
-
-                                    # Buy Tickets Button
-                                    dbc.Button("Buy Tickets", color="primary", className="mt-2", href="#")
-                                ]
-                            ),
-                            className="mb-4"
-                        ),
-                        width=3
-                    ),
-
-                    dbc.Col(
-                        dbc.Card(
-                            dbc.CardBody(
-                                [
-                                    # Movie Image
-                                    html.Img(src="assets/movie3.jpg", alt="Movie 3", className="img-fluid"),
-
-                                    # Movie Name
-                                    html.H5("Movie Name 3", className="text-light mt-2"),
-
-                                    # Buy Tickets Button
-                                    dbc.Button("Buy Tickets", color="primary", className="mt-2", href="#")
-                                ]
-                            ),
-                            className="mb-4"
-                        ),
-                        width=3
-                    ),
-                    
-                    # Add more movie cards as needed
-                ],
-                className="g-3"  # Grid gap between columns
+                    # Movie Image
+                    html.Img(**poster_props(movie["link_to_pictures"], 300), alt=movie["title"], className="img-fluid lazy-poster"),
+
+                    # Movie Name
+                    html.H5(movie["title"], className="text-light mt-2"),
+                    html.P(movie.get("showtimes") or "", className="text-muted small mb-0"),
+
+                    # Buy Tickets Button
+                    button
+                ]
             ),
-        ]
-    ),
-    className="mt-3",
-)
+            className="mb-4"
+        ),
+        width=3
+    )
 
 
-tab2_content = dbc.Card(
-    dbc.CardBody(
+def build_tabs():
+    """Now Showing / Coming Soon tabs from the scheduling and movies tables."""
+    now_showing, coming_soon = fetch_many([
+        (NOW_SHOWING_SQL, [HOME_MOVIE_LIMIT]),
+        (COMING_SOON_SQL, [HOME_MOVIE_LIMIT])
+    ])
+
+    tab1_content = dbc.Card(
+        dbc.CardBody(
+            [
+                html.P("Now Showing", className="text-light fw-bold fs-1"),
+                # Create a container for the movie cards
+                dbc.Row(
+                    [
+                        movie_card(movie, dbc.Button("Buy Tickets", color="primary", className="mt-2",
+                                                     href=f"/booking?movie={quote(movie['title'])}"))
+                        for movie in now_showing
+                    ] or [html.P("No movies are showing right now.", className="text-light")],
+                    className="g-3"  # Grid gap between columns
+                ),
+            ]
+        ),
+        className="mt-3",
+    )
+
+    tab2_content = dbc.Card(
+        dbc.CardBody(
+            [
+                html.P("Coming Soon", className="text-light fw-bold fs-1"),
+                dbc.Row(
+                    [movie_card(movie) for movie in coming_soon]
+                    or [html.P("More movies are on their way.", className="text-light fw-bold fs-3")],
+                    className="g-3"
+                ),
+            ]
+        ),
+        className="mt-3",
+    )
+
+    # Defining the tabs
+    return dbc.Tabs(
         [
-            html.P("Coming Soon", className="text-light fw-bold fs-1"),
-            html.P("<movie gallery>", className="text-light fw-bold fs-3"),
+            dbc.Tab(tab1_content, label="Now Showing"),
+            dbc.Tab(tab2_content, label="Coming Soon"),
         ]
-    ),
-    className="mt-3",
-)
+    )
+
+
+# The tabs are rebuilt only when scheduling or movies change, so serving the home page costs no queries
+tabs_cache = LayoutCache(build_tabs, ["scheduling", "movies"], name="home-tabs")
 
-# Defining the tabs
-tabs = dbc.Tabs(
-    [
-        dbc.Tab(tab1_content, label="Now Showing"),
-        dbc.Tab(tab2_content, label="Coming Soon"),
-    ]
-)
 
 login_card = dbc.Card(
     dbc.CardBody(
@@ -130,17 +135,24 @@ login_card = dbc.Card(
 )
 
 
-# Defining the layout
-layout = dbc.Container(
-    [
-        dbc.Row(
-            [
-                dbc.Col(tabs),
-                dbc.Col(login_card, width=3,)
-            ]
-        )
-    ]
-)
+# Defining the layout (a function, so each visit gets the current cached tabs)
+def layout(**kwargs):
+    try:
+        tabs = tabs_cache.get()
+    except Exception as e:
+        print(f"Database error: {e}")
+        tabs = html.P("Movies are unavailable right now.", className="text-light mt-3")
+
+    return dbc.Container(
+        [
+            dbc.Row(
+                [
+                    dbc.Col(tabs),
+                    dbc.Col(login_card, width=3,)
+                ]
+            )
+        ]
+    )
 
 
 
@@ -148,4 +160,4 @@ layout = dbc.Container(
 if __name__ == "__main__":
     app = dash.Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP])
     app.layout = layout
-    app.run_server(debug=True)
+    app.run(debug=True)
@@ -0,0 +1,109 @@
+import threading
+import time
+
+# Seconds before built report data is considered stale and rebuilt in the background
+REFRESH_INTERVAL = 300
+
+
+class ReportDataProvider:
+    """
+    Lazily builds and caches report data (e.g. Plotly figures).
+    - Nothing is built until the first get(), so importing a page never touches the database.
+    - Once the data is older than refresh_interval, get() returns the stale copy and
+      starts a single background rebuild; the fresh copy replaces it when ready.
+    - If a rebuild fails, the last good copy keeps being served.
+    - get(wait=False) never builds in the calling thread: before the first build
+      finishes it starts one in the background and returns None.
+    """
+
+    def __init__(self, build, refresh_interval=REFRESH_INTERVAL, name="report-data"):
+        self.build = build
+        self.refresh_interval = refresh_interval
+        self.name = name
+
+        self._value = None
+        self._built_at = None
+        self._building = None  # Event set when the running build finishes, or None
+        self._error = None
+        self._lock = threading.Lock()
+
+    def _start_build(self):
+        # Called with the lock held: the running build's Event and whether this call started it
+        if self._building is not None:
+            return self._building, False
+        self._building = threading.Event()
+        return self._building, True
+
+    def _start_background_build(self):
+        # Called with the lock held
+        if self._start_build()[1]:
+            threading.Thread(target=self._rebuild, name=self.name, daemon=True).start()
+
+    def _rebuild(self):
+        """Run a build started with _start_build (outside the lock) and publish its result."""
+        error = None
+        try:
+            value = self.build()
+        except Exception as e:
+            print(f"Report build error ({self.name}): {e}")
+            value = None
+            error = e
+        with self._lock:
+            if error is not None and self._built_at is None:
+                self._error = error  # Nothing to fall back on: the next get() reports it
+            if value is not None:
+                self._value = value
+                self._built_at = time.monotonic()
+                self._error = None
+            done, self._building = self._building, None
+        done.set()
+
+    def get(self, wait=True):
+        """
+        Return the report data, building it on first use; raises if it has never been built.
+        With wait=False the first build runs in the background and None is returned until it is ready.
+        Builds never run under the lock, so readers of an existing copy are never held up by one.
+        """
+        with self._lock:
+            if self._built_at is not None:
+                if self._building is None and time.monotonic() - self._built_at > self.refresh_interval:
+                    self._start_background_build()
+                return self._value
+
+            if not wait:
+                if self._error is not None:
+                    error, self._error = self._error, None
+                    raise error
+                self._start_background_build()
+                return None
+
+            # First use: build in the calling thread so there is something to show, or wait
+            # for the build another thread already started
+            done, started = self._start_build()
+        if started:
+            self._rebuild()
+        else:
+            done.wait()
+        with self._lock:
+            if self._built_at is None:
+                raise self._error or RuntimeError(f"Report build failed ({self.name})")
+            return self._value
+
+    def clear(self):
+        """Forget the built data so the next get() rebuilds it in the calling thread."""
+        with self._lock:
+            self._value = None
+            self._built_at = None
+
+    def refresh(self):
+        """Mark the data stale so the next get() rebuilds it in the background."""
+        with self._lock:
+            if self._built_at is not None:
+                self._built_at = -float('inf')
+
+    def rebuild(self):
+        """Rebuild now in the calling thread (the current copy is served meanwhile); no-op before the first get()."""
+        with self._lock:
+            if self._built_at is None or not self._start_build()[1]:
+                return
+        self._rebuild()
@@ -0,0 +1,218 @@
+"""
+Ticket sales rollups (per movie, per day, per quarter) kept up to date from customers.
+
+    python rollups.py            # fold in the changes made since the last run
+    python rollups.py --rebuild  # recompute from scratch
+
+Triggers on customers (installed by migrate.py) append every inserted, updated or
+deleted row to sales_rollup_log as signed totals: +row for the new version, -row for
+the old one. Each run consumes the log, so backdated purchases and edits to old rows
+are counted like any other change. A TRUNCATE of customers flags a full rebuild.
+"""
+import argparse
+
+import figure_cache
+from database import create_index, invalidate, transaction
+
+ROLLUP_TABLES = ["sales_by_movie", "sales_by_day", "sales_by_quarter", "customer_first_purchase"]
+
+ROLLUP_SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS sales_by_movie (movie_title text PRIMARY KEY, "
+    "tickets bigint NOT NULL DEFAULT 0, revenue numeric NOT NULL DEFAULT 0, purchases bigint NOT NULL DEFAULT 0)",
+    "CREATE TABLE IF NOT EXISTS sales_by_day (day date PRIMARY KEY, "
+    "tickets bigint NOT NULL DEFAULT 0, revenue numeric NOT NULL DEFAULT 0, purchases bigint NOT NULL DEFAULT 0)",
+    "CREATE TABLE IF NOT EXISTS sales_by_quarter (quarter date PRIMARY KEY, "
+    "tickets bigint NOT NULL DEFAULT 0, revenue numeric NOT NULL DEFAULT 0, purchases bigint NOT NULL DEFAULT 0, "
+    "new_members bigint NOT NULL DEFAULT 0)",
+    # First purchase per customer (by email), which makes them a new member in that quarter
+    "CREATE TABLE IF NOT EXISTS customer_first_purchase (email text PRIMARY KEY, first_day date NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS customer_first_purchase_first_day_idx ON customer_first_purchase (first_day)",
+    # Changes to customers not yet folded into the rollups, as signed rows (purchases = +1 or -1)
+    "CREATE TABLE IF NOT EXISTS sales_rollup_log (log_id bigserial PRIMARY KEY, movie_title text, day date, "
+    "email text, tickets bigint NOT NULL, revenue numeric NOT NULL, purchases integer NOT NULL)",
+    # One row: set when the log cannot describe a change (TRUNCATE, triggers just installed)
+    "CREATE TABLE IF NOT EXISTS sales_rollup_state (id integer PRIMARY KEY CHECK (id = 1), "
+    "needs_rebuild boolean NOT NULL DEFAULT true)",
+    "INSERT INTO sales_rollup_state (id) VALUES (1) ON CONFLICT DO NOTHING",
+    # Replaced by sales_rollup_log
+    "DROP TABLE IF EXISTS sales_rollup_watermark"
+]
+
+# Signed log rows for one version of a set of customers rows
+LOG_ROWS_SQL = (
+    "INSERT INTO sales_rollup_log (movie_title, day, email, tickets, revenue, purchases) "
+    "SELECT ticket_purchase, date::date, email, {sign} * coalesce(tickets_purchased, 0), "
+    "{sign} * coalesce(amount_paid, 0), {sign} FROM {rows}"
+)
+
+# Statement-level, so a bulk write costs one INSERT ... SELECT into the log
+LOG_FUNCTION_SQL = (
+    "CREATE OR REPLACE FUNCTION log_sales_change() RETURNS trigger LANGUAGE plpgsql AS $$ BEGIN "
+    "IF TG_OP = 'TRUNCATE' THEN UPDATE sales_rollup_state SET needs_rebuild = true; RETURN NULL; END IF; "
+    "IF TG_OP IN ('UPDATE', 'DELETE') THEN " + LOG_ROWS_SQL.format(sign=-1, rows="old_rows") + "; END IF; "
+    "IF TG_OP IN ('INSERT', 'UPDATE') THEN " + LOG_ROWS_SQL.format(sign=1, rows="new_rows") + "; END IF; "
+    "RETURN NULL; END $$"
+)
+
+# Trigger name -> definition; transition tables allow only one event per trigger
+LOG_TRIGGERS = {
+    'customers_sales_log_insert': "AFTER INSERT ON customers REFERENCING NEW TABLE AS new_rows",
+    'customers_sales_log_update': "AFTER UPDATE ON customers REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows",
+    'customers_sales_log_delete': "AFTER DELETE ON customers REFERENCING OLD TABLE AS old_rows",
+    'customers_sales_log_truncate': "AFTER TRUNCATE ON customers"
+}
+
+# Adds the delta's signed totals to a rollup keyed on key_column, grouped by the delta expression
+ADD_TOTALS_SQL = (
+    "INSERT INTO {table} ({key_column}, tickets, revenue, purchases) "
+    "SELECT {expression}, sum(tickets), sum(revenue), sum(purchases) FROM sales_delta "
+    "WHERE {expression} IS NOT NULL GROUP BY 1 "
+    "ON CONFLICT ({key_column}) DO UPDATE SET tickets = {table}.tickets + EXCLUDED.tickets, "
+    "revenue = {table}.revenue + EXCLUDED.revenue, purchases = {table}.purchases + EXCLUDED.purchases"
+)
+
+ROLLUP_GROUPS = [
+    ("sales_by_movie", "movie_title", "movie_title"),
+    ("sales_by_day", "day", "day"),
+    ("sales_by_quarter", "quarter", "date_trunc('quarter', day)::date")
+]
+
+
+def create_rollup_tables():
+    """
+    Create the rollup tables and the customers change-log triggers (run by migrate.py).
+    Installing the triggers flags a rebuild, done here, since earlier writes were never logged.
+    """
+    with transaction() as conn:
+        with conn.cursor() as cursor:
+            # Concurrent CREATE OR REPLACE of one function fails, so processes take turns
+            cursor.execute("SELECT pg_advisory_xact_lock(hashtext('rollups-triggers'))")
+            for statement in ROLLUP_SCHEMA:
+                cursor.execute(statement)
+            cursor.execute(LOG_FUNCTION_SQL)
+            cursor.execute(
+                "SELECT t.tgname FROM pg_trigger t WHERE t.tgrelid = 'customers'::regclass AND t.tgname = ANY(%s)",
+                [list(LOG_TRIGGERS)]
+            )
+            installed = {row[0] for row in cursor.fetchall()}
+            for trigger_name, definition in LOG_TRIGGERS.items():
+                if trigger_name not in installed:
+                    cursor.execute(
+                        f"CREATE TRIGGER {trigger_name} {definition} "
+                        "FOR EACH STATEMENT EXECUTE FUNCTION log_sales_change()"
+                    )
+            if len(installed) < len(LOG_TRIGGERS):
+                cursor.execute("UPDATE sales_rollup_state SET needs_rebuild = true")
+    # Recomputing a customer's first purchase looks up their rows by email
+    create_index("customers", ["email", "date"])
+    update_rollups()
+
+
+def apply_delta(cursor):
+    """Add the signed rows in the temporary sales_delta table to the rollups and recount new members."""
+    for table, key_column, expression in ROLLUP_GROUPS:
+        cursor.execute(ADD_TOTALS_SQL.format(table=table, key_column=key_column, expression=expression))
+
+    # First purchases of the customers the delta touched, recomputed from their remaining rows;
+    # new members change in the quarters of both their old and their new first purchase
+    cursor.execute(
+        "CREATE TEMPORARY TABLE delta_emails ON COMMIT DROP AS "
+        "SELECT DISTINCT email FROM sales_delta WHERE email IS NOT NULL"
+    )
+    cursor.execute(
+        "CREATE TEMPORARY TABLE delta_quarters ON COMMIT DROP AS "
+        "SELECT DISTINCT date_trunc('quarter', first_day)::date AS quarter FROM customer_first_purchase "
+        "JOIN delta_emails USING (email)"
+    )
+    cursor.execute("DELETE FROM customer_first_purchase f USING delta_emails d WHERE f.email = d.email")
+    cursor.execute(
+        "INSERT INTO customer_first_purchase (email, first_day) SELECT c.email, min(c.date::date) "
+        "FROM customers c JOIN delta_emails d USING (email) WHERE c.date IS NOT NULL GROUP BY c.email"
+    )
+    cursor.execute(
+        "INSERT INTO delta_quarters SELECT DISTINCT date_trunc('quarter', first_day)::date "
+        "FROM customer_first_purchase JOIN delta_emails USING (email)"
+    )
+    cursor.execute(
+        "INSERT INTO sales_by_quarter (quarter, new_members) "
+        "SELECT quarter, (SELECT count(*) FROM customer_first_purchase "
+        "WHERE first_day >= quarter AND first_day < quarter + interval '3 months') "
+        "FROM (SELECT DISTINCT quarter FROM delta_quarters) AS quarters "
+        "ON CONFLICT (quarter) DO UPDATE SET new_members = EXCLUDED.new_members"
+    )
+
+    # Movies and days whose purchases were all deleted drop out of the rollups
+    cursor.execute("DELETE FROM sales_by_movie WHERE purchases = 0")
+    cursor.execute("DELETE FROM sales_by_day WHERE purchases = 0")
+    cursor.execute("DELETE FROM sales_by_quarter WHERE purchases = 0 AND new_members = 0")
+
+
+def update_rollups():
+    """
+    Fold the logged changes to customers into the rollups; returns the number of log rows processed.
+    Runs in one transaction holding the state row lock, so concurrent callers queue
+    instead of consuming the same log rows twice.
+    """
+    with transaction() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT needs_rebuild FROM sales_rollup_state WHERE id = 1 FOR UPDATE")
+            if cursor.fetchone()[0]:
+                processed = _rebuild(cursor)
+            else:
+                cursor.execute(
+                    "CREATE TEMPORARY TABLE sales_delta ON COMMIT DROP AS WITH consumed AS "
+                    "(DELETE FROM sales_rollup_log RETURNING movie_title, day, email, tickets, revenue, purchases) "
+                    "SELECT * FROM consumed"
+                )
+                processed = cursor.rowcount
+                if not processed:
+                    return 0
+                apply_delta(cursor)
+
+    invalidate_rollup_caches()
+    return processed
+
+
+def _rebuild(cursor):
+    # Writers to customers wait until the rollups match the table again
+    cursor.execute("LOCK TABLE customers IN SHARE MODE")
+    cursor.execute(f"TRUNCATE {', '.join(ROLLUP_TABLES)}, sales_rollup_log")
+    cursor.execute(
+        "CREATE TEMPORARY TABLE sales_delta ON COMMIT DROP AS "
+        "SELECT ticket_purchase AS movie_title, date::date AS day, email, "
+        "coalesce(tickets_purchased, 0)::bigint AS tickets, coalesce(amount_paid, 0) AS revenue, 1 AS purchases "
+        "FROM customers"
+    )
+    processed = cursor.rowcount
+    apply_delta(cursor)
+    cursor.execute("UPDATE sales_rollup_state SET needs_rebuild = false")
+    return processed
+
+
+def rebuild_rollups():
+    """Empty the rollups and the log and recompute everything from customers."""
+    with transaction() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("UPDATE sales_rollup_state SET needs_rebuild = true")
+            # Both steps commit together, so readers never see the rollups half empty
+            processed = update_rollups()
+    invalidate_rollup_caches()
+    return processed
+
+
+def invalidate_rollup_caches():
+    for table in ROLLUP_TABLES:
+        invalidate(table)
+        figure_cache.mark_changed(table)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rebuild', action='store_true', help="recompute the rollups from scratch")
+    args = parser.parse_args()
+    processed = rebuild_rollups() if args.rebuild else update_rollups()
+    print(f"Folded {processed:,} changes into the sales rollups")
+
+
+if __name__ == '__main__':
+    main()
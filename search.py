@@ -0,0 +1,119 @@
+import threading
+
+from database import Query, create_index, execute, fetch_data, fetch_query, like_pattern
+
+# Searchable entities: the table, the columns matched as substrings (trigram indexed)
+# and, optionally, a text document matched with full-text search (tsvector indexed)
+SEARCH_ENTITIES = {
+    'movies': {
+        'table': 'movies',
+        'columns': ['title'],
+        'document': "coalesce(title, '') || ' ' || coalesce(description, '')"
+    },
+    'producers': {
+        'table': 'producers',
+        'columns': ['name']
+    },
+    'customers': {
+        'table': 'customers',
+        'columns': ['name', 'email']
+    }
+}
+
+# Text search configuration used for tsvector documents (no stemming, matches names well)
+TEXT_SEARCH_CONFIG = 'simple'
+
+DEFAULT_LIMIT = 100
+
+_trigram_lock = threading.Lock()
+_trigram_checked = False
+_trigram_enabled = False
+
+
+def create_search_indexes():
+    """
+    Create the pg_trgm extension and the GIN indexes behind search() (run by migrate.py).
+    - Trigram indexes let `column ILIKE '%text%'` use an index instead of a sequential scan.
+    - The tsvector index serves full-text matches on movie titles and descriptions.
+    Without pg_trgm the trigram indexes are skipped and search falls back to unranked ILIKE.
+    """
+    try:
+        execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    except Exception as e:
+        print(f"Search setup: pg_trgm unavailable, trigram indexes skipped ({e})")
+    trigram = bool(fetch_data("pg_extension", "extname", "extname = %s", params=['pg_trgm'], use_cache=False))
+
+    for spec in SEARCH_ENTITIES.values():
+        if trigram:
+            for column in spec['columns']:
+                create_index(spec['table'], [f"{column} gin_trgm_ops"], name=f"{spec['table']}_{column}_trgm_idx", using="gin")
+        if 'document' in spec:
+            create_index(spec['table'], [f"to_tsvector('{TEXT_SEARCH_CONFIG}', {spec['document']})"],
+                         name=f"{spec['table']}_search_fts_idx", using="gin")
+
+
+def trigram_available():
+    """True when pg_trgm is installed, so search can rank by similarity (looked up once per process)."""
+    global _trigram_checked, _trigram_enabled
+    if _trigram_checked:
+        return _trigram_enabled
+
+    with _trigram_lock:
+        if not _trigram_checked:
+            _trigram_enabled = bool(fetch_data("pg_extension", "extname", "extname = %s", params=['pg_trgm'], use_cache=False))
+            _trigram_checked = True
+    return _trigram_enabled
+
+
+def search_condition(entity, text):
+    """Return (condition, params) matching text against an entity's searchable columns."""
+    spec = SEARCH_ENTITIES[entity]
+    pattern = like_pattern(text)
+    parts = [f"{column} ILIKE %s" for column in spec['columns']]
+    params = [pattern] * len(spec['columns'])
+    if 'document' in spec:
+        parts.append(f"to_tsvector('{TEXT_SEARCH_CONFIG}', {spec['document']}) @@ plainto_tsquery('{TEXT_SEARCH_CONFIG}', %s)")
+        params.append(text)
+    return " OR ".join(parts), params
+
+
+def search_rank(entity, text):
+    """Return (expression, params) scoring how well a row matches text; higher is better."""
+    spec = SEARCH_ENTITIES[entity]
+    if trigram_available():
+        parts = [f"similarity({column}, %s)" for column in spec['columns']]
+        params = [text] * len(spec['columns'])
+        expression = parts[0] if len(parts) == 1 else f"greatest({', '.join(parts)})"
+    else:
+        # Without pg_trgm, prefer rows whose first column starts with the text
+        expression = f"({spec['columns'][0]} ILIKE %s)::int"
+        params = [like_pattern(text)[1:]]
+    if 'document' in spec:
+        expression += (
+            f" + ts_rank(to_tsvector('{TEXT_SEARCH_CONFIG}', {spec['document']}), "
+            f"plainto_tsquery('{TEXT_SEARCH_CONFIG}', %s))"
+        )
+        params.append(text)
+    return expression, params
+
+
+def search_query(entity, text, columns="*"):
+    """Build the ranked, unlimited search Query so callers can add paging or extra filters."""
+    spec = SEARCH_ENTITIES[entity]
+    condition, params = search_condition(entity, text)
+    rank, rank_params = search_rank(entity, text)
+    query = Query(spec['table'], columns).where(condition, *params)
+    query.order_by_expression(rank, *rank_params, direction='DESC')
+    query.order_by(spec['columns'][0])
+    return query
+
+
+def search(entity, text, limit=DEFAULT_LIMIT, columns="*"):
+    """
+    Return rows of entity ('movies', 'producers' or 'customers') matching text, best match first.
+    Pass limit=None to return every match.
+    """
+    query = search_query(entity, text, columns)
+    if limit:
+        query.limit(limit)
+    return fetch_query(query, cache_table=SEARCH_ENTITIES[entity]['table'])
@@ -0,0 +1,207 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+import threading
+
+from flask import request, send_file
+
+try:
+    import brotli
+except ImportError:  # Brotli is optional; gzip is always available
+    brotli = None
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Precompressed copies of the assets/ files, named by content hash
+CACHE_DIR = os.path.join(APP_DIR, '.cache', 'assets')
+
+# Responses of these types are worth compressing; images and fonts already are compressed
+COMPRESSIBLE_MIMETYPES = {
+    'application/javascript', 'application/json', 'image/svg+xml', 'text/css',
+    'text/html', 'text/javascript', 'text/plain'
+}
+
+# Bodies smaller than this (bytes) gain nothing from compression
+MIN_COMPRESS_SIZE = 500
+
+# Static files are compressed once, so use the best ratio; per-request compression must stay cheap
+STATIC_LEVELS = {'br': 11, 'gzip': 9}
+DYNAMIC_LEVELS = {'br': 4, 'gzip': 6}
+
+# Fingerprinted URLs never change content, so browsers may keep them for a year
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+HASH_LENGTH = 12
+FINGERPRINT_PATTERN = re.compile(r'^(?P<stem>.+)\.(?P<hash>[0-9a-f]{%d})(?P<extension>\.[^./]+)$' % HASH_LENGTH)
+
+_lock = threading.Lock()
+_manifest = {}          # asset path (e.g. "style.css") -> entry, see build_entry
+_suite_cache = {}       # (component suite URL, encoding) -> compressed body
+_config = {'assets_folder': os.path.join(APP_DIR, 'assets'), 'assets_prefix': '/assets/'}
+
+
+def encodings():
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def compress(data, encoding, levels=DYNAMIC_LEVELS):
+    if encoding == 'br':
+        return brotli.compress(data, quality=levels['br'])
+    return gzip.compress(data, compresslevel=levels['gzip'], mtime=0)
+
+
+def accepted_encoding():
+    """The best encoding the client accepts (brotli over gzip), or None."""
+    accepted = request.headers.get('Accept-Encoding', '')
+    offered = {part.split(';')[0].strip().lower() for part in accepted.split(',') if 'q=0' not in part.replace(' ', '')}
+    return next((encoding for encoding in encodings() if encoding in offered), None)
+
+
+def build_entry(name, path):
+    """
+    Hash an asset and, if its type compresses, write .br/.gz copies to CACHE_DIR.
+    Entry: {'path', 'hash', 'mtime', 'size', 'mimetype', 'variants': {encoding: path}}
+    """
+    with open(path, 'rb') as handle:
+        data = handle.read()
+    digest = hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+    mimetype = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+    stat = os.stat(path)
+    entry = {'path': path, 'hash': digest, 'mtime': stat.st_mtime, 'size': stat.st_size, 'mimetype': mimetype, 'variants': {}}
+
+    if mimetype in COMPRESSIBLE_MIMETYPES and len(data) >= MIN_COMPRESS_SIZE:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        for encoding in encodings():
+            variant_path = os.path.join(CACHE_DIR, f"{digest}{os.path.splitext(name)[1]}.{encoding}")
+            if not os.path.exists(variant_path):
+                compressed = compress(data, encoding, STATIC_LEVELS)
+                if len(compressed) >= len(data):
+                    continue
+                temp_path = f"{variant_path}.{os.getpid()}.tmp"
+                with open(temp_path, 'wb') as handle:
+                    handle.write(compressed)
+                os.replace(temp_path, variant_path)
+            entry['variants'][encoding] = variant_path
+    return entry
+
+
+def build_manifest():
+    """Hash and precompress every file under assets/ (run once at startup)."""
+    folder = _config['assets_folder']
+    manifest = {}
+    for directory, _, files in os.walk(folder):
+        for filename in files:
+            path = os.path.join(directory, filename)
+            name = os.path.relpath(path, folder).replace(os.sep, '/')
+            manifest[name] = build_entry(name, path)
+    with _lock:
+        _manifest.clear()
+        _manifest.update(manifest)
+    return manifest
+
+
+def asset_entry(name):
+    """Manifest entry for an asset, re-hashed if the file changed since startup (hot reload)."""
+    with _lock:
+        entry = _manifest.get(name)
+    if entry is None:
+        return None
+    try:
+        stat = os.stat(entry['path'])
+    except OSError:
+        return None
+    if (stat.st_mtime, stat.st_size) != (entry['mtime'], entry['size']):
+        entry = build_entry(name, entry['path'])
+        with _lock:
+            _manifest[name] = entry
+    return entry
+
+
+def fingerprint(path):
+    """'style.css' -> 'style.<content hash>.css' (unchanged for files not in assets/)."""
+    name = path.lstrip('/')
+    entry = asset_entry(name)
+    if entry is None:
+        return path
+    stem, extension = os.path.splitext(name)
+    return f"{stem}.{entry['hash']}{extension}"
+
+
+def serve_asset():
+    """
+    before_request hook serving assets/ files: precompressed when the client accepts it,
+    with far-future caching on fingerprinted URLs and ETag revalidation otherwise.
+    """
+    prefix = _config['assets_prefix']
+    if request.method not in ('GET', 'HEAD') or not request.path.startswith(prefix):
+        return None
+
+    name = request.path[len(prefix):]
+    requested_hash = None
+    match = FINGERPRINT_PATTERN.match(name)
+    if match and asset_entry(match.group('stem') + match.group('extension')) is not None:
+        name = match.group('stem') + match.group('extension')
+        requested_hash = match.group('hash')
+
+    entry = asset_entry(name)
+    if entry is None:
+        return None  # Let Dash's own assets route answer (404)
+
+    encoding = accepted_encoding() if entry['variants'] else None
+    encoding = encoding if encoding in entry['variants'] else None
+    path = entry['variants'][encoding] if encoding else entry['path']
+
+    response = send_file(path, mimetype=entry['mimetype'], conditional=True,
+                         etag=entry['hash'] + (f"-{encoding}" if encoding else ''))
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    if entry['variants']:
+        response.vary.add('Accept-Encoding')
+    # An old fingerprint still gets the current file, but must not be cached forever
+    response.headers['Cache-Control'] = IMMUTABLE if requested_hash == entry['hash'] else 'no-cache'
+    return response
+
+
+def compress_response(response):
+    """after_request hook: compress callback JSON, pages and Dash's component bundles on the fly."""
+    if (response.direct_passthrough or response.is_streamed or response.status_code != 200
+            or 'Content-Encoding' in response.headers or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+    encoding = accepted_encoding()
+    response.vary.add('Accept-Encoding')
+    if encoding is None or (response.content_length or 0) < MIN_COMPRESS_SIZE:
+        return response
+
+    # Component bundles have versioned URLs, so each is compressed once per encoding
+    is_suite = '/_dash-component-suites/' in request.path
+    key = (request.path, encoding)
+    body = _suite_cache.get(key) if is_suite else None
+    if body is None:
+        body = compress(response.get_data(), encoding)
+        if is_suite:
+            _suite_cache[key] = body
+
+    response.set_data(body)
+    response.headers['Content-Encoding'] = encoding
+    if response.get_etag()[0]:
+        response.set_etag(f"{response.get_etag()[0]}-{encoding}")
+    return response
+
+
+def register(app):
+    """
+    Compress responses and fingerprint assets for a Dash app:
+    assets/ URLs built by Dash (and app.get_asset_url) carry a content hash,
+    and are served precompressed with far-future cache headers.
+    """
+    _config['assets_folder'] = app.config.assets_folder
+    _config['assets_prefix'] = app.config.routes_pathname_prefix + app.config.assets_url_path.strip('/') + '/'
+    build_manifest()
+
+    get_asset_url = app.get_asset_url
+    app.get_asset_url = lambda path: get_asset_url(fingerprint(path))
+
+    app.server.before_request(serve_asset)
+    app.server.after_request(compress_response)
@@ -0,0 +1,59 @@
+"""
+Production entry point for a pre-forking WSGI server:
+
+    gunicorn -c gunicorn.conf.py wsgi:server
+
+gunicorn.conf.py calls preload() once in the master process and init_worker()
+in every forked worker. `python app.py` remains the single-process dev server.
+"""
+import sys
+
+import async_database
+import booking
+import changefeed
+import database
+import insights
+import jobs
+from figure_cache import data_version
+from app import app
+
+server = app.server
+
+
+def release_connections():
+    """Close this process's database connections; a forked child must never share the parent's sockets."""
+    database.pool.closeall()
+    async_database.close_pool()
+
+
+def preload():
+    """
+    Master process, before forking: check the database is reachable and build the
+    slow-to-compute report figures once into the disk cache, where the workers' job
+    processes find them. Built directly rather than through the job pool, which must
+    only be started after forking. Connections opened here are closed again before the first fork.
+    """
+    try:
+        database.pool.warm_up()
+        reports = sys.modules['pages.4_reports']
+        reports.build_report_figures(data_version(*reports.REPORT_TABLES))
+    except Exception as e:
+        print(f"Preload error: {e}")
+    release_connections()
+
+
+def init_worker(threads):
+    """
+    Worker process, right after fork: size its pools for its request threads, open its own
+    connections and start background refreshes and the change listener.
+    """
+    async_database.reset_after_fork()
+    database.set_pool_sizes(database.worker_pool_size(threads), database.ASYNC_POOL_SIZE)
+    try:
+        database.pool.warm_up()
+    except Exception as e:
+        print(f"Database error: {e}")
+    insights.start_refresh_schedule()
+    booking.start_expiry_schedule()
+    changefeed.start_listener()
+    jobs.warm_up()